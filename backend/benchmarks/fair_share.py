@@ -0,0 +1,137 @@
+"""
+Fair-share dispatch benchmark (noisy neighbour simulation)
+
+Event-driven simulation of the dispatcher in front of a fixed pool of
+worker slots. One owner dumps a large backfill at t=0 while many small
+owners keep submitting steps at a steady rate. Reports how long steps wait
+between becoming ready and starting, under plain FIFO (the shared Celery
+queue) and under the DeficitRoundRobin the fair-share dispatcher uses:
+
+    python benchmarks/fair_share.py [--workers 50] [--backfill 20000] [--tenants 20]
+
+Exits non-zero if the small owners' p99 wait under DRR exceeds --p99-budget
+seconds. No database or broker is used.
+"""
+
+import argparse
+import heapq
+import os
+import random
+import sys
+from collections import defaultdict, deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "flowpilot.settings")
+
+import django
+django.setup()
+
+from workflows.fairshare import DeficitRoundRobin
+
+NOISY = 'noisy'
+
+
+def generate_arrivals(args, rng):
+    """(ready_time, owner) for every step in the run"""
+    arrivals = [(0.0, NOISY)] * args.backfill
+    for tenant in range(args.tenants):
+        t = rng.expovariate(args.rate)
+        while t < args.duration:
+            arrivals.append((t, f"tenant{tenant}"))
+            t += rng.expovariate(args.rate)
+    arrivals.sort(key=lambda arrival: arrival[0])
+    return arrivals
+
+
+def simulate(arrivals, args, policy):
+    """
+    Returns:
+        dict: owner -> list of waits (seconds), and the time the last step finished
+    """
+    rng = random.Random(args.seed)
+    drr = DeficitRoundRobin()
+    fifo = deque()
+    queues = defaultdict(deque)
+    free = args.workers
+    waits = defaultdict(list)
+    completions = []  # heap of finish times
+    now = 0.0
+    index = 0
+
+    def start(ready_time, owner):
+        nonlocal free
+        free -= 1
+        waits[owner].append(now - ready_time)
+        heapq.heappush(completions, now + rng.expovariate(1 / args.service))
+
+    def dispatch():
+        if policy == 'fifo':
+            while free and fifo:
+                start(*fifo.popleft())
+            return
+        if not free:
+            return
+        backlog = {owner: len(queue) for owner, queue in queues.items() if queue}
+        for owner, count in drr.allocate(backlog, free).items():
+            for _ in range(count):
+                start(*queues[owner].popleft())
+
+    while index < len(arrivals) or completions or fifo or any(queues.values()):
+        next_arrival = arrivals[index][0] if index < len(arrivals) else float('inf')
+        next_completion = completions[0] if completions else float('inf')
+        if next_arrival <= next_completion:
+            now = next_arrival
+            # Everything arriving at the same instant enters the queues together
+            while index < len(arrivals) and arrivals[index][0] == now:
+                ready_time, owner = arrivals[index]
+                (fifo if policy == 'fifo' else queues[owner]).append((ready_time, owner))
+                index += 1
+        else:
+            now = heapq.heappop(completions)
+            free += 1
+        dispatch()
+
+    return waits, now
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)] if ordered else 0.0
+
+
+def report(name, waits, finished):
+    small = [wait for owner, values in waits.items() if owner != NOISY for wait in values]
+    noisy = waits[NOISY]
+    print(f"{name:14} small owners p50 {percentile(small, .5):8.2f}s  p99 {percentile(small, .99):8.2f}s  "
+          f"max {max(small, default=0):8.2f}s | backfill p50 {percentile(noisy, .5):8.1f}s | "
+          f"all done at {finished:7.1f}s")
+    return percentile(small, .99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=50, help="Worker slots (FAIR_SHARE_MAX_IN_FLIGHT)")
+    parser.add_argument('--service', type=float, default=1.0, help="Mean step duration (seconds)")
+    parser.add_argument('--backfill', type=int, default=20000, help="Steps the noisy owner submits at t=0")
+    parser.add_argument('--tenants', type=int, default=20, help="Small owners")
+    parser.add_argument('--rate', type=float, default=0.5, help="Steps per second per small owner")
+    parser.add_argument('--duration', type=float, default=300, help="Seconds the small owners keep submitting")
+    parser.add_argument('--p99-budget', type=float, default=5.0)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    arrivals = generate_arrivals(args, random.Random(args.seed))
+    small_steps = len(arrivals) - args.backfill
+    print(f"{args.workers} worker slots, {args.backfill} backfill steps, {args.tenants} small owners "
+          f"submitting {small_steps} steps over {args.duration:.0f}s\n")
+
+    report('fifo', *simulate(arrivals, args, 'fifo'))
+    p99 = report('drr', *simulate(arrivals, args, 'drr'))
+
+    if p99 > args.p99_budget:
+        print(f"\nDRR p99 for small owners {p99:.2f}s is over the {args.p99_budget}s budget")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
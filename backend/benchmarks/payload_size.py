@@ -0,0 +1,129 @@
+"""
+Payload size benchmark
+
+Runs one execution of a 50-step workflow (5 parallel chains of 10) with a
+100KB input and reports bytes per step:
+- broker: serialized execute_workflow_task / trigger_next_steps messages,
+  for every available serializer (json, msgpack, orjson)
+- result backend: serialized task return values
+- database: JSON text stored in input_data/result/output_data columns,
+  next to what the old layout (input copied into every root TaskExecution)
+  would have stored
+
+Messages go to an in-memory broker and are run in-process, so no Redis or
+worker is needed:
+
+    python benchmarks/payload_size.py [--input-kb 100] [--chains 5] [--length 10]
+
+Point DJANGO_SETTINGS_MODULE at a throwaway database - the benchmark
+creates a workflow and an execution.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "flowpilot.settings")
+
+import django
+django.setup()
+
+from django.conf import settings
+
+# Before the Celery app first reads its config
+settings.CELERY_BROKER_URL = 'memory://'
+settings.CELERY_RESULT_BACKEND = 'cache+memory://'
+settings.CELERY_TASK_ALWAYS_EAGER = False
+
+from celery.signals import before_task_publish
+from django.core.serializers.json import DjangoJSONEncoder
+from kombu.exceptions import SerializerNotInstalled
+from kombu.serialization import dumps
+
+from flowpilot.celery import app
+from workflows.models import Workflow, WorkflowStep, WorkflowExecution
+from workflows.orchestrator import Orchestrator
+
+SERIALIZERS = ['json', 'msgpack', 'orjson']
+
+
+def json_bytes(value) -> int:
+    return len(json.dumps(value, cls=DjangoJSONEncoder, separators=(',', ':'))) if value else 0
+
+
+def build_workflow(chains: int, length: int) -> Workflow:
+    workflow = Workflow.objects.create(name='payload-benchmark')
+    for chain in range(chains):
+        previous = None
+        for position in range(length):
+            step = WorkflowStep.objects.create(
+                workflow=workflow,
+                name=f"chain{chain}-step{position}",
+                step_type='display_for_test',
+                step_order=chain * length + position,
+            )
+            if previous:
+                step.depends_on.add(previous)
+            previous = step
+    return workflow
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--input-kb', type=int, default=100)
+    parser.add_argument('--chains', type=int, default=5)
+    parser.add_argument('--length', type=int, default=10)
+    args = parser.parse_args()
+
+    published = []
+
+    @before_task_publish.connect(weak=False)
+    def capture(sender=None, body=None, **kwargs):
+        published.append((sender, body))
+
+    workflow = build_workflow(args.chains, args.length)
+    steps = args.chains * args.length
+    input_data = {'message': 'benchmark', 'blob': 'x' * (args.input_kb * 1024)}
+
+    execution = Orchestrator().execute(workflow.id, input_data)
+
+    # Play the worker: run every published message in-process (which publishes the next ones)
+    results = []
+    cursor = 0
+    while cursor < len(published):
+        name, body = published[cursor]
+        cursor += 1
+        task_args, task_kwargs, _ = body
+        results.append(app.tasks[name].apply(args=task_args, kwargs=task_kwargs).result)
+
+    execution = WorkflowExecution.objects.get(id=execution.id)
+    tasks = list(execution.task_executions.values('input_data', 'result'))
+    roots = execution.task_executions.filter(step__depends_on__isnull=True).count()
+
+    db_bytes = json_bytes(execution.input_data) + json_bytes(execution.output_data) + sum(
+        json_bytes(task['input_data']) + json_bytes(task['result']) for task in tasks
+    )
+    legacy_db_bytes = db_bytes + roots * json_bytes(execution.input_data)
+
+    print(f"Execution {execution.id}: {execution.status}, {steps} steps, "
+          f"{json_bytes(input_data) / 1024:.0f}KB input, {len(published)} messages")
+    print()
+    print("Broker (message body bytes per step)")
+    for serializer in SERIALIZERS:
+        try:
+            total = sum(len(dumps(body, serializer=serializer)[2]) for _, body in published)
+        except SerializerNotInstalled:
+            print(f"  {serializer:8} {'not installed':>10}")
+            continue
+        print(f"  {serializer:8} {total / steps:10.1f}")
+    print(f"Result backend (json bytes per step) {sum(json_bytes(r) for r in results) / steps:10.1f}")
+    print()
+    print("Database (JSON bytes per step)")
+    print(f"  input stored once            {db_bytes / steps:10.1f}")
+    print(f"  input copied into {roots} roots    {legacy_db_bytes / steps:10.1f}")
+
+
+if __name__ == '__main__':
+    main()
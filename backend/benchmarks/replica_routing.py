@@ -0,0 +1,125 @@
+"""
+Replica routing benchmark
+
+Two SQLite files stand in for the primary and a read replica (the replica
+is a copy of the primary taken after seeding, so it "lags" behind every
+write made afterwards). A client polls the dashboard endpoints and
+triggers an execution every few requests; the script counts the queries
+each alias served and checks read-your-writes:
+
+    python benchmarks/replica_routing.py [--executions 2000] [--requests 200] [--trigger-every 10]
+
+With two local PostgreSQL instances, run the API with DB_REPLICA_HOST set
+instead and compare pg_stat_statements on both.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "flowpilot.settings")
+
+import django
+from django.conf import settings
+
+# Before django.setup() configures the connections
+WORKDIR = tempfile.mkdtemp(prefix='flowpilot-replica-')
+PRIMARY = os.path.join(WORKDIR, 'primary.sqlite3')
+REPLICA = os.path.join(WORKDIR, 'replica.sqlite3')
+settings.DATABASES = {
+    'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': PRIMARY},
+    'replica': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': REPLICA},
+}
+settings.CELERY_BROKER_URL = 'memory://'
+settings.CELERY_RESULT_BACKEND = 'cache+memory://'
+settings.CELERY_TASK_ALWAYS_EAGER = False
+settings.ADMISSION_CONTROL_ENABLED = False
+settings.ALLOWED_HOSTS = ['*']
+django.setup()
+
+from django.core.management import call_command
+from django.db import connections
+from rest_framework.test import APIClient
+
+from flowpilot import db as flowpilot_db
+
+from workflows.models import Workflow, WorkflowStep, WorkflowExecution
+
+queries = Counter()
+
+
+def counting(alias):
+    def wrapper(execute, sql, params, many, context):
+        queries[alias] += 1
+        return execute(sql, params, many, context)
+    return wrapper
+
+
+def seed(executions: int) -> Workflow:
+    call_command('migrate', verbosity=0)
+    workflow = Workflow.objects.create(name='replica-benchmark', is_active=True)
+    WorkflowStep.objects.create(workflow=workflow, name='wait', step_type='delay', step_order=1)
+    WorkflowExecution.objects.bulk_create(
+        [WorkflowExecution(workflow=workflow, status='completed') for _ in range(executions)], batch_size=1000,
+    )
+    connections.close_all()
+    shutil.copyfile(PRIMARY, REPLICA)
+    return workflow
+
+
+def run(workflow, args, routed: bool):
+    """A dashboard client polls while a second client triggers every --trigger-every requests"""
+    # Without routing no app's reads may go to the replica
+    flowpilot_db.REPLICA_APPS = {'workflows'} if routed else set()
+    queries.clear()
+    viewer = APIClient(SERVER_NAME='localhost', REMOTE_ADDR='10.0.0.1')
+    trigger = APIClient(SERVER_NAME='localhost', REMOTE_ADDR='10.0.0.2')
+    reads = [
+        '/api/workflows/',
+        f'/api/executions/?workflow={workflow.id}&status=completed',
+        f'/api/steps/?id={workflow.id}',
+    ]
+    with connections['default'].execute_wrapper(counting('primary')), \
+            connections['replica'].execute_wrapper(counting('replica')):
+        for i in range(args.requests):
+            if i % args.trigger_every == 0:
+                trigger.post(f'/api/workflows/{workflow.id}/execute/', {'input_data': {}}, format='json')
+                # The triggering client reads its result back
+                trigger.get(f'/api/executions/?workflow={workflow.id}&status=pending')
+            else:
+                viewer.get(reads[i % len(reads)])
+    return dict(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--executions', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--trigger-every', type=int, default=10)
+    args = parser.parse_args()
+    workflow = seed(args.executions)
+    print(f"{args.requests} requests, a trigger every {args.trigger_every}, {args.executions} seeded executions\n")
+
+    for name, routed in (('primary only', False), ('routed', True)):
+        counts = run(workflow, args, routed)
+        print(f"{name:14} primary {counts.get('primary', 0):6} queries  replica {counts.get('replica', 0):6} queries")
+
+    # Read-your-writes: the writer sees its new execution, a lagging replica doesn't have it
+    writer = APIClient(SERVER_NAME='localhost', REMOTE_ADDR='10.0.0.3')
+    viewer = APIClient(SERVER_NAME='localhost', REMOTE_ADDR='10.0.0.4')
+    execution_id = writer.post(f'/api/workflows/{workflow.id}/execute/', {'input_data': {}}, format='json').json()['execution_id']
+    own = writer.get(f'/api/executions/{execution_id}/').status_code
+    other = viewer.get(f'/api/executions/{execution_id}/').status_code
+    print(f"\nNew execution read back by its writer: {own}, by another client on the replica: {other}")
+
+    shutil.rmtree(WORKDIR, ignore_errors=True)
+    if own != 200:
+        sys.exit("Read-your-writes failed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Worker startup benchmark
+
+Measures the import cost of booting a Celery worker (app + Django setup +
+task module autodiscovery) with `python -X importtime`, and fails when the
+median is over budget:
+
+    python benchmarks/startup_time.py [--runs 5] [--budget-ms 500] [--top 15]
+
+Each run is a fresh interpreter, so numbers are cold-import times (the
+filesystem cache is warm after the first run). The budget can also be set
+with WORKER_IMPORT_BUDGET_MS; keep it in CI next to the test suite so a new
+eager import of a heavy library shows up as a failure, not as slower
+autoscaling.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What `celery -A flowpilot worker` imports before it takes its first message
+WORKER_BOOT = (
+    "from flowpilot.celery import app\n"
+    "app.loader.import_default_modules()\n"
+)
+
+DEFAULT_BUDGET_MS = float(os.getenv('WORKER_IMPORT_BUDGET_MS', '500'))
+
+
+def parse_importtime(stderr: str):
+    """
+    Top-level modules and their cumulative import time (ms) from -X importtime output
+
+    Lines look like "import time: self | cumulative | <indent>module"; a
+    module with no indent was imported directly by the boot code.
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        if name.startswith(' ') and not name.startswith('  '):
+            modules.append((name.strip(), int(cumulative_us) / 1000))
+    return modules
+
+
+def measure() -> list:
+    env = dict(os.environ)
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'flowpilot.settings')
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', WORKER_BOOT],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        sys.exit(f"Worker boot failed:\n{completed.stderr[-2000:]}")
+    return parse_importtime(completed.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    runs = [measure() for _ in range(args.runs)]
+    totals = [sum(ms for _, ms in modules) for modules in runs]
+    median = statistics.median(totals)
+
+    print(f"Worker import time over {args.runs} runs: median {median:.1f}ms "
+          f"(min {min(totals):.1f}ms, max {max(totals):.1f}ms), budget {args.budget_ms:.0f}ms")
+    print()
+    print("Slowest top-level imports (last run):")
+    for name, ms in sorted(runs[-1], key=lambda module: -module[1])[:args.top]:
+        print(f"  {ms:8.1f}ms  {name}")
+
+    if median > args.budget_ms:
+        print(f"\nOVER BUDGET by {median - args.budget_ms:.1f}ms")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -12,6 +12,30 @@ from django.conf import settings
 # Set the default Django settings module for the 'celery' program
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'flowpilot.settings')
 
+# Workers skip Django's system checks at boot: they import the URLconf and
+# every view (DRF included) just to validate them, which is most of a cold
+# start. Run `manage.py check --deploy` in CI/deploys instead; set
+# CELERY_SKIP_CHECKS= (empty) to check on every worker start again.
+os.environ.setdefault('CELERY_SKIP_CHECKS', 'true')
+
+
+def register_orjson_serializer():
+    """
+    Make 'orjson' available as a kombu serializer (CELERY_TASK_SERIALIZER=orjson)
+    
+    orjson is optional; without it the name simply isn't registered.
+    """
+    try:
+        import orjson
+    except ImportError:
+        return False
+    from kombu.serialization import register
+    register('orjson', orjson.dumps, orjson.loads,
+             content_type='application/x-orjson', content_encoding='binary')
+    return True
+
+register_orjson_serializer()
+
 # Create Celery app instance
 app = Celery('flowpilot')
 
@@ -0,0 +1,173 @@
+"""
+Database routing for FlowPilot
+
+Keeps dashboard/listing reads off the primary that workers write to.
+
+Key Concepts:
+- The 'replica' alias exists only when DB_REPLICA_HOST is set; without it
+  everything uses 'default'
+- Only reads made while serving a safe (GET/HEAD/OPTIONS) API request go
+  to the replica, and only for the workflows app (sessions, auth and
+  everything in workers and beat stay on the primary)
+- Read-your-writes: after a client makes a successful write (trigger,
+  cancel, resume, ...) its reads stick to the primary for
+  REPLICA_STICKY_SECONDS, so it never sees the replica lagging behind its
+  own change
+- Transactions run at the database default (READ COMMITTED). Operations
+  that need more use isolation() / run_with_isolation() for that one
+  transaction instead of making every connection serializable
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction, OperationalError
+
+logger = logging.getLogger(__name__)
+
+REPLICA_ALIAS = 'replica'
+# Apps whose reads may be served by the replica
+REPLICA_APPS = {'workflows'}
+SAFE_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+# ===========================
+# ROUTER
+# ===========================
+
+class PrimaryReplicaRouter:
+    """Sends API reads to the replica (see ReplicaRoutingMiddleware); everything else to the primary"""
+
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and model._meta.app_label in REPLICA_APPS and REPLICA_ALIAS in settings.DATABASES:
+            return REPLICA_ALIAS
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Same data on both aliases
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica follows the primary through replication
+        return db == 'default'
+
+
+@contextmanager
+def use_replica(enabled: bool = True):
+    """Route this block's reads to the replica (or force the primary with enabled=False)"""
+    token = _use_replica.set(enabled)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def _pin_key(request) -> str:
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f"db-pin:user:{user.pk}"
+    return f"db-pin:addr:{request.META.get('REMOTE_ADDR', '')}"
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Serve safe requests from the replica unless the client wrote recently
+
+    Goes after AuthenticationMiddleware, so the pin can be keyed by user.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if REPLICA_ALIAS not in settings.DATABASES:
+            return self.get_response(request)
+
+        if request.method not in SAFE_METHODS:
+            response = self.get_response(request)
+            if response.status_code < 400:
+                cache.set(_pin_key(request), True, settings.REPLICA_STICKY_SECONDS)
+            return response
+
+        enabled = not cache.get(_pin_key(request))
+        with use_replica(enabled):
+            response = self.get_response(request)
+        if response.streaming:
+            # Streamed exports run their queries after the view returned
+            response.streaming_content = _stream_with_replica(response.streaming_content, enabled)
+        return response
+
+
+def _stream_with_replica(content, enabled: bool):
+    iterator = iter(content)
+    while True:
+        with use_replica(enabled):
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+        yield chunk
+
+
+# ===========================
+# PER-OPERATION ISOLATION
+# ===========================
+
+ISOLATION_LEVELS = {
+    'read committed': 'READ COMMITTED',
+    'repeatable read': 'REPEATABLE READ',
+    'serializable': 'SERIALIZABLE',
+}
+
+
+@contextmanager
+def isolation(level: str = 'serializable', using: str = 'default'):
+    """
+    A transaction at the given isolation level
+
+    Must be the outermost transaction: the level can only be set before the
+    transaction's first query. On SQLite (serializable anyway) it's a plain
+    atomic block.
+    """
+    connection = connections[using]
+    if connection.in_atomic_block:
+        raise RuntimeError("isolation() can't be nested inside another transaction")
+    with transaction.atomic(using=using):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f"SET TRANSACTION ISOLATION LEVEL {ISOLATION_LEVELS[level]}")
+        yield
+
+
+def _is_serialization_failure(exc: OperationalError) -> bool:
+    # 40001 serialization_failure, 40P01 deadlock_detected
+    cause = exc.__cause__
+    code = getattr(cause, 'sqlstate', None) or getattr(cause, 'pgcode', None)
+    return code in ('40001', '40P01')
+
+
+def run_with_isolation(func, level: str = 'serializable', using: str = 'default', attempts: int = 3):
+    """
+    Run func() in an isolation() transaction, retrying serialization failures
+
+    Returns:
+        Whatever func returns
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            with isolation(level, using):
+                return func()
+        except OperationalError as exc:
+            if attempt == attempts or not _is_serialization_failure(exc):
+                raise
+            logger.info(f"Serialization failure, retrying ({attempt}/{attempts}): {exc}")
+            time.sleep(0.01 * 2 ** attempt)
@@ -11,7 +11,9 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import json
 import os
+from celery.schedules import crontab
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -52,6 +54,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'flowpilot.db.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -99,8 +102,9 @@ if os.getenv('ENV') == 'prod':
             'PORT': os.getenv('DB_PORT', '5432'),
             'OPTIONS': {
                 'connect_timeout': 10,
-                'options': '-c default_transaction_isolation=serializable'
-            }
+            },
+            # Isolation is the server default (READ COMMITTED); operations
+            # that need more ask for it per transaction (flowpilot.db.isolation)
         }
     }
 else:
@@ -130,6 +134,68 @@ else:
         }
 
 
+# Persistent connections for every PostgreSQL alias. Workers issue a stream
+# of short state updates, so reconnecting per task costs more than the
+# update itself: run them with a longer DB_CONN_MAX_AGE (e.g. 600) than the
+# web processes. Health checks drop a connection the server closed instead
+# of failing the next query on it.
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', '60'))
+for _database in DATABASES.values():
+    if _database['ENGINE'] == 'django.db.backends.postgresql':
+        _database['CONN_MAX_AGE'] = DB_CONN_MAX_AGE
+        _database['CONN_HEALTH_CHECKS'] = True
+
+# Read replica: with DB_REPLICA_HOST set, API reads go to a 'replica' alias
+# (see flowpilot/db.py). Clients that just wrote read from the primary for
+# REPLICA_STICKY_SECONDS - keep it above the usual replication lag.
+DB_REPLICA_HOST = os.getenv('DB_REPLICA_HOST')
+if DB_REPLICA_HOST:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': DB_REPLICA_HOST,
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default'].get('PORT', '5432')),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['flowpilot.db.PrimaryReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', '10'))
+
+# Cache Configuration
+# Set CACHE_REDIS_URL in production so workers share one cache; otherwise each
+# process gets its own in-memory stand-in. LocMemCache evicts least recently
+# used entries past MAX_ENTRIES (configure the Redis instance with
+# maxmemory-policy allkeys-lru for the same behaviour).
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL')
+if CACHE_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+        },
+        'step_results': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+            'KEY_PREFIX': 'results',
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'step_results': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'step-results',
+            'OPTIONS': {'MAX_ENTRIES': int(os.getenv('STEP_RESULT_CACHE_ENTRIES', '10000'))},
+        },
+    }
+
+# How long memoized step results are reused (steps can override with idempotency_ttl)
+STEP_RESULT_TTL = int(os.getenv('STEP_RESULT_TTL', '3600'))
+# Seconds a step waits before checking again when an identical keyed step is
+# still running elsewhere (the wait doesn't use up the step's max_retries)
+STEP_IN_FLIGHT_RETRY_SECONDS = int(os.getenv('STEP_IN_FLIGHT_RETRY_SECONDS', '5'))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -181,9 +247,12 @@ CELERY_BROKER_URL = f'redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}'
 # Celery result backend - same as broker for simplicity
 CELERY_RESULT_BACKEND = f'redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}'
 
-# Celery task serialization
-CELERY_ACCEPT_CONTENT = ['json']
-CELERY_TASK_SERIALIZER = 'json'
+# Celery task serialization. Messages only carry ids, so a binary serializer
+# buys encode/decode speed rather than size: 'msgpack' needs the msgpack
+# package, 'orjson' needs orjson (registered in flowpilot/celery.py).
+# json stays accepted so messages queued before a switch still run.
+CELERY_TASK_SERIALIZER = os.getenv('CELERY_TASK_SERIALIZER', 'json')
+CELERY_ACCEPT_CONTENT = sorted({'json', CELERY_TASK_SERIALIZER})
 CELERY_RESULT_SERIALIZER = 'json'
 
 # Celery timezone
@@ -198,10 +267,15 @@ CELERY_TASK_ROUTES = {
 CELERY_WORKER_CONCURRENCY = 4  # Number of parallel tasks per worker
 CELERY_WORKER_PREFETCH_MULTIPLIER = 1  # Only take one task at a time (good for long-running tasks)
 
-# Task execution settings
+# Task execution settings. Workflow steps override these per message from
+# WorkflowStep.timeout_seconds (see step_time_limits in workflows/tasks.py)
 CELERY_TASK_TIME_LIMIT = 300  # 5 minutes max per task (safety)
 CELERY_TASK_SOFT_TIME_LIMIT = 240  # 4 minutes soft limit (graceful shutdown)
 
+# Seconds between a step's soft limit (its timeout_seconds, recorded as
+# timed_out) and the hard kill of a step that ignores it
+STEP_TIMEOUT_GRACE_SECONDS = int(os.getenv('STEP_TIMEOUT_GRACE_SECONDS', '30'))
+
 # Task result settings
 CELERY_RESULT_EXPIRES = 3600  # Results expire after 1 hour
 
@@ -212,6 +286,216 @@ CELERY_WORKER_SEND_TASK_EVENTS = True
 # Error handling
 CELERY_TASK_REJECT_ON_WORKER_LOST = True  # Requeue tasks if worker crashes
 
+# Periodic jobs (run with: celery -A flowpilot beat)
+CELERY_BEAT_SCHEDULE = {
+    'archive-old-executions': {
+        'task': 'workflows.tasks.archive_old_executions',
+        'schedule': crontab(hour=3, minute=0),  # Daily, off-peak
+    },
+    'drain-webhook-spool': {
+        'task': 'workflows.tasks.drain_webhook_spool',
+        'schedule': 2.0,  # Single-host setups; multi-host runs `manage.py drain_webhooks` per web host
+    },
+    'reap-stale-tasks': {
+        'task': 'workflows.tasks.reap_stale_tasks',
+        'schedule': 60.0,  # Every minute
+    },
+    'admit-pending-executions': {
+        'task': 'workflows.tasks.admit_pending_executions',
+        'schedule': 2.0,
+    },
+    'roll-up-task-executions': {
+        'task': 'workflows.tasks.roll_up_task_executions',
+        'schedule': 60.0,
+    },
+    'compact-execution-events': {
+        'task': 'workflows.tasks.compact_execution_events',
+        'schedule': 30.0,
+    },
+    'relay-outbox': {
+        'task': 'workflows.tasks.relay_outbox',
+        'schedule': 5.0,  # Leftovers only; messages normally go out right after commit
+    },
+}
+
+# Worker heartbeats: running steps bump heartbeat_at every INTERVAL seconds;
+# after TIMEOUT seconds without one the reaper re-dispatches or fails the step
+TASK_HEARTBEAT_INTERVAL = int(os.getenv('TASK_HEARTBEAT_INTERVAL', '15'))
+TASK_HEARTBEAT_TIMEOUT = int(os.getenv('TASK_HEARTBEAT_TIMEOUT', '120'))
+
+# ===========================
+# STEP TYPES
+# ===========================
+
+# Extra step types, imported by workers on first use:
+# {"my_step": "myapp.steps.my_step_function"}. Installed packages can also
+# declare them under the 'flowpilot.step_types' entry point group.
+WORKFLOW_STEP_TYPES = json.loads(os.getenv('WORKFLOW_STEP_TYPES', '{}'))
+
+# ===========================
+# ADMISSION CONTROL
+# ===========================
+
+# Past these high-water marks new executions are held 'pending' (nothing
+# dispatched) and the admit-pending-executions feeder starts them later
+ADMISSION_CONTROL_ENABLED = os.getenv('ADMISSION_CONTROL_ENABLED', 'true').lower() == 'true'
+# Dispatched steps not yet picked up by a worker (the broker queue)
+ADMISSION_MAX_QUEUED = int(os.getenv('ADMISSION_MAX_QUEUED', '5000'))
+# Queued + running steps
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv('ADMISSION_MAX_IN_FLIGHT', '10000'))
+# Held executions before API/webhook triggers get 429 + Retry-After
+ADMISSION_MAX_PENDING = int(os.getenv('ADMISSION_MAX_PENDING', '100000'))
+ADMISSION_RETRY_AFTER = int(os.getenv('ADMISSION_RETRY_AFTER', '30'))
+# Executions the feeder starts per run
+ADMISSION_FEED_BATCH = int(os.getenv('ADMISSION_FEED_BATCH', '500'))
+# How long the load snapshot is cached
+ADMISSION_SNAPSHOT_SECONDS = int(os.getenv('ADMISSION_SNAPSHOT_SECONDS', '2'))
+
+# ===========================
+# EXECUTION EVENT LOG
+# ===========================
+
+# Append-only transition log (see workflows/events.py)
+EVENTS_ENABLED = os.getenv('EVENTS_ENABLED', 'true').lower() == 'true'
+
+# Each process buffers events and writes them in one INSERT when this many
+# are waiting, when the oldest is this old, after each task / request /
+# scheduler, dispatcher or webhook drainer pass, and at exit
+EVENT_BUFFER_SIZE = int(os.getenv('EVENT_BUFFER_SIZE', '500'))
+EVENT_FLUSH_SECONDS = float(os.getenv('EVENT_FLUSH_SECONDS', '2'))
+
+# Compaction trails the events' write time (recorded_at) by this much, so an
+# INSERT still committing or a worker clock running behind isn't skipped
+EVENT_COMPACTION_LAG_SECONDS = int(os.getenv('EVENT_COMPACTION_LAG_SECONDS', '30'))
+EVENT_COMPACTION_BATCH = int(os.getenv('EVENT_COMPACTION_BATCH', '5000'))
+
+# ===========================
+# TRANSACTIONAL OUTBOX
+# ===========================
+
+# Messages the relay locks, publishes over one broker connection and deletes
+# per transaction (see workflows/outbox.py)
+OUTBOX_RELAY_BATCH = int(os.getenv('OUTBOX_RELAY_BATCH', '500'))
+
+# After a failed publish a message waits this long before the next attempt,
+# doubling per attempt (at most 5 minutes)
+OUTBOX_RETRY_SECONDS = int(os.getenv('OUTBOX_RETRY_SECONDS', '5'))
+
+# ===========================
+# RESUME
+# ===========================
+
+# Most executions one bulk resume call (POST /api/executions/resume/) picks
+# up; the response says whether more are left. The children are then
+# started through admission control like any other execution.
+RESUME_BATCH_SIZE = int(os.getenv('RESUME_BATCH_SIZE', '500'))
+
+# ===========================
+# CIRCUIT BREAKERS
+# ===========================
+
+# Per-host breakers around http_request steps (see workflows/circuit.py)
+CIRCUIT_BREAKER_ENABLED = os.getenv('CIRCUIT_BREAKER_ENABLED', 'true').lower() == 'true'
+
+# Open when at least CIRCUIT_MIN_CALLS calls in the last CIRCUIT_WINDOW_SECONDS
+# were made and this share of them failed
+CIRCUIT_FAILURE_RATIO = float(os.getenv('CIRCUIT_FAILURE_RATIO', '0.5'))
+CIRCUIT_MIN_CALLS = int(os.getenv('CIRCUIT_MIN_CALLS', '10'))
+CIRCUIT_WINDOW_SECONDS = int(os.getenv('CIRCUIT_WINDOW_SECONDS', '60'))
+
+# How long an open breaker refuses calls before letting probes through
+CIRCUIT_OPEN_SECONDS = int(os.getenv('CIRCUIT_OPEN_SECONDS', '30'))
+CIRCUIT_HALF_OPEN_PROBES = int(os.getenv('CIRCUIT_HALF_OPEN_PROBES', '1'))
+
+# Publish open breakers in the cache so every worker process fails fast
+CIRCUIT_SHARED = os.getenv('CIRCUIT_SHARED', 'true').lower() == 'true'
+
+# 'defer': a refused step waits for the breaker without using a retry
+# 'fail': it fails right away and goes through the step's normal retries.
+# Steps can override with config.on_circuit_open.
+CIRCUIT_OPEN_ACTION = os.getenv('CIRCUIT_OPEN_ACTION', 'defer')
+
+# A step stops being deferred this long after it was created
+CIRCUIT_MAX_DEFER_SECONDS = int(os.getenv('CIRCUIT_MAX_DEFER_SECONDS', '3600'))
+
+# How often each process publishes breaker stats for the metrics endpoint
+CIRCUIT_METRICS_INTERVAL = int(os.getenv('CIRCUIT_METRICS_INTERVAL', '5'))
+
+# ===========================
+# FAIR-SHARE DISPATCH (python manage.py run_dispatcher)
+# ===========================
+
+# When enabled, ready steps wait in per-owner virtual queues and the
+# dispatcher releases them by weighted deficit round-robin instead of every
+# step going straight onto the shared FIFO queue. Needs run_dispatcher.
+FAIR_SHARE_ENABLED = os.getenv('FAIR_SHARE_ENABLED', 'false').lower() == 'true'
+# Queue per 'owner' (Workflow.created_by) or per 'workflow'
+FAIR_SHARE_KEY = os.getenv('FAIR_SHARE_KEY', 'owner')
+# Steps on the broker or in workers at once; keeps the broker queue short so
+# the dispatcher, not FIFO order, decides who runs next
+FAIR_SHARE_MAX_IN_FLIGHT = int(os.getenv('FAIR_SHARE_MAX_IN_FLIGHT', '200'))
+# Relative shares by key (user id or workflow id): {"42": 3}; others get 1.
+# Weights must be positive - the dispatcher refuses to start otherwise
+FAIR_SHARE_WEIGHTS = json.loads(os.getenv('FAIR_SHARE_WEIGHTS', '{}'))
+# Max in-flight steps by key: {"42": 50}; the default applies to the rest (0 = no cap)
+FAIR_SHARE_QUOTAS = json.loads(os.getenv('FAIR_SHARE_QUOTAS', '{}'))
+FAIR_SHARE_DEFAULT_QUOTA = int(os.getenv('FAIR_SHARE_DEFAULT_QUOTA', '0'))
+# Dispatcher poll interval while idle or at capacity
+FAIR_SHARE_TICK_SECONDS = float(os.getenv('FAIR_SHARE_TICK_SECONDS', '0.2'))
+
+# ===========================
+# SCHEDULER (python manage.py run_scheduler)
+# ===========================
+
+# How often the scheduler checks for changed schedules
+SCHEDULER_RELOAD_INTERVAL = float(os.getenv('SCHEDULER_RELOAD_INTERVAL', '30'))
+# Leader lease length; a dead leader is replaced after at most this long
+SCHEDULER_LEASE_SECONDS = int(os.getenv('SCHEDULER_LEASE_SECONDS', '30'))
+
+# ===========================
+# WEBHOOK INGESTION (POST /api/hooks/<workflow_id>/)
+# ===========================
+
+# Events are appended here and turned into executions by the drainer
+WEBHOOK_SPOOL_DIR = os.getenv('WEBHOOK_SPOOL_DIR', str(BASE_DIR / 'spool' / 'webhooks'))
+# Each process rolls to a new segment file this often; closed segments get drained
+WEBHOOK_SPOOL_SEGMENT_SECONDS = int(os.getenv('WEBHOOK_SPOOL_SEGMENT_SECONDS', '2'))
+# fsync every event (survives power loss, costs throughput)
+WEBHOOK_SPOOL_FSYNC = os.getenv('WEBHOOK_SPOOL_FSYNC', 'false').lower() == 'true'
+WEBHOOK_MAX_BODY_BYTES = int(os.getenv('WEBHOOK_MAX_BODY_BYTES', str(256 * 1024)))
+
+# ===========================
+# EXECUTION RETENTION
+# ===========================
+
+# Finished executions older than this are moved to compressed archive files
+EXECUTION_RETENTION_DAYS = int(os.getenv('EXECUTION_RETENTION_DAYS', '90'))
+# Executions per archive file / delete transaction (keeps lock time short)
+EXECUTION_RETENTION_BATCH_SIZE = int(os.getenv('EXECUTION_RETENTION_BATCH_SIZE', '1000'))
+EXECUTION_ARCHIVE_DIR = os.getenv('EXECUTION_ARCHIVE_DIR', str(BASE_DIR / 'archive'))
+
+# ===========================
+# ANALYTICS ROLLUPS
+# ===========================
+
+# Tasks that finished less than this long ago wait for the next rollup run,
+# so rows committed slightly after their completed_at are never skipped
+ANALYTICS_ROLLUP_LAG_SECONDS = int(os.getenv('ANALYTICS_ROLLUP_LAG_SECONDS', '60'))
+# Task executions folded per transaction
+ANALYTICS_ROLLUP_BATCH_SIZE = int(os.getenv('ANALYTICS_ROLLUP_BATCH_SIZE', '5000'))
+
+# ===========================
+# FRACTAL RENDERING (render_fractal step type)
+# ===========================
+
+# Step configs name an output_path; it is resolved under this directory and
+# anything that points outside it is rejected
+FRACTAL_OUTPUT_DIR = os.getenv('FRACTAL_OUTPUT_DIR', str(BASE_DIR / 'renders'))
+# Upper bounds for a single render (a step config can't ask for more)
+FRACTAL_MAX_WIDTH = int(os.getenv('FRACTAL_MAX_WIDTH', '8000'))
+FRACTAL_MAX_HEIGHT = int(os.getenv('FRACTAL_MAX_HEIGHT', '8000'))
+FRACTAL_MAX_ITER = int(os.getenv('FRACTAL_MAX_ITER', '5000'))
+
 # Development settings
 if DEBUG:
     # In development, execute tasks synchronously for easier debugging
@@ -1,3 +1,222 @@
-from django.contrib import admin
+"""
+FlowPilot Admin
 
-# Register your models here.
+Django admin for workflows, executions and steps that stays usable when
+the execution tables hold hundreds of millions of rows.
+
+Key Concepts:
+- No COUNT(*) over a whole table: the paginator uses the planner's row
+  estimate for unfiltered lists and a bounded count for filtered ones, and
+  show_full_result_count is off
+- Each list page is one query: list_select_related covers every relation
+  a column or __str__ touches (the action checkbox renders str(row), and
+  TaskExecution's would otherwise load its execution, workflow and step
+  per row)
+- Only filters and sort columns that hit an index; foreign keys are
+  raw-id widgets, so a change form never renders a <select> of every row
+- Bulk actions (cancel, retry, resume) walk the selection by primary key
+  in batches and reuse the batched engine calls (cancel_executions,
+  execute_many, resume_many). delete_selected is disabled on the
+  execution tables - retention.py removes old runs
+"""
+
+import logging
+
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from .control import cancel_executions, ACTIVE_STATUSES
+from .models import Workflow, WorkflowExecution, TaskExecution
+from .orchestrator import Orchestrator, RESUMABLE_STATUSES
+
+logger = logging.getLogger(__name__)
+
+# Filtered lists count at most this many rows (100 pages at 100 per page)
+EXACT_COUNT_LIMIT = 10000
+# Rows handed to the engine per call in bulk actions
+ACTION_BATCH_SIZE = 1000
+# Rows one action request works through; run it again for the rest
+ACTION_MAX_ROWS = 50000
+
+
+# ===========================
+# PAGINATION
+# ===========================
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that never counts a big table exactly
+
+    Unfiltered PostgreSQL lists use pg_class.reltuples (kept current by
+    autovacuum/ANALYZE); everything else is counted up to
+    EXACT_COUNT_LIMIT rows, so the last pages of a huge filter are cut off
+    instead of scanned.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = self._estimate(queryset)
+            if estimate is not None:
+                return estimate
+        return queryset.order_by()[:EXACT_COUNT_LIMIT].count()
+
+    def _estimate(self, queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        # -1 until the table has been analyzed once
+        if not row or row[0] < EXACT_COUNT_LIMIT:
+            return None
+        return row[0]
+
+
+# ===========================
+# BULK ACTIONS
+# ===========================
+
+def _id_batches(queryset):
+    """Primary keys of an action's selection, ACTION_BATCH_SIZE at a time (up to ACTION_MAX_ROWS)"""
+    queryset = queryset.order_by('pk')
+    last_id, seen = None, 0
+    while seen < ACTION_MAX_ROWS:
+        batch = queryset if last_id is None else queryset.filter(pk__gt=last_id)
+        ids = list(batch.values_list('pk', flat=True)[:min(ACTION_BATCH_SIZE, ACTION_MAX_ROWS - seen)])
+        if not ids:
+            return
+        yield ids
+        seen += len(ids)
+        last_id = ids[-1]
+
+
+def _report(modeladmin, request, verb: str, done: int, batches: int):
+    level = messages.SUCCESS if done else messages.WARNING
+    modeladmin.message_user(request, f"{verb} {done} executions.", level)
+    if batches * ACTION_BATCH_SIZE >= ACTION_MAX_ROWS:
+        modeladmin.message_user(
+            request,
+            f"Stopped after {ACTION_MAX_ROWS} selected rows; run the action again for the rest.",
+            messages.WARNING,
+        )
+
+
+def _cancel(modeladmin, request, execution_batches):
+    cancelled = batches = 0
+    for execution_ids in execution_batches:
+        cancelled += cancel_executions(execution_ids, reason=f"Cancelled by {request.user} (admin)")['executions']
+        batches += 1
+    _report(modeladmin, request, 'Cancelled', cancelled, batches)
+
+
+def _resume(modeladmin, request, execution_batches):
+    resumed = batches = 0
+    for execution_ids in execution_batches:
+        resumed += len(Orchestrator().resume_many(execution_ids, triggered_by=request.user))
+        batches += 1
+    _report(modeladmin, request, 'Resumed', resumed, batches)
+
+
+class BulkActionsMixin:
+    """Drops delete_selected: it loads every selected row and its cascades into memory"""
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+
+# ===========================
+# MODEL ADMINS
+# ===========================
+
+@admin.register(Workflow)
+class WorkflowAdmin(admin.ModelAdmin):
+    list_display = ('name', 'version', 'trigger_type', 'is_active', 'created_by', 'total_executions',
+                    'successful_executions', 'created_at')
+    list_select_related = ('created_by',)
+    # Small table: trigger_type doesn't need an index to filter on
+    list_filter = ('is_active', 'trigger_type')
+    search_fields = ('name',)
+    raw_id_fields = ('created_by',)
+    readonly_fields = ('total_executions', 'successful_executions', 'created_at', 'updated_at')
+    ordering = ('-created_at',)
+
+
+@admin.register(WorkflowExecution)
+class WorkflowExecutionAdmin(BulkActionsMixin, admin.ModelAdmin):
+    list_display = ('id', 'workflow', 'status', 'trigger_source', 'created_at', 'started_at', 'completed_at')
+    list_select_related = ('workflow',)
+    # (status, started_at) and (workflow, status) indexes; created_at's
+    # filter choices are fixed ranges, so rendering them runs no query
+    list_filter = ('status', ('created_at', admin.DateFieldListFilter))
+    sortable_by = ('created_at',)
+    ordering = ('-created_at',)
+    raw_id_fields = ('workflow', 'failed_step', 'triggered_by', 'parent_execution', 'parent_task_execution')
+    readonly_fields = ('created_at',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ('cancel_selected', 'retry_selected', 'resume_selected')
+
+    @admin.action(description="Cancel selected executions", permissions=['change'])
+    def cancel_selected(self, request, queryset):
+        _cancel(self, request, _id_batches(queryset.filter(status__in=ACTIVE_STATUSES)))
+
+    @admin.action(description="Retry selected executions from the start", permissions=['change'])
+    def retry_selected(self, request, queryset):
+        retried = batches = 0
+        queryset = queryset.filter(status__in=RESUMABLE_STATUSES, parent_task_execution__isnull=True)
+        for execution_ids in _id_batches(queryset):
+            runs = WorkflowExecution.objects.filter(id__in=execution_ids).values_list('workflow_id', 'input_data')
+            retried += len(Orchestrator().execute_many(runs, triggered_by=request.user, trigger_source='retry'))
+            batches += 1
+        _report(self, request, 'Started new runs of', retried, batches)
+
+    @admin.action(description="Resume selected executions from the failed step", permissions=['change'])
+    def resume_selected(self, request, queryset):
+        _resume(self, request, _id_batches(queryset.filter(status__in=RESUMABLE_STATUSES)))
+
+
+@admin.register(TaskExecution)
+class TaskExecutionAdmin(BulkActionsMixin, admin.ModelAdmin):
+    list_display = ('id', 'step_name', 'workflow_execution_id', 'status', 'retry_count', 'worker_id',
+                    'created_at', 'started_at', 'completed_at')
+    # Joined on primary keys for one page of rows; __str__ needs all three
+    list_select_related = ('step', 'workflow_execution__workflow')
+    # status leads three indexes; created_at as above
+    list_filter = ('status', ('created_at', admin.DateFieldListFilter))
+    sortable_by = ('created_at',)
+    # The model's default ordering (step__step_order) would join and sort the whole table
+    ordering = ('-created_at',)
+    raw_id_fields = ('workflow_execution', 'step', 'reused_from')
+    readonly_fields = ('created_at',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ('cancel_selected_executions', 'retry_steps')
+
+    @admin.display(description='Step')
+    def step_name(self, task_execution):
+        return task_execution.step.name
+
+    def _execution_batches(self, queryset):
+        for task_ids in _id_batches(queryset):
+            yield list(
+                TaskExecution.objects.filter(id__in=task_ids)
+                .order_by().values_list('workflow_execution_id', flat=True).distinct()
+            )
+
+    @admin.action(description="Cancel the executions of selected steps", permissions=['change'])
+    def cancel_selected_executions(self, request, queryset):
+        _cancel(self, request, self._execution_batches(queryset))
+
+    @admin.action(description="Retry selected failed steps (resumes their executions)", permissions=['change'])
+    def retry_steps(self, request, queryset):
+        _resume(self, request, self._execution_batches(queryset.filter(status__in=['failed', 'timed_out'])))
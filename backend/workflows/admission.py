@@ -0,0 +1,176 @@
+"""
+FlowPilot Admission Control
+
+Stops execution triggers from piling more work onto the broker than the
+workers can drain.
+
+Key Concepts:
+- Load is read from the database, not the broker: steps that were
+  dispatched but not picked up yet are the queue, 'running' steps are in flight
+- Below the high-water marks new executions start right away. Above them
+  (or while older executions are still held) they are created 'pending'
+  with nothing dispatched, and the feeder starts them oldest first as
+  capacity frees up
+- Past ADMISSION_MAX_PENDING held executions, API triggers are rejected
+  (429 + Retry-After); scheduled, webhook and sub-workflow runs are only held
+- The load snapshot is cached for a couple of seconds, so checking it on
+  every trigger costs a cache read. The webhook endpoint only ever reads
+  the cache (a miss counts as "not full"); the webhook drainer refreshes it
+"""
+
+import logging
+from typing import Dict, Any, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef
+from django.utils import timezone
+
+from .events import record_many
+from .models import WorkflowExecution, WorkflowStep, TaskExecution
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_KEY = 'admission-snapshot'
+
+
+class AdmissionRejected(Exception):
+    """The backlog of held executions is full; try again after retry_after seconds"""
+
+    def __init__(self, retry_after: int, pending: int):
+        self.retry_after = retry_after
+        self.pending = pending
+        super().__init__(f"Execution backlog full ({pending} pending), retry in {retry_after}s")
+
+
+def load_snapshot(fresh: bool = False) -> Dict[str, int]:
+    """
+    Current load
+
+    Returns:
+        dict: queued (dispatched, not started) and running steps, and
+        executions held pending
+    """
+    snapshot = None if fresh else cache.get(SNAPSHOT_KEY)
+    if snapshot is None:
+        steps = dict(
+            TaskExecution.objects
+            .filter(status__in=['pending', 'running', 'retrying'], dispatched_at__isnull=False)
+            .order_by().values_list('status').annotate(n=Count('id'))
+        )
+        snapshot = {
+            'queued': steps.get('pending', 0) + steps.get('retrying', 0),
+            'running': steps.get('running', 0),
+            'pending_executions': WorkflowExecution.objects.filter(status='pending').count(),
+        }
+        cache.set(SNAPSHOT_KEY, snapshot, settings.ADMISSION_SNAPSHOT_SECONDS)
+    return snapshot
+
+
+def has_capacity(snapshot: Dict[str, int]) -> bool:
+    return (
+        snapshot['queued'] < settings.ADMISSION_MAX_QUEUED
+        and snapshot['queued'] + snapshot['running'] < settings.ADMISSION_MAX_IN_FLIGHT
+    )
+
+
+def backlog_full(snapshot: Optional[Dict[str, int]] = None, cached_only: bool = False) -> bool:
+    """
+    Is the backlog of held executions full?
+
+    cached_only never queries the database: without a cached snapshot the
+    answer is "not full" (for request paths that must stay DB-free; the
+    webhook drainer keeps the snapshot warm)
+    """
+    if not settings.ADMISSION_CONTROL_ENABLED:
+        return False
+    if snapshot is None:
+        snapshot = cache.get(SNAPSHOT_KEY) if cached_only else load_snapshot()
+        if snapshot is None:
+            return False
+    return snapshot['pending_executions'] >= settings.ADMISSION_MAX_PENDING
+
+
+def admit(count: int, reject_when_full: bool = False) -> bool:
+    """
+    Decide whether `count` new executions may start now
+
+    Returns:
+        bool: True to dispatch them now, False to hold them pending
+
+    Raises:
+        AdmissionRejected: reject_when_full and the pending backlog is full
+    """
+    if not settings.ADMISSION_CONTROL_ENABLED:
+        return True
+    snapshot = load_snapshot()
+    if reject_when_full and snapshot['pending_executions'] + count > settings.ADMISSION_MAX_PENDING:
+        raise AdmissionRejected(settings.ADMISSION_RETRY_AFTER, snapshot['pending_executions'])
+    # Held executions go first - newcomers don't jump the backlog
+    return has_capacity(snapshot) and not snapshot['pending_executions']
+
+
+def hold_count(count: int):
+    """Keep the cached snapshot roughly right between refreshes"""
+    snapshot = cache.get(SNAPSHOT_KEY)
+    if snapshot is not None:
+        snapshot['pending_executions'] += count
+        cache.set(SNAPSHOT_KEY, snapshot, settings.ADMISSION_SNAPSHOT_SECONDS)
+
+
+def feed_pending_executions(batch_size: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Start held executions, oldest first, while there is capacity
+
+    Each admitted execution dispatches the steps whose dependencies are
+    all completed - its root steps, or for a resumed execution the first
+    steps after the reused ones. One execution is counted as one step of
+    headroom.
+
+    Returns:
+        dict: Number of executions started and the load seen
+    """
+    from .tasks import dispatch_task_executions
+
+    batch_size = batch_size or settings.ADMISSION_FEED_BATCH
+    snapshot = load_snapshot(fresh=True)
+    headroom = min(
+        settings.ADMISSION_MAX_IN_FLIGHT - snapshot['queued'] - snapshot['running'],
+        settings.ADMISSION_MAX_QUEUED - snapshot['queued'],
+        batch_size,
+    )
+    summary = {'started': 0, **snapshot}
+    if headroom <= 0 or not snapshot['pending_executions']:
+        return summary
+
+    candidates = list(
+        WorkflowExecution.objects.filter(status='pending')
+        .order_by('created_at').values_list('id', flat=True)[:headroom]
+    )
+    started = []
+    now = timezone.now()
+    # A dependency of the step, in the same execution, that hasn't completed
+    unfinished_dependency = TaskExecution.objects.filter(
+        workflow_execution_id=OuterRef('workflow_execution_id'),
+        step_id__in=WorkflowStep.depends_on.through.objects.filter(
+            from_workflowstep_id=OuterRef(OuterRef('step_id')),
+        ).values('to_workflowstep_id'),
+    ).exclude(status='completed')
+    # Started together with their outbox messages, or not at all
+    with transaction.atomic():
+        for execution_id in candidates:
+            # Conditional update: a concurrent feeder, cancel or pause wins cleanly
+            if WorkflowExecution.objects.filter(id=execution_id, status='pending').update(status='running', started_at=now):
+                started.append(execution_id)
+        record_many([(execution_id, None) for execution_id in started], 'execution.started', at=now)
+        dispatch_task_executions(
+            TaskExecution.objects.filter(
+                workflow_execution_id__in=started, status='pending', ready_at__isnull=True,
+            ).exclude(Exists(unfinished_dependency)).select_related('step')
+        )
+    summary['started'] = len(started)
+    cache.delete(SNAPSHOT_KEY)
+    if started:
+        logger.info(f"Admitted {len(started)} held executions ({snapshot['pending_executions'] - len(started)} still pending)")
+    return summary
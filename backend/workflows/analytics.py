@@ -0,0 +1,240 @@
+"""
+FlowPilot Execution Analytics
+
+Incremental per-step/per-hour rollups of task executions, and the queries
+the analytics API runs against them.
+
+Key Concepts:
+- The rollup job reads finished TaskExecutions past a (completed_at, id)
+  watermark, folds them into StepHourlyRollup rows and advances the
+  watermark in the same transaction - each row is counted exactly once
+- Rows younger than ANALYTICS_ROLLUP_LAG_SECONDS are left for the next run,
+  so a task committed a little after its completed_at isn't skipped
+- Durations go into a log-scale histogram (4 buckets per doubling, ~9%
+  resolution). Histograms add up, so p50/p95 over any time range are
+  computed from the rollups alone.
+- Dashboard reads touch (steps x hours) rollup rows, never TaskExecution
+"""
+
+import logging
+import math
+from collections import defaultdict
+from datetime import timedelta
+from typing import Dict, Any, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import TaskExecution, StepHourlyRollup, Watermark
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_NAME = 'task-execution-rollup'
+COUNTER_FIELDS = ['count', 'failures', 'cancelled', 'retries', 'timed', 'total_duration_ms']
+
+# Histogram buckets: bucket i covers [2^(i/4), 2^((i+1)/4)) ms; the last one is open-ended
+BUCKETS_PER_DOUBLING = 4
+MAX_BUCKET = BUCKETS_PER_DOUBLING * 32
+
+
+# ===========================
+# HISTOGRAMS
+# ===========================
+
+def duration_bucket(duration_ms: float) -> int:
+    if duration_ms < 1:
+        return 0
+    return min(int(math.log2(duration_ms) * BUCKETS_PER_DOUBLING), MAX_BUCKET)
+
+
+def merge_histograms(target: Dict[str, int], source: Dict[str, int]) -> Dict[str, int]:
+    for bucket, count in source.items():
+        target[bucket] = target.get(bucket, 0) + count
+    return target
+
+
+def histogram_percentile(histogram: Dict[str, int], q: float) -> Optional[float]:
+    """Estimate the q-th quantile (0..1) in ms, from the geometric middle of its bucket"""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    rank = q * total
+    seen = 0
+    for bucket in sorted(histogram, key=int):
+        seen += histogram[bucket]
+        if seen >= rank:
+            return round(2 ** ((int(bucket) + 0.5) / BUCKETS_PER_DOUBLING), 1)
+    return None
+
+
+# ===========================
+# ROLLUP JOB
+# ===========================
+
+def _fold(rows: List[Dict[str, Any]]):
+    """Add a batch of finished tasks to their StepHourlyRollup rows"""
+    totals = defaultdict(lambda: {'counters': defaultdict(int), 'histogram': {}})
+    for row in rows:
+        hour = row['completed_at'].replace(minute=0, second=0, microsecond=0)
+        bucket = totals[(row['workflow_execution__workflow_id'], row['step_id'], hour)]
+        counters = bucket['counters']
+        counters['count'] += 1
+        counters['failures'] += row['status'] in ('failed', 'timed_out')
+        counters['cancelled'] += row['status'] == 'cancelled'
+        counters['retries'] += row['retry_count']
+        if row['started_at']:
+            duration_ms = max((row['completed_at'] - row['started_at']).total_seconds() * 1000, 0)
+            counters['timed'] += 1
+            counters['total_duration_ms'] += int(duration_ms)
+            key = str(duration_bucket(duration_ms))
+            bucket['histogram'][key] = bucket['histogram'].get(key, 0) + 1
+
+    existing = {
+        (rollup.step_id, rollup.hour): rollup
+        for rollup in StepHourlyRollup.objects.select_for_update().filter(
+            step_id__in={key[1] for key in totals},
+            hour__in={key[2] for key in totals},
+        )
+    }
+    to_create, to_update = [], []
+    for (workflow_id, step_id, hour), values in totals.items():
+        rollup = existing.get((step_id, hour))
+        if rollup is None:
+            to_create.append(StepHourlyRollup(
+                workflow_id=workflow_id, step_id=step_id, hour=hour,
+                duration_histogram=values['histogram'],
+                **{f: values['counters'][f] for f in COUNTER_FIELDS},
+            ))
+        else:
+            for f in COUNTER_FIELDS:
+                setattr(rollup, f, getattr(rollup, f) + values['counters'][f])
+            merge_histograms(rollup.duration_histogram, values['histogram'])
+            to_update.append(rollup)
+
+    StepHourlyRollup.objects.bulk_create(to_create)
+    StepHourlyRollup.objects.bulk_update(to_update, COUNTER_FIELDS + ['duration_histogram'])
+
+
+def roll_up_task_executions(batch_size: Optional[int] = None, max_batches: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Fold newly finished task executions into the hourly rollups
+
+    Returns:
+        dict: Number of tasks folded and the new watermark
+    """
+    batch_size = batch_size or settings.ANALYTICS_ROLLUP_BATCH_SIZE
+    horizon = timezone.now() - timedelta(seconds=settings.ANALYTICS_ROLLUP_LAG_SECONDS)
+    summary = {'tasks': 0, 'batches': 0, 'watermark': None}
+
+    while max_batches is None or summary['batches'] < max_batches:
+        with transaction.atomic():
+            # The row lock also keeps two rollup runs from folding the same batch
+            Watermark.objects.get_or_create(name=WATERMARK_NAME)
+            watermark = Watermark.objects.select_for_update().get(name=WATERMARK_NAME)
+
+            # Steps copied into a resumed execution were already counted where they ran
+            queryset = TaskExecution.objects.filter(
+                completed_at__isnull=False, completed_at__lte=horizon, reused_from__isnull=True,
+            )
+            if watermark.position is not None:
+                queryset = queryset.filter(
+                    Q(completed_at__gt=watermark.position)
+                    | Q(completed_at=watermark.position, id__gt=watermark.last_id)
+                )
+            rows = list(
+                queryset.order_by('completed_at', 'id').values(
+                    'id', 'step_id', 'workflow_execution__workflow_id', 'status',
+                    'started_at', 'completed_at', 'retry_count',
+                )[:batch_size]
+            )
+            if rows:
+                _fold(rows)
+                watermark.position = rows[-1]['completed_at']
+                watermark.last_id = rows[-1]['id']
+                watermark.save(update_fields=['position', 'last_id', 'updated_at'])
+
+        summary['watermark'] = watermark.position
+        if not rows:
+            break
+        summary['tasks'] += len(rows)
+        summary['batches'] += 1
+        if len(rows) < batch_size:
+            break
+
+    if summary['tasks']:
+        logger.info(f"Rolled up {summary['tasks']} task executions up to {summary['watermark']}")
+    return summary
+
+
+# ===========================
+# QUERIES
+# ===========================
+
+def _summarize(counters: Dict[str, int], histogram: Dict[str, int]) -> Dict[str, Any]:
+    count = counters['count']
+    return {
+        'count': count,
+        'failures': counters['failures'],
+        'cancelled': counters['cancelled'],
+        'failure_rate': round(counters['failures'] / count, 4) if count else 0,
+        'retries': counters['retries'],
+        'avg_duration_ms': round(counters['total_duration_ms'] / counters['timed'], 1) if counters['timed'] else None,
+        'p50_duration_ms': histogram_percentile(histogram, 0.50),
+        'p95_duration_ms': histogram_percentile(histogram, 0.95),
+    }
+
+
+def workflow_analytics(workflow, since, until, series: bool = False) -> Dict[str, Any]:
+    """
+    Per-step and overall task stats for a workflow between two datetimes
+
+    Hours are whole: a range starting at 10:30 includes the 10:00 rollup.
+
+    Args:
+        series: Also return hourly totals for charting
+    """
+    rollups = (
+        StepHourlyRollup.objects
+        .filter(workflow=workflow, hour__gte=since.replace(minute=0, second=0, microsecond=0), hour__lt=until)
+        .order_by()
+        .values('step_id', 'hour', 'duration_histogram', *COUNTER_FIELDS)
+    )
+    names = dict(workflow.steps.values_list('id', 'name'))
+
+    def empty():
+        return {'counters': defaultdict(int), 'histogram': {}}
+
+    overall, by_step, by_hour = empty(), defaultdict(empty), defaultdict(empty)
+    for rollup in rollups:
+        targets = [overall, by_step[rollup['step_id']]]
+        if series:
+            targets.append(by_hour[rollup['hour']])
+        for target in targets:
+            for f in COUNTER_FIELDS:
+                target['counters'][f] += rollup[f]
+            merge_histograms(target['histogram'], rollup['duration_histogram'])
+
+    watermark = Watermark.objects.filter(name=WATERMARK_NAME).values_list('position', flat=True).first()
+    result = {
+        'workflow': str(workflow.id),
+        'since': since.isoformat(),
+        'until': until.isoformat(),
+        # Tasks finished after this aren't in the numbers yet
+        'up_to': watermark.isoformat() if watermark else None,
+        'totals': _summarize(overall['counters'], overall['histogram']),
+        'steps': sorted(
+            (
+                {'step_id': str(step_id), 'name': names.get(step_id), **_summarize(v['counters'], v['histogram'])}
+                for step_id, v in by_step.items()
+            ),
+            key=lambda step: -step['count'],
+        ),
+    }
+    if series:
+        result['series'] = [
+            {'hour': hour.isoformat(), **_summarize(by_hour[hour]['counters'], by_hour[hour]['histogram'])}
+            for hour in sorted(by_hour)
+        ]
+    return result
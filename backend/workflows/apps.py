@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class WorkflowsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'workflows'
+
+    def ready(self):
+        # Buffered execution events are written after every task and request, and at exit
+        import atexit
+        from celery.signals import task_postrun, worker_process_shutdown
+        from django.core.signals import request_finished
+        from .events import flush_events
+
+        task_postrun.connect(flush_events, weak=False)
+        worker_process_shutdown.connect(flush_events, weak=False)
+        request_finished.connect(flush_events, weak=False)
+        atexit.register(flush_events)
@@ -0,0 +1,267 @@
+"""
+FlowPilot Circuit Breakers
+
+Stops steps from tying up workers on a partner API that is already known
+to be down.
+
+Key Concepts:
+- One breaker per target host, shared by every step in the worker process
+- Closed: calls go through and their outcomes are counted over the last
+  CIRCUIT_WINDOW_SECONDS. Once CIRCUIT_MIN_CALLS calls were seen and the
+  failure ratio reaches CIRCUIT_FAILURE_RATIO, the breaker opens
+- Open: calls fail right away with CircuitOpen for CIRCUIT_OPEN_SECONDS.
+  execute_workflow_task defers the step until the breaker may close
+  (without using up a retry), or fails it fast with on_circuit_open='fail'
+- Half-open: then CIRCUIT_HALF_OPEN_PROBES calls are let through; a success
+  closes the breaker, a failure opens it again
+- With CIRCUIT_SHARED, an open breaker is published in the cache, so the
+  other worker processes stop calling the host too (Redis in production,
+  LocMemCache - process-local - in development)
+- Failures are connection errors, timeouts and 5xx/429 responses; any other
+  response means the host is up
+- Each process publishes its breaker stats to the cache every few seconds
+  for GET /api/metrics/circuit-breakers/
+"""
+
+import logging
+import math
+import os
+import socket
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+OPEN_KEY_PREFIX = 'circuit-open:'
+METRICS_KEY_PREFIX = 'circuit-metrics:'
+METRICS_INDEX_KEY = 'circuit-metrics-processes'
+# Published stats outlive a few missed intervals, then a dead process drops out
+METRICS_TTL_INTERVALS = 12
+
+
+class CircuitOpen(Exception):
+    """Calls to `key` are being refused; the breaker may let calls through after retry_after seconds"""
+
+    def __init__(self, key: str, retry_after: int):
+        self.key = key
+        self.retry_after = retry_after
+        super().__init__(f"Circuit open for {key}, retry in {retry_after}s")
+
+
+class CircuitBreaker:
+    """
+    Failure-ratio circuit breaker for one target
+
+    Thread-safe: a worker's threads share one instance per key.
+    """
+
+    def __init__(self, key: str, failure_ratio: float = 0.5, min_calls: int = 10, window_seconds: float = 60,
+                 open_seconds: float = 30, half_open_probes: int = 1, shared: bool = False):
+        self.key = key
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.shared = shared
+        self.state = 'closed'
+        self.opened_until = 0.0
+        self.probes = 0
+        self.probe_started = 0.0
+        self.outcomes = deque()  # (monotonic time, ok) within the window
+        self.counters = {'calls': 0, 'failures': 0, 'rejected': 0, 'opened': 0}
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """
+        Ask to make a call
+
+        Raises:
+            CircuitOpen: the call must not be made
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.state == 'closed' and self.shared:
+                # Another process may have opened it
+                shared_until = cache.get(f"{OPEN_KEY_PREFIX}{self.key}")
+                if shared_until and shared_until > time.time():
+                    self._open(now, shared_until - time.time(), publish=False)
+            if self.state == 'open':
+                if now < self.opened_until:
+                    self.counters['rejected'] += 1
+                    raise CircuitOpen(self.key, math.ceil(self.opened_until - now))
+                self.state = 'half_open'
+                self.probes = 0
+            if self.state == 'half_open':
+                # A probe that never reported back (worker killed mid-call) stops counting after open_seconds
+                if self.probes >= self.half_open_probes and now - self.probe_started < self.open_seconds:
+                    self.counters['rejected'] += 1
+                    raise CircuitOpen(self.key, math.ceil(self.open_seconds))
+                if self.probes >= self.half_open_probes:
+                    self.probes = 0
+                self.probes += 1
+                self.probe_started = now
+
+    def record_success(self):
+        with self._lock:
+            self.counters['calls'] += 1
+            if self.state == 'half_open':
+                self._close()
+                return
+            self._record(time.monotonic(), True)
+
+    def record_failure(self):
+        with self._lock:
+            now = time.monotonic()
+            self.counters['calls'] += 1
+            self.counters['failures'] += 1
+            if self.state == 'half_open':
+                self._open(now, self.open_seconds)
+                return
+            self._record(now, False)
+            calls = len(self.outcomes)
+            failures = sum(1 for _, ok in self.outcomes if not ok)
+            if self.state == 'closed' and calls >= self.min_calls and failures / calls >= self.failure_ratio:
+                self._open(now, self.open_seconds)
+
+    def _record(self, now: float, ok: bool):
+        self.outcomes.append((now, ok))
+        while self.outcomes and self.outcomes[0][0] < now - self.window_seconds:
+            self.outcomes.popleft()
+
+    def _open(self, now: float, seconds: float, publish: bool = True):
+        self.state = 'open'
+        self.opened_until = now + seconds
+        self.outcomes.clear()
+        self.counters['opened'] += 1
+        if publish:
+            logger.warning(f"Circuit opened for {self.key} for {seconds:.0f}s")
+            if self.shared:
+                cache.set(f"{OPEN_KEY_PREFIX}{self.key}", time.time() + seconds, math.ceil(seconds))
+
+    def _close(self):
+        self.state = 'closed'
+        self.probes = 0
+        self.outcomes.clear()
+        logger.info(f"Circuit closed for {self.key}")
+        if self.shared:
+            cache.delete(f"{OPEN_KEY_PREFIX}{self.key}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            failures = sum(1 for _, ok in self.outcomes if not ok)
+            return {
+                'state': self.state,
+                'window_calls': len(self.outcomes),
+                'window_failure_ratio': round(failures / len(self.outcomes), 4) if self.outcomes else 0,
+                'retry_after': max(math.ceil(self.opened_until - now), 0) if self.state == 'open' else 0,
+                **self.counters,
+            }
+
+
+# ===========================
+# PROCESS-WIDE REGISTRY
+# ===========================
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+_last_published = 0.0
+
+
+def breaker_for(key: str) -> CircuitBreaker:
+    """The process's breaker for a target (e.g. a host name)"""
+    breaker = _breakers.get(key)
+    if breaker is None:
+        with _registry_lock:
+            breaker = _breakers.get(key)
+            if breaker is None:
+                breaker = _breakers[key] = CircuitBreaker(
+                    key,
+                    failure_ratio=settings.CIRCUIT_FAILURE_RATIO,
+                    min_calls=settings.CIRCUIT_MIN_CALLS,
+                    window_seconds=settings.CIRCUIT_WINDOW_SECONDS,
+                    open_seconds=settings.CIRCUIT_OPEN_SECONDS,
+                    half_open_probes=settings.CIRCUIT_HALF_OPEN_PROBES,
+                    shared=settings.CIRCUIT_SHARED,
+                )
+    return breaker
+
+
+def guarded(key: str):
+    """
+    Breaker to wrap an outbound call with, or None when breakers are disabled
+
+    Usage:
+        breaker = guarded(host)
+        if breaker: breaker.before_call()
+        ... make the call, then breaker.record_success() / record_failure()
+    """
+    if not settings.CIRCUIT_BREAKER_ENABLED:
+        return None
+    publish_metrics()
+    return breaker_for(key)
+
+
+def local_metrics() -> Dict[str, Dict[str, Any]]:
+    """Breaker stats of this process, per key"""
+    return {key: breaker.snapshot() for key, breaker in list(_breakers.items())}
+
+
+def publish_metrics(force: bool = False):
+    """Write this process's stats to the cache, at most every CIRCUIT_METRICS_INTERVAL seconds"""
+    global _last_published
+    now = time.monotonic()
+    if not _breakers or (not force and now - _last_published < settings.CIRCUIT_METRICS_INTERVAL):
+        return
+    _last_published = now
+    process = f"{socket.gethostname()}:{os.getpid()}"
+    ttl = max(settings.CIRCUIT_METRICS_INTERVAL, 1) * METRICS_TTL_INTERVALS
+    cache.set(f"{METRICS_KEY_PREFIX}{process}", local_metrics(), ttl)
+    # Read-modify-write: a process lost to a race is re-added on its next publish
+    processes = cache.get(METRICS_INDEX_KEY) or []
+    if process not in processes:
+        cache.set(METRICS_INDEX_KEY, processes + [process], None)
+
+
+def collect_metrics() -> Dict[str, Any]:
+    """
+    Breaker stats of every process that published recently
+
+    Returns:
+        dict: per key, the worst state across processes, summed counters and
+        the per-process detail
+    """
+    processes = cache.get(METRICS_INDEX_KEY) or []
+    published = cache.get_many([f"{METRICS_KEY_PREFIX}{process}" for process in processes])
+    live = [process for process in processes if f"{METRICS_KEY_PREFIX}{process}" in published]
+    if len(live) != len(processes):
+        cache.set(METRICS_INDEX_KEY, live, None)
+
+    severity = {'closed': 0, 'half_open': 1, 'open': 2}
+    breakers = {}
+    for process in live:
+        for key, stats in published[f"{METRICS_KEY_PREFIX}{process}"].items():
+            merged = breakers.setdefault(key, {
+                'state': 'closed', 'calls': 0, 'failures': 0, 'rejected': 0, 'opened': 0, 'processes': {},
+            })
+            if severity[stats['state']] > severity[merged['state']]:
+                merged['state'] = stats['state']
+            for counter in ('calls', 'failures', 'rejected', 'opened'):
+                merged[counter] += stats[counter]
+            merged['processes'][process] = stats
+    return {'processes': len(live), 'breakers': breakers}
+
+
+def reset_breakers(key: Optional[str] = None):
+    """Forget breaker state in this process (and the shared open flag)"""
+    with _registry_lock:
+        keys = [key] if key else list(_breakers)
+        for name in keys:
+            _breakers.pop(name, None)
+            cache.delete(f"{OPEN_KEY_PREFIX}{name}")
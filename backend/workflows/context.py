@@ -0,0 +1,51 @@
+"""
+FlowPilot Execution Context
+
+Helpers for reading values out of a running execution.
+
+The context of an execution looks like:
+    {
+        "input": {...workflow execution input_data...},
+        "steps": {"<step name>": {...result of that completed step...}}
+    }
+
+Steps reference values in it with dotted paths, e.g. "input.patients" or
+"steps.Fetch Patients.response_data.items". List elements can be addressed
+by index ("input.patients.0.phone").
+"""
+
+from typing import Dict, Any
+
+_MISSING = object()
+
+
+def build_execution_context(workflow_execution) -> Dict[str, Any]:
+    """Collect the execution input and the results of its completed steps"""
+    steps = {
+        name: result
+        for name, result in workflow_execution.task_executions
+        .filter(status='completed')
+        .order_by()
+        .values_list('step__name', 'result')
+    }
+    return {'input': workflow_execution.input_data, 'steps': steps}
+
+
+def resolve_path(data: Any, path: str, default: Any = _MISSING) -> Any:
+    """
+    Follow a dotted path through nested dicts/lists
+
+    Raises:
+        KeyError: If the path doesn't exist and no default is given
+    """
+    current = data
+    for part in path.split('.') if path else []:
+        if isinstance(current, dict) and part in current:
+            current = current[part]
+        elif isinstance(current, list) and part.lstrip('-').isdigit() and -len(current) <= int(part) < len(current):
+            current = current[int(part)]
+        else:
+            if default is _MISSING:
+                raise KeyError(f"Path '{path}' not found (stopped at '{part}')")
+            return default
+    return current
@@ -0,0 +1,167 @@
+"""
+FlowPilot Execution Control
+
+Cooperative cancel / pause for running executions.
+
+Key Concepts:
+- The current execution status is mirrored into the cache, so workers can
+  check it before every step without a DB query
+- Cancel: one UPDATE per table, unsent outbox messages dropped, queued
+  Celery messages revoked in bulk, child sub-workflow executions cancelled
+  too. Running steps finish their current call; nothing downstream is
+  dispatched afterwards.
+- Pause: workers leave queued steps pending; unpausing re-dispatches
+  whatever is ready, or hands a never-started execution back to admission
+  control.
+"""
+
+import logging
+from typing import Iterable, Dict, Any
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .events import record as record_event, record_many
+from .models import WorkflowExecution, TaskExecution
+from .outbox import discard_for_tasks
+
+logger = logging.getLogger(__name__)
+
+# Short enough that a missed cache write (e.g. per-process LocMemCache) heals quickly
+STATE_CACHE_TTL = 10
+REVOKE_BATCH_SIZE = 1000
+ACTIVE_STATUSES = WorkflowExecution.ACTIVE_STATUSES
+UNSTARTED_TASK_STATUSES = ['pending', 'retrying', 'waiting']
+
+
+def _state_key(workflow_execution_id) -> str:
+    return f"execution-state:{workflow_execution_id}"
+
+
+def get_execution_state(workflow_execution_id) -> str:
+    """Current status of an execution, served from cache when possible"""
+    key = _state_key(workflow_execution_id)
+    state = cache.get(key)
+    if state is None:
+        state = (
+            WorkflowExecution.objects
+            .filter(id=workflow_execution_id)
+            .values_list('status', flat=True)
+            .first()
+        ) or 'cancelled'  # Deleted executions behave like cancelled ones
+        cache.set(key, state, STATE_CACHE_TTL)
+    return state
+
+
+def _publish_state(execution_ids: Iterable, state: str):
+    cache.set_many({_state_key(execution_id): state for execution_id in execution_ids}, STATE_CACHE_TTL)
+
+
+def revoke_celery_tasks(celery_task_ids):
+    """Tell workers to drop queued messages, in batches to keep broadcasts small"""
+    from flowpilot.celery import app
+
+    celery_task_ids = list(celery_task_ids)
+    for start in range(0, len(celery_task_ids), REVOKE_BATCH_SIZE):
+        app.control.revoke(celery_task_ids[start:start + REVOKE_BATCH_SIZE])
+    return len(celery_task_ids)
+
+
+def cancel_executions(execution_ids, reason: str = 'Cancelled by user') -> Dict[str, Any]:
+    """
+    Cancel many executions at once (e.g. a whole backfill)
+
+    Returns:
+        dict: Number of executions/tasks cancelled and messages revoked
+    """
+    execution_ids = list(
+        WorkflowExecution.objects
+        .filter(id__in=list(execution_ids), status__in=ACTIVE_STATUSES)
+        .values_list('id', flat=True)
+    )
+    if not execution_ids:
+        return {'executions': 0, 'tasks': 0, 'revoked': 0}
+
+    now = timezone.now()
+    cancelled = WorkflowExecution.objects.filter(id__in=execution_ids, status__in=ACTIVE_STATUSES).update(
+        status='cancelled', completed_at=now, error_message=reason,
+    )
+    # Publish before touching tasks so workers stop picking up new steps right away
+    _publish_state(execution_ids, 'cancelled')
+    record_many([(execution_id, None) for execution_id in execution_ids], 'execution.cancelled', at=now, reason=reason)
+
+    tasks = TaskExecution.objects.filter(workflow_execution_id__in=execution_ids, status__in=UNSTARTED_TASK_STATUSES)
+    # Sub-workflows spawned by waiting steps go down with their parent
+    child_ids = list(
+        WorkflowExecution.objects
+        .filter(parent_task_execution__in=tasks.filter(status='waiting'), status__in=ACTIVE_STATUSES)
+        .values_list('id', flat=True)
+    )
+    # Messages still in the outbox are dropped; the ones already sent are revoked
+    discard_for_tasks(tasks.values_list('id', flat=True))
+    revoked = revoke_celery_tasks(tasks.exclude(celery_task_id='').values_list('celery_task_id', flat=True))
+    task_count = tasks.update(status='cancelled', completed_at=now)
+
+    summary = {'executions': cancelled, 'tasks': task_count, 'revoked': revoked}
+    if child_ids:
+        child_summary = cancel_executions(child_ids, reason=f"Parent execution cancelled: {reason}")
+        for key in summary:
+            summary[key] += child_summary[key]
+
+    logger.info(f"Cancelled {cancelled} executions, {task_count} tasks, revoked {revoked} messages")
+    return summary
+
+
+def cancel_execution(workflow_execution, reason: str = 'Cancelled by user') -> Dict[str, Any]:
+    """Cancel a single execution"""
+    return cancel_executions([workflow_execution.id], reason)
+
+
+def pause_execution(workflow_execution) -> bool:
+    """
+    Pause an execution: queued steps are left pending until it is unpaused
+
+    Returns:
+        bool: False if the execution already finished
+    """
+    paused = WorkflowExecution.objects.filter(
+        id=workflow_execution.id, status__in=['pending', 'running'],
+    ).update(status='paused')
+    if paused:
+        _publish_state([workflow_execution.id], 'paused')
+        record_event(workflow_execution.id, 'execution.paused')
+    return bool(paused)
+
+
+def unpause_execution(workflow_execution) -> bool:
+    """
+    Continue a paused execution by re-dispatching every step that is ready
+
+    An execution paused while admission control was still holding it goes
+    back to being held; the feeder starts it when there is capacity.
+
+    Returns:
+        bool: False if the execution wasn't paused
+    """
+    from .admission import hold_count
+    from .tasks import enqueue_next_steps
+
+    held = WorkflowExecution.objects.filter(
+        id=workflow_execution.id, status='paused', started_at__isnull=True,
+    ).update(status='pending')
+    if held:
+        _publish_state([workflow_execution.id], 'pending')
+        record_event(workflow_execution.id, 'execution.held', unpaused=True)
+        hold_count(1)
+        return True
+
+    with transaction.atomic():
+        resumed = WorkflowExecution.objects.filter(id=workflow_execution.id, status='paused').update(status='running')
+        if not resumed:
+            return False
+        # Registered first, so workers see 'running' before the message is relayed
+        transaction.on_commit(lambda: _publish_state([workflow_execution.id], 'running'))
+        record_event(workflow_execution.id, 'execution.unpaused')
+        enqueue_next_steps([workflow_execution.id])
+    return True
@@ -0,0 +1,209 @@
+"""
+FlowPilot DAG Analysis
+
+Validates a workflow's step graph and measures how parallel it really is.
+
+Key Concepts:
+- Rejects cycles (an execution would sit pending forever) and dangling edges
+  (dependencies on steps of another workflow). Publishing checks this, and
+  so does every run start (graph_errors() on the steps and edges the
+  orchestrator loads anyway), so an edit after publishing can't hang runs
+- Levels: a step's level is 1 + the deepest level of its dependencies.
+  Steps on the same level can run side by side; the widest level bounds
+  how many workers one execution can use.
+- Critical path: the longest chain weighted by each step's average
+  historical duration from TaskExecution. It is the floor on end-to-end
+  latency no matter how many workers there are.
+"""
+
+from collections import defaultdict, deque
+from datetime import timedelta
+from typing import Dict, Any, List
+
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F
+from django.utils import timezone
+
+from .models import TaskExecution, WorkflowStep
+
+# Used for steps that have never completed
+DEFAULT_STEP_SECONDS = 1.0
+HISTORY_DAYS = 30
+
+
+class WorkflowValidationError(Exception):
+    """The workflow's step graph can't be executed"""
+
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__('; '.join(errors))
+
+
+def build_graph(steps, edges):
+    """
+    Dependency sets from (step_id, dependency_id) edges
+
+    Returns:
+        tuple: ({step_id: set(dependency ids)}, list of error strings)
+    """
+    deps = {step_id: set() for step_id in steps}
+    errors = []
+    for step_id, dependency_id in edges:
+        if dependency_id not in steps:
+            errors.append(f"Step '{steps[step_id]['name']}' depends on step {dependency_id} from another workflow")
+            continue
+        deps[step_id].add(dependency_id)
+    return deps, errors
+
+
+def load_graph(workflow):
+    """
+    Load steps and dependency edges with two queries
+
+    Returns:
+        tuple: (steps by id, {step_id: set(dependency ids)}, list of error strings)
+    """
+    steps = {step['id']: step for step in workflow.steps.values('id', 'name', 'step_order', 'step_type')}
+    edges = (
+        WorkflowStep.depends_on.through.objects
+        .filter(from_workflowstep__workflow=workflow)
+        .values_list('from_workflowstep_id', 'to_workflowstep_id')
+    )
+    deps, errors = build_graph(steps, edges)
+    return steps, deps, errors
+
+
+def graph_errors(steps, edges) -> List[str]:
+    """
+    Why a step graph already in memory can't run (empty if it can)
+
+    Args:
+        steps: {step_id: {'name': ..., 'step_order': ...}}
+        edges: (step_id, dependency_id) pairs
+    """
+    deps, errors = build_graph(steps, edges)
+    if errors:
+        return errors
+    try:
+        topological_order(steps, deps)
+    except WorkflowValidationError as exc:
+        return exc.errors
+    return []
+
+
+def topological_order(steps, deps) -> List:
+    """
+    Kahn's algorithm, ties broken by step_order
+
+    Raises:
+        WorkflowValidationError: If the graph has a cycle
+    """
+    dependents = defaultdict(list)
+    remaining = {step_id: len(step_deps) for step_id, step_deps in deps.items()}
+    for step_id, step_deps in deps.items():
+        for dependency_id in step_deps:
+            dependents[dependency_id].append(step_id)
+
+    ready = deque(sorted((s for s, n in remaining.items() if n == 0), key=lambda s: steps[s]['step_order']))
+    order = []
+    while ready:
+        step_id = ready.popleft()
+        order.append(step_id)
+        for dependent_id in sorted(dependents[step_id], key=lambda s: steps[s]['step_order']):
+            remaining[dependent_id] -= 1
+            if remaining[dependent_id] == 0:
+                ready.append(dependent_id)
+
+    if len(order) != len(steps):
+        stuck = sorted((steps[s] for s, n in remaining.items() if n > 0), key=lambda step: step['step_order'])
+        raise WorkflowValidationError([f"Dependency cycle (or blocked behind one) at steps: {', '.join(s['name'] for s in stuck)}"])
+    return order
+
+
+def historical_durations(step_ids, days: int = HISTORY_DAYS) -> Dict[Any, Dict[str, Any]]:
+    """Average duration (seconds) and sample count per step over recent completed runs"""
+    rows = (
+        TaskExecution.objects
+        .filter(step_id__in=step_ids, status='completed', started_at__isnull=False,
+                completed_at__isnull=False, created_at__gte=timezone.now() - timedelta(days=days))
+        .values('step_id')
+        .annotate(
+            avg=Avg(ExpressionWrapper(F('completed_at') - F('started_at'), output_field=DurationField())),
+            samples=Count('id'),
+        )
+    )
+    return {row['step_id']: {'seconds': row['avg'].total_seconds(), 'samples': row['samples']} for row in rows}
+
+
+def validate_workflow(workflow):
+    """
+    Raise WorkflowValidationError if the workflow can't run
+
+    Returns:
+        tuple: (steps, deps, topological order) for callers that keep going
+    """
+    steps, deps, errors = load_graph(workflow)
+    if errors:
+        raise WorkflowValidationError(errors)
+    return steps, deps, topological_order(steps, deps)
+
+
+def analyze_workflow(workflow) -> Dict[str, Any]:
+    """
+    Levels, max width and duration-weighted critical path of a workflow
+
+    Raises:
+        WorkflowValidationError: If the graph has cycles or dangling edges
+    """
+    steps, deps, order = validate_workflow(workflow)
+    durations = historical_durations(list(steps))
+
+    def weight(step_id):
+        return durations.get(step_id, {}).get('seconds', DEFAULT_STEP_SECONDS)
+
+    level = {}
+    finish = {}        # Earliest finish time of each step with unlimited workers
+    best_parent = {}
+    for step_id in order:
+        level[step_id] = 1 + max((level[d] for d in deps[step_id]), default=-1)
+        parent = max(deps[step_id], key=lambda d: finish[d], default=None)
+        best_parent[step_id] = parent
+        finish[step_id] = (finish[parent] if parent is not None else 0.0) + weight(step_id)
+
+    levels = defaultdict(list)
+    for step_id in order:
+        levels[level[step_id]].append(steps[step_id]['name'])
+
+    critical = []
+    step_id = max(finish, key=finish.get, default=None)
+    while step_id is not None:
+        critical.append(steps[step_id]['name'])
+        step_id = best_parent[step_id]
+    critical.reverse()
+
+    critical_seconds = max(finish.values(), default=0.0)
+    total_seconds = sum(weight(step_id) for step_id in steps)
+
+    return {
+        'valid': True,
+        'steps': len(steps),
+        'edges': sum(len(step_deps) for step_deps in deps.values()),
+        'depth': len(levels),
+        'max_width': max((len(names) for names in levels.values()), default=0),
+        'levels': [levels[index] for index in sorted(levels)],
+        'critical_path': {
+            'steps': critical,
+            'duration_seconds': round(critical_seconds, 3),
+        },
+        # Average number of busy workers if one execution ran with unlimited workers
+        'parallelism': round(total_seconds / critical_seconds, 2) if critical_seconds else 0,
+        'step_durations': [
+            {
+                'id': str(step_id),
+                'name': steps[step_id]['name'],
+                'level': level[step_id],
+                'seconds': round(weight(step_id), 3),
+                'samples': durations.get(step_id, {}).get('samples', 0),
+            }
+            for step_id in order
+        ],
+    }
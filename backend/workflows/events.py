@@ -0,0 +1,282 @@
+"""
+FlowPilot Execution Event Log
+
+Append-only record of every execution and step transition.
+
+Key Concepts:
+- record() only appends to an in-process buffer; the buffer is written with
+  one bulk INSERT when it fills up (EVENT_BUFFER_SIZE), when it gets old
+  (EVENT_FLUSH_SECONDS), after every Celery task, web request and pass of
+  the scheduler / dispatcher / webhook drainer loops, and at exit.
+  Transitions cost no extra round trip of their own
+- Inside a transaction, events join the buffer only once it commits: a
+  rolled-back transition leaves no event, and a failed event INSERT can't
+  abort the caller's transaction
+- Events are never updated. A crash can lose a process's unflushed events
+  (at most one buffer); the TaskExecution rows stay authoritative for what
+  runs next. Their conditional status UPDATEs are the claims that make each
+  step run and dispatch once, which a snapshot trailing by the compaction
+  lag can't replace; the tables they churn are tuned for it instead
+  (migration 0018: page free space for HOT updates, early autovacuum).
+  The timeline endpoint reads events and the snapshot, not those rows
+- The compaction job folds new events into one ExecutionSnapshot row per
+  run, in the order they were written (recorded_at) behind a watermark. An
+  event flushed late still gets a recent recorded_at, so it is folded in
+  and not skipped; folding compares `at`, so a late event never overrides
+  a newer state
+- timeline() reads one run's events through the (workflow_execution, at)
+  index - the audit trail and replay of a run
+"""
+
+import logging
+import threading
+import time
+import uuid
+from datetime import timedelta
+from typing import Dict, Any, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_NAME = 'execution-event-compaction'
+
+# Events that leave an execution / a step in a given status
+EXECUTION_STATUS_EVENTS = {
+    'execution.started': 'running',
+    'execution.held': 'pending',
+    'execution.completed': 'completed',
+    'execution.failed': 'failed',
+    'execution.cancelled': 'cancelled',
+    'execution.paused': 'paused',
+    'execution.unpaused': 'running',
+}
+TASK_STATUS_EVENTS = {
+    'task.dispatched': 'pending',
+    'task.started': 'running',
+    'task.waiting': 'waiting',
+    'task.completed': 'completed',
+    'task.failed': 'failed',
+    'task.timed_out': 'timed_out',
+    'task.retry_scheduled': 'retrying',
+    'task.deferred': 'retrying',
+    'task.reaped': 'pending',
+    'task.map_recovered': 'waiting',
+    'task.reused': 'completed',
+}
+
+UNSTARTED_STEP_STATUSES = ('pending', 'retrying', 'waiting')
+
+
+# ===========================
+# BUFFERED WRITER
+# ===========================
+
+class EventBuffer:
+    """Per-process buffer of unsaved ExecutionEvents"""
+
+    def __init__(self):
+        self._events = []
+        self._oldest = None
+        self._lock = threading.Lock()
+
+    def add(self, events: List):
+        with self._lock:
+            if not self._events:
+                self._oldest = time.monotonic()
+            self._events.extend(events)
+            due = (
+                len(self._events) >= settings.EVENT_BUFFER_SIZE
+                or time.monotonic() - self._oldest >= settings.EVENT_FLUSH_SECONDS
+            )
+        if due:
+            self.flush()
+
+    def flush(self) -> int:
+        with self._lock:
+            events, self._events = self._events, []
+        if not events:
+            return 0
+        from .models import ExecutionEvent
+        recorded_at = timezone.now()
+        for event in events:
+            event.recorded_at = recorded_at
+        try:
+            # A savepoint when called inside a transaction, so a failure stays ours
+            with transaction.atomic():
+                ExecutionEvent.objects.bulk_create(events, batch_size=1000)
+        except Exception as exc:
+            # The event log must never fail the transition it describes
+            logger.error(f"Dropped {len(events)} execution events: {exc}")
+            return 0
+        return len(events)
+
+
+buffer = EventBuffer()
+
+
+def record(workflow_execution_id, event: str, task_execution_id=None, at=None, **data):
+    """Log one transition"""
+    record_many([(workflow_execution_id, task_execution_id)], event, at=at, **data)
+
+
+def record_many(targets, event: str, at=None, **data):
+    """
+    Log the same transition for many executions / steps
+
+    Args:
+        targets: (workflow_execution_id, task_execution_id or None) pairs
+    """
+    if not settings.EVENTS_ENABLED:
+        return
+    from .models import ExecutionEvent
+    at = at or timezone.now()
+    events = [
+        ExecutionEvent(
+            id=uuid.uuid4(),
+            workflow_execution_id=workflow_execution_id,
+            task_execution_id=task_execution_id,
+            event=event,
+            at=at,
+            data=data,
+        )
+        for workflow_execution_id, task_execution_id in targets
+    ]
+    if not events:
+        return
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: buffer.add(events))
+    else:
+        buffer.add(events)
+
+
+def flush_events(**kwargs):
+    """Signal handler: write whatever this process has buffered"""
+    buffer.flush()
+
+
+# ===========================
+# COMPACTION
+# ===========================
+
+def _apply(snapshot, event):
+    """Fold one event in; events may arrive out of `at` order"""
+    snapshot.event_count += 1
+    snapshot.first_event_at = min(snapshot.first_event_at or event.at, event.at)
+    snapshot.last_event_at = max(snapshot.last_event_at or event.at, event.at)
+    if event.event in EXECUTION_STATUS_EVENTS:
+        if snapshot.status_at and event.at < snapshot.status_at:
+            return
+        snapshot.status = EXECUTION_STATUS_EVENTS[event.event]
+        snapshot.status_at = event.at
+        if event.event == 'execution.cancelled':
+            # Cancel marks the unstarted steps in one statement, with no event per step
+            for state in snapshot.steps.values():
+                if state['status'] in UNSTARTED_STEP_STATUSES:
+                    state['status'] = 'cancelled'
+    elif event.task_execution_id and event.event in TASK_STATUS_EVENTS:
+        state = snapshot.steps.setdefault(str(event.task_execution_id), {'status': None, 'events': 0})
+        state['events'] += 1
+        if state.get('at') and event.at < parse_datetime(state['at']):
+            return
+        status = TASK_STATUS_EVENTS[event.event]
+        if status in UNSTARTED_STEP_STATUSES and snapshot.status == 'cancelled':
+            status = 'cancelled'
+        state['status'] = status
+        state['at'] = event.at.isoformat()
+
+
+def compact_events(batch_size: Optional[int] = None, max_batches: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Fold new events into ExecutionSnapshots
+
+    Returns:
+        dict: Events folded, batches and the watermark reached
+    """
+    from .models import ExecutionEvent, ExecutionSnapshot, Watermark
+
+    batch_size = batch_size or settings.EVENT_COMPACTION_BATCH
+    horizon = timezone.now() - timedelta(seconds=settings.EVENT_COMPACTION_LAG_SECONDS)
+    summary = {'events': 0, 'batches': 0, 'watermark': None}
+
+    while max_batches is None or summary['batches'] < max_batches:
+        with transaction.atomic():
+            Watermark.objects.get_or_create(name=WATERMARK_NAME)
+            watermark = Watermark.objects.select_for_update().get(name=WATERMARK_NAME)
+
+            queryset = ExecutionEvent.objects.filter(recorded_at__lte=horizon)
+            if watermark.position is not None:
+                queryset = queryset.filter(
+                    Q(recorded_at__gt=watermark.position)
+                    | Q(recorded_at=watermark.position, id__gt=watermark.last_id)
+                )
+            events = list(queryset.order_by('recorded_at', 'id')[:batch_size])
+            if events:
+                execution_ids = {event.workflow_execution_id for event in events}
+                snapshots = ExecutionSnapshot.objects.in_bulk(list(execution_ids))
+                created = {}
+                for event in sorted(events, key=lambda event: event.at):
+                    snapshot = snapshots.get(event.workflow_execution_id)
+                    if snapshot is None:
+                        snapshot = snapshots[event.workflow_execution_id] = created[event.workflow_execution_id] = (
+                            ExecutionSnapshot(workflow_execution_id=event.workflow_execution_id, steps={})
+                        )
+                    _apply(snapshot, event)
+                ExecutionSnapshot.objects.bulk_create(created.values())
+                existing = [snapshot for key, snapshot in snapshots.items() if key not in created]
+                for snapshot in existing:
+                    snapshot.updated_at = timezone.now()
+                ExecutionSnapshot.objects.bulk_update(
+                    existing,
+                    ['status', 'status_at', 'steps', 'event_count', 'first_event_at', 'last_event_at', 'updated_at'],
+                )
+                watermark.position = events[-1].recorded_at
+                watermark.last_id = events[-1].id
+                watermark.save(update_fields=['position', 'last_id', 'updated_at'])
+
+        summary['watermark'] = watermark.position
+        if not events:
+            break
+        summary['events'] += len(events)
+        summary['batches'] += 1
+        if len(events) < batch_size:
+            break
+
+    if summary['events']:
+        logger.info(f"Compacted {summary['events']} execution events")
+    return summary
+
+
+# ===========================
+# READING
+# ===========================
+
+def timeline(workflow_execution_id, after=None, limit: int = 1000) -> List[Dict[str, Any]]:
+    """
+    A run's events in order
+
+    Args:
+        after: Only events after this time (paging / tailing)
+    """
+    from .models import ExecutionEvent
+
+    queryset = ExecutionEvent.objects.filter(workflow_execution_id=workflow_execution_id)
+    if after:
+        queryset = queryset.filter(at__gt=after)
+    return [
+        {
+            'at': event['at'],
+            'event': event['event'],
+            'task_execution_id': event['task_execution_id'],
+            'step': event['task_execution__step__name'],
+            'data': event['data'],
+        }
+        for event in queryset.order_by('at', 'id').values(
+            'at', 'event', 'task_execution_id', 'task_execution__step__name', 'data',
+        )[:limit]
+    ]
+
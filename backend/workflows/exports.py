@@ -0,0 +1,141 @@
+"""
+FlowPilot Execution Export
+
+Streams execution (or task execution) rows as NDJSON or CSV in constant memory.
+
+Key Concepts:
+- Rows come from .values_list().iterator(chunk_size=...), which uses a
+  server-side cursor on Postgres; no model instances, no full list
+- Default model ordering is dropped so the database doesn't sort millions
+  of rows before sending the first one
+- Output is buffered into ~64KB pieces for StreamingHttpResponse
+- Secret-looking keys inside JSON columns (input, output, result) are
+  exported as "[redacted]" - webhook payloads and step results can carry
+  tokens and passwords
+"""
+
+import csv
+import io
+from datetime import datetime
+from typing import Iterator, Optional
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import WorkflowExecution, TaskExecution
+from .portable import SECRET_KEY_MARKERS
+
+ITERATOR_CHUNK_SIZE = 2000
+FLUSH_BYTES = 64 * 1024
+REDACTED = '[redacted]'
+
+EXECUTION_COLUMNS = [
+    ('id', 'id'),
+    ('status', 'status'),
+    ('trigger_source', 'trigger_source'),
+    ('created_at', 'created_at'),
+    ('started_at', 'started_at'),
+    ('completed_at', 'completed_at'),
+    ('input_data', 'input_data'),
+    ('output_data', 'output_data'),
+    ('error_message', 'error_message'),
+]
+
+TASK_COLUMNS = [
+    ('id', 'id'),
+    ('workflow_execution_id', 'workflow_execution_id'),
+    ('step', 'step__name'),
+    ('status', 'status'),
+    ('created_at', 'created_at'),
+    ('started_at', 'started_at'),
+    ('completed_at', 'completed_at'),
+    ('retry_count', 'retry_count'),
+    ('result', 'result'),
+    ('error_message', 'error_message'),
+]
+
+
+def export_queryset(workflow_id, rows: str = 'executions', since=None, until=None, status: Optional[str] = None):
+    """
+    Build the (unevaluated) queryset and column list for an export
+
+    Args:
+        rows: 'executions' or 'tasks'
+        since / until: created_at window (datetimes)
+        status: Only rows with this status
+    """
+    if rows == 'tasks':
+        queryset = TaskExecution.objects.filter(workflow_execution__workflow_id=workflow_id)
+        columns = TASK_COLUMNS
+    else:
+        queryset = WorkflowExecution.objects.filter(workflow_id=workflow_id)
+        columns = EXECUTION_COLUMNS
+    if since:
+        queryset = queryset.filter(created_at__gte=since)
+    if until:
+        queryset = queryset.filter(created_at__lt=until)
+    if status:
+        queryset = queryset.filter(status=status)
+    return queryset.order_by().values_list(*[field for _, field in columns]), [name for name, _ in columns]
+
+
+def _redact(value):
+    """Copy of a JSON value with the values of secret-looking keys replaced"""
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if any(marker in str(key).lower() for marker in SECRET_KEY_MARKERS) else _redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [_redact(item) for item in value]
+    return value
+
+
+def _rows(queryset) -> Iterator[list]:
+    for row in queryset.iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+        yield [_redact(v) if isinstance(v, (dict, list)) else v for v in row]
+
+
+def _buffered(lines: Iterator[str]) -> Iterator[bytes]:
+    buffer, size = [], 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= FLUSH_BYTES:
+            yield ''.join(buffer).encode()
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer).encode()
+
+
+def _ndjson_lines(queryset, names) -> Iterator[str]:
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    for row in _rows(queryset):
+        yield encoder.encode(dict(zip(names, row))) + '\n'
+
+
+def _csv_lines(queryset, names) -> Iterator[str]:
+    out = io.StringIO()
+    writer = csv.writer(out)
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+
+    def take():
+        value = out.getvalue()
+        out.seek(0)
+        out.truncate()
+        return value
+
+    writer.writerow(names)
+    yield take()
+    for row in _rows(queryset):
+        # JSON columns (input/result) go out as JSON text, datetimes as ISO 8601
+        writer.writerow([
+            encoder.encode(v) if isinstance(v, (dict, list)) else v.isoformat() if isinstance(v, datetime) else v
+            for v in row
+        ])
+        yield take()
+
+
+def stream_export(queryset, names, fmt: str = 'ndjson') -> Iterator[bytes]:
+    """Byte chunks for StreamingHttpResponse"""
+    lines = _csv_lines(queryset, names) if fmt == 'csv' else _ndjson_lines(queryset, names)
+    return _buffered(lines)
@@ -0,0 +1,247 @@
+"""
+FlowPilot Fair-Share Dispatch
+
+Keeps one owner's backfill from starving everyone else on the shared
+`workflows` queue.
+
+Key Concepts:
+- With FAIR_SHARE_ENABLED, ready steps aren't sent to the broker directly.
+  They wait in a virtual queue per dispatch_key (the workflow owner, or the
+  workflow with FAIR_SHARE_KEY='workflow') - pending rows with ready_at set
+  and dispatched_at empty
+- The dispatcher keeps at most FAIR_SHARE_MAX_IN_FLIGHT steps on the broker
+  and in workers. Whenever capacity frees up it hands it out across the
+  queues by weighted deficit round-robin, oldest step first within a queue.
+- Weights (FAIR_SHARE_WEIGHTS) set relative shares; quotas
+  (FAIR_SHARE_QUOTAS / FAIR_SHARE_DEFAULT_QUOTA) cap one key's in-flight steps
+- A single dispatcher is active at a time (SchedulerLease 'dispatcher')
+
+Run with: python manage.py run_dispatcher
+"""
+
+import logging
+import os
+import socket
+import threading
+from collections import defaultdict
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count
+
+from .events import flush_events
+from .models import TaskExecution, SchedulerLease
+
+logger = logging.getLogger(__name__)
+
+# Dispatched steps that still hold a slot ('waiting' control steps don't use a worker)
+IN_FLIGHT_STATUSES = ['pending', 'running', 'retrying']
+
+
+def dispatch_key_for(workflow) -> str:
+    """Virtual queue a workflow's steps wait in"""
+    if settings.FAIR_SHARE_KEY == 'workflow':
+        return str(workflow.id)
+    return str(workflow.created_by_id or 'anonymous')
+
+
+class DeficitRoundRobin:
+    """
+    Weighted deficit round-robin over named queues
+
+    Every visit a queue earns quantum * weight credit and may release one
+    step per whole credit. Unused credit carries over while the queue has a
+    backlog and is dropped when it empties, so an idle owner can't bank a
+    burst. The round-robin position survives between calls, so small grants
+    still rotate through every queue.
+
+    Pure Python - the dispatcher feeds it counts from the database and the
+    simulation benchmark feeds it synthetic ones.
+    """
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None, quotas: Optional[Dict[str, int]] = None,
+                 default_quota: int = 0, quantum: float = 1.0):
+        self.weights = {str(key): self._check_weight(key, value) for key, value in (weights or {}).items()}
+        self.quotas = quotas or {}
+        self.default_quota = default_quota
+        self.quantum = quantum
+        self.order = []
+        self.deficits = {}
+        self.position = 0
+
+    @staticmethod
+    def _check_weight(key, value) -> float:
+        """A weight must be a positive number - a zero share would never earn credit"""
+        try:
+            weight = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Fair-share weight for {key!r} must be a number, got {value!r}")
+        if not weight > 0:
+            raise ValueError(f"Fair-share weight for {key!r} must be positive, got {value!r}")
+        return weight
+
+    def weight(self, key: str) -> float:
+        return float(self.weights.get(key, 1))
+
+    def quota(self, key: str) -> int:
+        """Max in-flight steps for the key (0 = unlimited)"""
+        return int(self.quotas.get(key, self.default_quota))
+
+    def _sync_queues(self, backlog: Dict[str, int]):
+        """Drop drained queues and append new ones, keeping the rotation position"""
+        current = self.order[self.position % len(self.order)] if self.order else None
+        kept = [key for key in self.order if backlog.get(key)]
+        kept_set = set(kept)
+        self.order = kept + [key for key in backlog if backlog[key] and key not in kept_set]
+        self.deficits = {key: self.deficits.get(key, 0.0) for key in self.order}
+        self.position = self.order.index(current) if current in self.deficits else 0
+
+    def allocate(self, backlog: Dict[str, int], capacity: int,
+                 in_flight: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+        """
+        Split `capacity` dispatch slots across queues
+
+        Args:
+            backlog: Steps waiting per key
+            capacity: Free slots to hand out
+            in_flight: Steps already dispatched per key (for quotas)
+
+        Returns:
+            dict: Steps to release per key
+        """
+        in_flight = in_flight or {}
+        self._sync_queues(backlog)
+        grants = defaultdict(int)
+
+        def room(key):
+            available = backlog[key] - grants[key]
+            quota = self.quota(key)
+            if quota:
+                available = min(available, quota - in_flight.get(key, 0) - grants[key])
+            return max(available, 0)
+
+        while capacity > 0 and any(room(key) for key in self.order):
+            earned = False
+            for _ in range(len(self.order)):
+                key = self.order[self.position]
+                self.position = (self.position + 1) % len(self.order)
+                available = room(key)
+                if not available:
+                    if backlog[key] <= grants[key]:
+                        self.deficits[key] = 0.0
+                    continue
+                credit = self.quantum * self.weight(key)
+                earned = earned or credit > 0
+                self.deficits[key] += credit
+                take = min(int(self.deficits[key]), available, capacity)
+                grants[key] += take
+                self.deficits[key] -= take
+                capacity -= take
+                if capacity == 0:
+                    break
+            if not earned:
+                # Nothing can ever earn a slot (e.g. quantum of 0); don't spin
+                break
+        return {key: count for key, count in grants.items() if count}
+
+
+class FairShareDispatcher:
+    """
+    Long-running loop that moves steps from the virtual queues to the broker
+    """
+
+    def __init__(self, name: str = 'dispatcher', max_in_flight: Optional[int] = None,
+                 tick_seconds: Optional[float] = None, lease_seconds: Optional[int] = None):
+        self.name = name
+        self.holder = f"{socket.gethostname()}:{os.getpid()}"
+        self.max_in_flight = max_in_flight or settings.FAIR_SHARE_MAX_IN_FLIGHT
+        self.tick_seconds = tick_seconds or settings.FAIR_SHARE_TICK_SECONDS
+        self.lease_seconds = lease_seconds or settings.SCHEDULER_LEASE_SECONDS
+        self.drr = DeficitRoundRobin(
+            weights=settings.FAIR_SHARE_WEIGHTS,
+            quotas=settings.FAIR_SHARE_QUOTAS,
+            default_quota=settings.FAIR_SHARE_DEFAULT_QUOTA,
+        )
+        self.is_leader = False
+        self._stop = threading.Event()
+
+    def queue_state(self):
+        """
+        Two grouped counts
+
+        Returns:
+            tuple: ({key: waiting steps}, {key: in-flight steps})
+        """
+        backlog = dict(
+            TaskExecution.objects
+            .filter(status='pending', ready_at__isnull=False, dispatched_at__isnull=True)
+            .order_by().values_list('dispatch_key').annotate(n=Count('id'))
+        )
+        in_flight = dict(
+            TaskExecution.objects
+            .filter(status__in=IN_FLIGHT_STATUSES, dispatched_at__isnull=False)
+            .order_by().values_list('dispatch_key').annotate(n=Count('id'))
+        )
+        return backlog, in_flight
+
+    def release(self, grants: Dict[str, int]) -> int:
+        """Send the oldest waiting steps of each key to the broker"""
+        from .tasks import publish_task_executions
+
+        with transaction.atomic():
+            released = []
+            for key, count in grants.items():
+                released.extend(
+                    TaskExecution.objects
+                    .select_for_update(skip_locked=True, of=('self',))
+                    .select_related('step')
+                    .filter(status='pending', dispatch_key=key, ready_at__isnull=False, dispatched_at__isnull=True)
+                    .order_by('ready_at')[:count]
+                )
+            # Messages go out after commit (see publish_task_executions)
+            publish_task_executions(released)
+        return len(released)
+
+    def tick(self) -> float:
+        """
+        One pass of the loop
+
+        Returns:
+            float: Seconds to sleep before the next pass
+        """
+        close_old_connections()
+        self.is_leader = SchedulerLease.acquire(self.name, self.holder, self.lease_seconds)
+        if not self.is_leader:
+            return self.lease_seconds / 2
+
+        backlog, in_flight = self.queue_state()
+        capacity = self.max_in_flight - sum(in_flight.values())
+        if capacity <= 0 or not backlog:
+            return self.tick_seconds
+
+        grants = self.drr.allocate(backlog, capacity, in_flight)
+        released = self.release(grants) if grants else 0
+        if released:
+            logger.debug(f"Dispatcher released {released} steps: {grants}")
+        # Go again right away while there's both backlog and capacity left
+        return 0 if released and released == capacity else self.tick_seconds
+
+    def run_forever(self):
+        logger.info(f"Fair-share dispatcher {self.holder} starting (max in flight {self.max_in_flight})")
+        try:
+            while not self._stop.is_set():
+                try:
+                    sleep_for = self.tick()
+                except Exception as exc:
+                    logger.exception(f"Dispatcher tick failed: {exc}")
+                    sleep_for = 5
+                flush_events()
+                self._stop.wait(sleep_for)
+        finally:
+            flush_events()
+            if self.is_leader:
+                SchedulerLease.release(self.name, self.holder)
+
+    def stop(self):
+        self._stop.set()
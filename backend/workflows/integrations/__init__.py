@@ -0,0 +1,8 @@
+"""
+FlowPilot Integration Steps
+
+Step types that talk to the outside world (or just do simple work). None of
+these modules are imported at worker startup: tasks.py declares them with
+TaskRegistry.register_lazy and each module is imported the first time one
+of its step types runs.
+"""
@@ -0,0 +1,83 @@
+"""
+FlowPilot HTTP Steps
+
+Outbound HTTP step type (http_request). `requests` is imported once, when
+the first http_request step runs on a worker. Calls go through a per-host
+circuit breaker (see workflows/circuit.py).
+"""
+
+import logging
+from typing import Dict, Any
+from urllib.parse import urlsplit
+
+import requests
+from celery.exceptions import SoftTimeLimitExceeded
+
+from ..circuit import guarded, publish_metrics
+
+# Responses that count against the host's breaker
+BREAKER_FAILURE_STATUSES = {429}
+
+logger = logging.getLogger(__name__)
+
+
+def http_request_task(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Make HTTP request to external service
+    
+    Args:
+        config: HTTP request configuration (url, method, headers, data)
+        
+    Returns:
+        dict: HTTP response information
+    """
+    url = config.get('url')
+    method = config.get('method', 'GET').upper()
+    headers = config.get('headers', {})
+    data = config.get('data')
+    timeout = config.get('timeout', 30)
+    
+    if not url:
+        raise ValueError("HTTP request requires 'url' in config")
+    
+    logger.info(f"Making {method} request to {url}")
+    
+    # Raises CircuitOpen without calling while the host is known to be down
+    breaker = guarded(urlsplit(url).netloc.lower())
+    if breaker:
+        breaker.before_call()
+    
+    try:
+        response = requests.request(
+            method=method,
+            url=url,
+            headers=headers,
+            json=data if data else None,
+            timeout=timeout
+        )
+    except requests.RequestException as e:
+        if breaker:
+            breaker.record_failure()
+        raise ValueError(f"HTTP request failed: {str(e)}")
+    except SoftTimeLimitExceeded:
+        # The host hung past the step's timeout
+        if breaker:
+            breaker.record_failure()
+        raise
+    
+    if breaker:
+        if response.status_code >= 500 or response.status_code in BREAKER_FAILURE_STATUSES:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        publish_metrics()
+    
+    return {
+        'request_completed': True,
+        'status_code': response.status_code,
+        'url': url,
+        'method': method,
+        'response_data': response.json() if response.headers.get('content-type', '').startswith('application/json') else response.text,
+        'response_headers': dict(response.headers),
+        'duration_ms': response.elapsed.total_seconds() * 1000
+    }
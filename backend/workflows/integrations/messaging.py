@@ -0,0 +1,84 @@
+"""
+FlowPilot Messaging Steps
+
+SMS and email step types (send_sms, send_email).
+"""
+
+import logging
+import time
+from typing import Dict, Any
+
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def send_sms_task(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Send SMS using configured SMS service
+    
+    Args:
+        config: Task configuration containing phone number and message
+        
+    Returns:
+        dict: Result with SMS ID and delivery status
+    """
+    phone = config.get('phone')
+    message = config.get('message')
+    
+    if not phone or not message:
+        raise ValueError("SMS task requires 'phone' and 'message' in config")
+    
+    logger.info(f"Sending SMS to {phone}: {message}")
+    
+    # Simulate SMS sending (replace with actual SMS service integration)
+    time.sleep(2)  # Simulate network delay
+    
+    # TODO: Integrate with actual SMS service (Twilio, AWS SNS, etc.)
+    sms_id = f"sms_{int(time.time())}"
+    
+    return {
+        'sms_sent': True,
+        'sms_id': sms_id,
+        'phone': phone,
+        'message': message,
+        'sent_at': timezone.now().isoformat(),
+        'cost': 0.05  # Mock cost
+    }
+
+
+def send_email_task(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Send email using configured email service
+    
+    Args:
+        config: Task configuration containing email, subject, and content
+        
+    Returns:
+        dict: Result with email delivery status
+    """
+    email = config.get('email')
+    subject = config.get('subject', 'FlowPilot Notification')
+    content = config.get('content') or config.get('message')
+    template = config.get('template')
+    
+    if not email:
+        raise ValueError("Email task requires 'email' in config")
+    
+    if not content and not template:
+        raise ValueError("Email task requires 'content' or 'template' in config")
+    
+    logger.info(f"Sending email to {email}: {subject}")
+    
+    # Simulate email sending
+    time.sleep(1)
+    
+    # TODO: Integrate with actual email service (SendGrid, AWS SES, etc.)
+    
+    return {
+        'email_sent': True,
+        'email': email,
+        'subject': subject,
+        'sent_at': timezone.now().isoformat(),
+        'message_id': f"email_{int(time.time())}"
+    }
@@ -0,0 +1,48 @@
+"""
+FlowPilot Patient Steps
+
+Patient record step types (create_patient).
+"""
+
+import logging
+import time
+from typing import Dict, Any
+
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def create_patient_task(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Create patient record in the system
+    
+    Args:
+        config: Patient information (name, phone, email, etc.)
+        
+    Returns:
+        dict: Created patient information with ID
+    """
+    name = config.get('name')
+    phone = config.get('phone')
+    email = config.get('email')
+    
+    if not name:
+        raise ValueError("Patient creation requires 'name' in config")
+    
+    logger.info(f"Creating patient record for {name}")
+    
+    # Simulate database operation
+    time.sleep(1)
+    
+    # TODO: Integrate with actual patient management system
+    patient_id = int(time.time())  # Mock patient ID
+    
+    return {
+        'patient_created': True,
+        'patient_id': patient_id,
+        'name': name,
+        'phone': phone,
+        'email': email,
+        'created_at': timezone.now().isoformat()
+    }
@@ -0,0 +1,44 @@
+"""
+FlowPilot Utility Steps
+
+Small built-in step types (delay, display_for_test).
+"""
+
+import logging
+import time
+from typing import Dict, Any
+
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def delay_task(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Simple delay/wait task
+    
+    Args:
+        config: Configuration with 'seconds' to wait
+        
+    Returns:
+        dict: Delay completion information
+    """
+    seconds = config.get('seconds', 1)
+    
+    if not isinstance(seconds, (int, float)) or seconds < 0:
+        raise ValueError("Delay task requires positive 'seconds' value")
+    
+    logger.info(f"Delaying for {seconds} seconds")
+    
+    time.sleep(seconds)
+    
+    return {
+        'delay_completed': True,
+        'delayed_seconds': seconds,
+        'completed_at': timezone.now().isoformat()
+    }
+
+
+def display_testing(input_data):
+    msg = input_data.get("message","empty")
+    print(f"***{msg}***")
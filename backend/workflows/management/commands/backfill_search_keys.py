@@ -0,0 +1,31 @@
+"""
+Re-index existing executions after a workflow's search keys change
+
+    python manage.py backfill_search_keys <workflow_id> [<workflow_id> ...]
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from workflows.models import ExecutionSearchKey, Workflow
+from workflows.search import backfill, search_keys_for
+
+
+class Command(BaseCommand):
+    help = ("Extract trigger_config.search_keys from the input of a workflow's existing executions "
+            "and drop rows of keys no longer declared")
+
+    def add_arguments(self, parser):
+        parser.add_argument('workflow_ids', nargs='+')
+        parser.add_argument('--batch-size', type=int, default=1000, help="Executions per transaction")
+
+    def handle(self, *args, **options):
+        for workflow_id in options['workflow_ids']:
+            workflow = Workflow.objects.filter(id=workflow_id).first()
+            if workflow is None:
+                raise CommandError(f"No workflow {workflow_id}")
+            if not search_keys_for(workflow) and not ExecutionSearchKey.objects.filter(workflow=workflow).exists():
+                self.stdout.write(f"{workflow.name}: no search_keys declared, skipped")
+                continue
+            summary = backfill(workflow, batch_size=options['batch_size'])
+            self.stdout.write(
+                f"{workflow.name}: {summary['keys']} keys from {summary['executions']} executions"
+            )
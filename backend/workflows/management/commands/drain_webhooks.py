@@ -0,0 +1,31 @@
+"""
+Drain the local webhook spool into executions
+
+    python manage.py drain_webhooks            # one pass
+    python manage.py drain_webhooks --loop     # sidecar next to the web server
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from workflows.events import flush_events
+from workflows.webhooks import drain_spool
+
+
+class Command(BaseCommand):
+    help = "Turn spooled webhook events into workflow executions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep draining until stopped")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds between passes with --loop")
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            summary = drain_spool()
+            flush_events()
+            if not options['loop']:
+                self.stdout.write(f"Drained {summary['events']} events from {summary['segments']} segments")
+                return
+            time.sleep(options['interval'])
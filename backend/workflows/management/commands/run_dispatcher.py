@@ -0,0 +1,28 @@
+"""
+Run the fair-share dispatcher (needs FAIR_SHARE_ENABLED=true)
+
+    python manage.py run_dispatcher
+
+Safe to run on several hosts: only the lease holder dispatches.
+"""
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from workflows.fairshare import FairShareDispatcher
+
+
+class Command(BaseCommand):
+    help = "Release ready steps from per-owner virtual queues to the broker by weighted round-robin"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--name', default='dispatcher', help="Lease name (one leader per name)")
+
+    def handle(self, *args, **options):
+        if not settings.FAIR_SHARE_ENABLED:
+            self.stderr.write("FAIR_SHARE_ENABLED is off: steps go straight to the broker, nothing to dispatch")
+        dispatcher = FairShareDispatcher(name=options['name'])
+        signal.signal(signal.SIGTERM, lambda *_: dispatcher.stop())
+        signal.signal(signal.SIGINT, lambda *_: dispatcher.stop())
+        dispatcher.run_forever()
@@ -0,0 +1,25 @@
+"""
+Run the schedule trigger engine
+
+    python manage.py run_scheduler
+
+Safe to run on several hosts: only the lease holder fires schedules.
+"""
+import signal
+
+from django.core.management.base import BaseCommand
+
+from workflows.scheduler import Scheduler
+
+
+class Command(BaseCommand):
+    help = "Fire workflows with trigger_type='schedule' from their cron expressions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--name', default='default', help="Lease name (one leader per name)")
+
+    def handle(self, *args, **options):
+        scheduler = Scheduler(name=options['name'])
+        signal.signal(signal.SIGTERM, lambda *_: scheduler.stop())
+        signal.signal(signal.SIGINT, lambda *_: scheduler.stop())
+        scheduler.run_forever()
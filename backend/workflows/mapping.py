@@ -0,0 +1,284 @@
+"""
+FlowPilot Map Steps
+
+Fan-out of one child step type over a list from the execution context.
+
+Key Concepts:
+- One MapItemExecution row per element, bulk-created in batches
+- Elements are grouped into chunks; one Celery message runs a whole chunk
+- At most `max_parallelism` chunks are in flight (a sliding window): when
+  chunk k finishes it dispatches chunk k + max_parallelism. A 100k-item map
+  never puts more than max_parallelism messages on the broker.
+- The last chunk to finish aggregates results and completes the map step
+- Chunk messages run under the map step's timeout_seconds (see
+  step_time_limits), so chunks are sized to fit it: at most
+  timeout_seconds // item_timeout_seconds elements each
+- A chunk run claims its elements first (claimed_by), so duplicate or
+  recovered messages never run an element twice. Chunk runs bump the map
+  step's heartbeat; the reaper re-dispatches maps whose chunks all died
+
+Step config:
+    items: Dotted path to the list in the execution context (see context.py)
+    step_type: Step type to run for every element (any non-control task)
+    config: Base config passed to every child
+    item_key: Key the element is stored under in the child config ('item').
+        Dict elements are merged into the config instead when item_key is null.
+    max_parallelism: Chunks in flight at once (default 10)
+    chunk_size: Elements per chunk / Celery message (default 50, lowered
+        to fit the step's timeout)
+    item_timeout_seconds: Longest one element can take (default: the child
+        config's 'timeout', else 30 - http_request's default)
+    aggregate: 'list' (ordered results) or 'summary' (counts only)
+    allow_failures: Complete the step even if some elements failed (default False)
+"""
+
+import logging
+import math
+from typing import Dict, Any, List
+
+from celery.exceptions import SoftTimeLimitExceeded
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .context import build_execution_context, resolve_path
+from .models import MapItemExecution, TaskExecution
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_PARALLELISM = 10
+DEFAULT_CHUNK_SIZE = 50
+DEFAULT_ITEM_TIMEOUT = 30
+CREATE_BATCH_SIZE = 2000
+
+
+def _settings(step) -> Dict[str, Any]:
+    config = step.config
+    item_timeout = max(1, int(
+        config.get('item_timeout_seconds') or config.get('config', {}).get('timeout') or DEFAULT_ITEM_TIMEOUT
+    ))
+    chunk_size = max(1, int(config.get('chunk_size', DEFAULT_CHUNK_SIZE)))
+    return {
+        'max_parallelism': max(1, int(config.get('max_parallelism', DEFAULT_MAX_PARALLELISM))),
+        # A chunk has to finish inside one message's time limit
+        'chunk_size': max(1, min(chunk_size, step.timeout_seconds // item_timeout)),
+        'item_key': config.get('item_key', 'item'),
+    }
+
+
+def _child_input(config: Dict[str, Any], item: Any, item_key) -> Dict[str, Any]:
+    base = dict(config.get('config', {}))
+    if item_key is None and isinstance(item, dict):
+        base.update(item)
+    else:
+        base[item_key or 'item'] = item
+    return base
+
+
+def start_map(task_execution) -> List[int]:
+    """
+    Create the item rows for a map step and return the first window of chunks
+
+    Redelivered messages find the rows already there and dispatch nothing new.
+
+    Returns:
+        list: Chunk numbers to dispatch now (empty if the list was empty or
+        the map was already started)
+    """
+    from .tasks import task_registry
+
+    config = task_execution.step.config
+    child_type = config.get('step_type')
+    if not child_type or not task_registry.get_task(child_type):
+        raise ValueError(f"Map step needs a registered 'step_type', got {child_type!r}")
+    if task_registry.is_control_task(child_type):
+        raise ValueError(f"Map step can't fan out control step type '{child_type}'")
+
+    if task_execution.map_items.exists():
+        return []
+
+    items = resolve_path(build_execution_context(task_execution.workflow_execution), config.get('items', ''))
+    if not isinstance(items, list):
+        raise ValueError(f"Map 'items' must resolve to a list, got {type(items).__name__}")
+
+    opts = _settings(task_execution.step)
+    chunk_size = opts['chunk_size']
+    total_chunks = math.ceil(len(items) / chunk_size)
+
+    with transaction.atomic():
+        # Park the step first; chunks only run while it's waiting
+        TaskExecution.objects.filter(id=task_execution.id).update(
+            status='waiting',
+            heartbeat_at=timezone.now(),
+            result={'items': len(items), 'chunks': total_chunks},
+        )
+        for start in range(0, len(items), CREATE_BATCH_SIZE):
+            MapItemExecution.objects.bulk_create([
+                MapItemExecution(
+                    task_execution=task_execution,
+                    index=index,
+                    chunk=index // chunk_size,
+                    input_data=_child_input(config, item, opts['item_key']),
+                )
+                for index, item in enumerate(items[start:start + CREATE_BATCH_SIZE], start)
+            ])
+
+    logger.info(f"Map step {task_execution.id}: {len(items)} items in {total_chunks} chunks")
+    if not total_chunks:
+        finish_map(task_execution.id)
+    return list(range(min(opts['max_parallelism'], total_chunks)))
+
+
+def run_chunk(task_execution_id: str, chunk: int, run_id: str) -> Dict[str, Any]:
+    """
+    Run every pending element of one chunk and save them in one bulk update
+
+    Args:
+        run_id: Id of this chunk run (the Celery task id); claims the elements
+
+    Returns:
+        dict: 'next_chunk' to dispatch (or None) and whether the map is 'done'
+    """
+    from .tasks import task_registry
+
+    task_execution = TaskExecution.objects.select_related('step').get(id=task_execution_id)
+    if task_execution.status != 'waiting':
+        # Finished, failed fast, or cancelled - let the window drain
+        return {'next_chunk': None, 'done': False}
+    TaskExecution.objects.filter(id=task_execution_id, status='waiting').update(heartbeat_at=timezone.now())
+
+    config = task_execution.step.config
+    opts = _settings(task_execution.step)
+    child_func = task_registry.get_task(config['step_type'])
+    allow_failures = config.get('allow_failures', False)
+
+    MapItemExecution.objects.filter(
+        task_execution_id=task_execution_id, chunk=chunk, status='pending',
+    ).update(status='running', claimed_by=run_id)
+    items = list(MapItemExecution.objects.filter(
+        task_execution_id=task_execution_id, chunk=chunk, status='running', claimed_by=run_id,
+    ).order_by('index'))
+    failed = False
+    done = []
+    try:
+        for item in items:
+            try:
+                item.result = child_func(item.input_data)
+                item.status = 'completed'
+            except SoftTimeLimitExceeded:
+                raise
+            except Exception as exc:
+                item.status = 'failed'
+                item.error_message = str(exc)
+                failed = True
+                logger.warning(f"Map item {task_execution_id}[{item.index}] failed: {exc}")
+            item.completed_at = timezone.now()
+            done.append(item)
+    except SoftTimeLimitExceeded:
+        # Out of time: the element that hung fails, the rest of the chunk
+        # goes back to pending and runs again in a fresh message
+        item = items[len(done)]
+        item.status = 'failed'
+        item.error_message = f"Timed out (step timeout_seconds={task_execution.step.timeout_seconds})"
+        item.completed_at = timezone.now()
+        done.append(item)
+        failed = True
+        MapItemExecution.objects.filter(id__in=[rest.id for rest in items[len(done):]]).update(
+            status='pending', claimed_by='',
+        )
+        logger.warning(f"Map chunk {task_execution_id}:{chunk} timed out after {len(done)} of {len(items)} items")
+        MapItemExecution.objects.bulk_update(done, ['status', 'result', 'error_message', 'completed_at'])
+        if not allow_failures:
+            finish_map(task_execution_id)
+            return {'next_chunk': None, 'done': True}
+        return {'next_chunk': chunk, 'done': False}
+    MapItemExecution.objects.bulk_update(done, ['status', 'result', 'error_message', 'completed_at'])
+
+    if failed and not allow_failures:
+        finish_map(task_execution_id)
+        return {'next_chunk': None, 'done': True}
+
+    total_chunks = (task_execution.result or {}).get('chunks', 0)
+    next_chunk = chunk + opts['max_parallelism']
+    if next_chunk < total_chunks:
+        return {'next_chunk': next_chunk, 'done': False}
+
+    # End of this lane; whoever sees no unfinished items left wraps up
+    if not MapItemExecution.objects.filter(
+        task_execution_id=task_execution_id, status__in=['pending', 'running'],
+    ).exists():
+        return {'next_chunk': None, 'done': finish_map(task_execution_id)}
+    return {'next_chunk': None, 'done': False}
+
+
+def recover_map(task_execution) -> List[int]:
+    """
+    Restart a map step whose chunk messages all died (worker killed at the
+    hard time limit, lost message)
+
+    Elements claimed by the dead runs go back to pending and a fresh window
+    of chunks is returned for dispatch; if nothing is left to run the step
+    is finished here.
+
+    Returns:
+        list: Chunk numbers to dispatch
+    """
+    MapItemExecution.objects.filter(task_execution_id=task_execution.id, status='running').update(
+        status='pending', claimed_by='',
+    )
+    # Lane k runs chunks k, k + max_parallelism, ...; restart each lane at
+    # its first unfinished chunk so every pending chunk is reached again
+    max_parallelism = _settings(task_execution.step)['max_parallelism']
+    lanes = {}
+    for chunk in (
+        MapItemExecution.objects
+        .filter(task_execution_id=task_execution.id, status='pending')
+        .order_by('chunk').values_list('chunk', flat=True).distinct()
+    ):
+        lanes.setdefault(chunk % max_parallelism, chunk)
+    if not lanes:
+        finish_map(task_execution.id)
+    return sorted(lanes.values())
+
+
+def finish_map(task_execution_id: str) -> bool:
+    """
+    Aggregate item results and complete (or fail) the map step
+
+    Returns:
+        bool: True if this call finished the step, False if another lane did
+    """
+    # Conditional update: only one lane gets to finish the step
+    claimed = TaskExecution.objects.filter(id=task_execution_id, status='waiting').update(status='running')
+    if not claimed:
+        return False
+
+    task_execution = TaskExecution.objects.select_related('step', 'workflow_execution').get(id=task_execution_id)
+    config = task_execution.step.config
+    items = MapItemExecution.objects.filter(task_execution_id=task_execution_id)
+    counts = dict(items.order_by().values_list('status').annotate(Count('id')))
+
+    summary = {
+        'items': sum(counts.values()),
+        'completed': counts.get('completed', 0),
+        'failed': counts.get('failed', 0),
+        'skipped': counts.get('pending', 0),
+    }
+    if config.get('aggregate', 'list') == 'list':
+        summary['results'] = list(items.order_by('index').values_list('result', flat=True).iterator(chunk_size=CREATE_BATCH_SIZE))
+
+    if summary['failed'] and not config.get('allow_failures', False):
+        error = f"Map step failed on {summary['failed']} of {summary['items']} items"
+        task_execution.result = summary
+        task_execution.save(update_fields=['result'])
+        task_execution.mark_as_failed(error)
+        workflow_execution = task_execution.workflow_execution
+        if workflow_execution.mark_as_failed(error_message=error, failed_step=task_execution.step):
+            from .tasks import _notify_parent_execution
+            _notify_parent_execution(workflow_execution)
+    else:
+        from .tasks import enqueue_next_steps
+        with transaction.atomic():
+            task_execution.mark_as_completed(result=summary)
+            enqueue_next_steps([task_execution.workflow_execution_id])
+    return True
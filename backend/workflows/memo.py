@@ -0,0 +1,96 @@
+"""
+FlowPilot Step Result Memoization
+
+Lets a step declare an idempotency key so identical runs reuse a stored
+result instead of executing again.
+
+Key Concepts:
+- The key is derived from the step's resolved input, so it is the same on
+  every retry and for every run with the same input
+- Results live in the 'step_results' cache (Redis in production, an
+  LRU-bounded in-process LocMemCache otherwise) with a TTL
+- While a keyed step is running, a short lock makes identical concurrent
+  runs back off instead of repeating the side effect (double SMS etc.).
+  They wait STEP_IN_FLIGHT_RETRY_SECONDS and look again, without using up
+  a retry. The lock is only as shared as the cache: with the LocMemCache
+  fallback it covers one worker process, so deduplicating across workers
+  needs Redis
+
+Step config:
+    idempotency_key: List of input fields that identify the call, or "*" for
+        the whole input. Steps without it always execute.
+    idempotency_ttl: Seconds to keep the result (default STEP_RESULT_TTL)
+"""
+
+import hashlib
+import json
+import logging
+from typing import Dict, Any, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class StepInFlight(Exception):
+    """An identical keyed step is already running on another worker"""
+
+
+def _cache():
+    return caches['step_results']
+
+
+def idempotency_key(step, input_data: Dict[str, Any]) -> Optional[str]:
+    """
+    Build the cache key for a step run, or None if the step doesn't declare one
+
+    Only the declared fields take part, so incidental fields (timestamps,
+    trace ids) don't defeat the cache.
+    """
+    fields = step.config.get('idempotency_key')
+    if not fields:
+        return None
+    if fields == '*':
+        material = input_data
+    else:
+        material = {field: input_data.get(field) for field in fields}
+    digest = hashlib.sha256(
+        json.dumps([step.step_type, material], sort_keys=True, cls=DjangoJSONEncoder).encode()
+    ).hexdigest()
+    return f"step-result:{step.step_type}:{digest}"
+
+
+def run_memoized(step, input_data: Dict[str, Any], func) -> Tuple[Any, bool]:
+    """
+    Run func(input_data), or return the stored result for the same key
+
+    Returns:
+        tuple: (result, reused) where reused is True on a cache hit
+
+    Raises:
+        StepInFlight: If the same key is being executed right now
+    """
+    key = idempotency_key(step, input_data)
+    if key is None:
+        return func(input_data), False
+
+    cache = _cache()
+    hit = cache.get(key, _MISSING)
+    if hit is not _MISSING:
+        logger.info(f"Reusing stored result for {step.step_type} ({key[-12:]})")
+        return hit, True
+
+    lock_key = f"{key}:lock"
+    if not cache.add(lock_key, 1, timeout=step.timeout_seconds):
+        raise StepInFlight(f"Identical {step.step_type} call already in progress")
+
+    try:
+        result = func(input_data)
+        cache.set(key, result, timeout=step.config.get('idempotency_ttl', settings.STEP_RESULT_TTL))
+        return result, False
+    finally:
+        cache.delete(lock_key)
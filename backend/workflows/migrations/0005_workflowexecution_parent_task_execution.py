@@ -0,0 +1,24 @@
+# Generated by Django 5.0.6 on 2026-10-19 09:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflows', '0004_executionarchivestats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workflowexecution',
+            name='parent_task_execution',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sub_executions', to='workflows.taskexecution'),
+        ),
+        migrations.AlterField(
+            model_name='taskexecution',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed'), ('cancelled', 'Cancelled'), ('skipped', 'Skipped'), ('retrying', 'Retrying'), ('waiting', 'Waiting')], default='pending', max_length=20),
+        ),
+    ]
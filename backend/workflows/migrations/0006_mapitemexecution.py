@@ -0,0 +1,32 @@
+# Generated by Django 5.0.6 on 2026-10-19 09:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflows', '0005_workflowexecution_parent_task_execution'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MapItemExecution',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.IntegerField()),
+                ('chunk', models.IntegerField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('input_data', models.JSONField(default=dict)),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('error_message', models.TextField(blank=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('task_execution', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='map_items', to='workflows.taskexecution')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['task_execution', 'chunk'], name='workflows_m_task_ex_a67895_idx'), models.Index(fields=['task_execution', 'status'], name='workflows_m_task_ex_053fa9_idx')],
+                'unique_together': {('task_execution', 'index')},
+            },
+        ),
+    ]
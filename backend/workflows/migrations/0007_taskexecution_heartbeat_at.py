@@ -0,0 +1,22 @@
+# Generated by Django 5.0.6 on 2026-10-19 09:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflows', '0006_mapitemexecution'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taskexecution',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='taskexecution',
+            index=models.Index(fields=['status', 'heartbeat_at'], name='workflows_t_status_f0f4b3_idx'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.0.6 on 2026-10-19 09:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflows', '0008_schedulerlease'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StepHourlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('count', models.IntegerField(default=0)),
+                ('failures', models.IntegerField(default=0)),
+                ('cancelled', models.IntegerField(default=0)),
+                ('retries', models.IntegerField(default=0)),
+                ('timed', models.IntegerField(default=0)),
+                ('total_duration_ms', models.BigIntegerField(default=0)),
+                ('duration_histogram', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-hour'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Watermark',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('position', models.DateTimeField(blank=True, null=True)),
+                ('last_id', models.UUIDField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='taskexecution',
+            index=models.Index(fields=['completed_at', 'id'], name='workflows_t_complet_7baeb5_idx'),
+        ),
+        migrations.AddField(
+            model_name='stephourlyrollup',
+            name='step',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_rollups', to='workflows.workflowstep'),
+        ),
+        migrations.AddField(
+            model_name='stephourlyrollup',
+            name='workflow',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='step_rollups', to='workflows.workflow'),
+        ),
+        migrations.AddIndex(
+            model_name='stephourlyrollup',
+            index=models.Index(fields=['workflow', 'hour'], name='workflows_s_workflo_9870a2_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='stephourlyrollup',
+            unique_together={('step', 'hour')},
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-19 10:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflows', '0010_fair_share_dispatch'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='taskexecution',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed'), ('cancelled', 'Cancelled'), ('skipped', 'Skipped'), ('retrying', 'Retrying'), ('waiting', 'Waiting'), ('timed_out', 'Timed out')], default='pending', max_length=20),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.0.6 on 2026-10-19 10:11
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflows', '0012_task_reused_from'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExecutionSnapshot',
+            fields=[
+                ('workflow_execution', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='snapshot', serialize=False, to='workflows.workflowexecution')),
+                ('status', models.CharField(blank=True, max_length=20)),
+                ('steps', models.JSONField(default=dict)),
+                ('event_count', models.IntegerField(default=0)),
+                ('first_event_at', models.DateTimeField(blank=True, null=True)),
+                ('last_event_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ExecutionEvent',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, primary_key=True, serialize=False)),
+                ('event', models.CharField(max_length=40)),
+                ('at', models.DateTimeField()),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('task_execution', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='events', to='workflows.taskexecution')),
+                ('workflow_execution', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='events', to='workflows.workflowexecution')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['workflow_execution', 'at'], name='workflows_e_workflo_e11756_idx'), models.Index(fields=['at', 'id'], name='workflows_e_at_06b2cf_idx')],
+            },
+        ),
+    ]
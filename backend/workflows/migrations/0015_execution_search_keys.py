@@ -0,0 +1,28 @@
+# Generated by Django 5.0.6 on 2026-10-19 10:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflows', '0014_outbox_messages'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExecutionSearchKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100)),
+                ('value', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField()),
+                ('workflow', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='workflows.workflow')),
+                ('workflow_execution', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='search_keys', to='workflows.workflowexecution')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['key', 'value', 'created_at'], name='workflows_e_key_8ba3f3_idx'), models.Index(fields=['workflow', 'key', 'value', 'created_at'], name='workflows_e_workflo_3fadbe_idx')],
+            },
+        ),
+    ]
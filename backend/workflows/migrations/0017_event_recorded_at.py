@@ -0,0 +1,39 @@
+# Generated by Django 5.0.6 on 2026-10-19 10:40
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_recorded_at(apps, schema_editor):
+    # The compaction watermark used to follow `at`; existing events keep their place behind it
+    apps.get_model('workflows', 'ExecutionEvent').objects.update(recorded_at=F('at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflows', '0016_map_item_claims'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='executionevent',
+            name='workflows_e_at_06b2cf_idx',
+        ),
+        migrations.AddField(
+            model_name='executionevent',
+            name='recorded_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(backfill_recorded_at, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='executionsnapshot',
+            name='status_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='executionevent',
+            index=models.Index(fields=['recorded_at', 'id'], name='workflows_e_recorde_3fd522_idx'),
+        ),
+    ]
@@ -1,8 +1,10 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 import uuid
 
+from .events import record as record_event
+
 class Workflow(models.Model):
     """
     The main workflow container - THIS IS THE TEMPLATE/BLUEPRINT
@@ -154,6 +156,8 @@ class WorkflowExecution(models.Model):
         ('cancelled', 'Cancelled'), # User stopped it
         ('paused', 'Paused'),       # Temporarily stopped (for manual approval)
     ]
+    # Statuses a run can still finish (or be cancelled) from
+    ACTIVE_STATUSES = ['pending', 'running', 'paused']
     
     id = models.UUIDField(primary_key=True, default=uuid.uuid4)
     workflow = models.ForeignKey(
@@ -213,6 +217,15 @@ class WorkflowExecution(models.Model):
         related_name='retries'
     )
     
+    # For sub-workflows - the `sub_workflow` step that spawned this execution
+    parent_task_execution = models.ForeignKey(
+        'TaskExecution',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='sub_executions'
+    )
+    
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -239,32 +252,52 @@ class WorkflowExecution(models.Model):
         self.status = 'running'
         self.started_at = timezone.now()
         self.save(update_fields=['status', 'started_at'])
+        record_event(self.id, 'execution.started', at=self.started_at)
     
     def mark_as_completed(self, output_data=None):
-        """Mark execution as successfully completed"""
-        self.status = 'completed'
-        self.completed_at = timezone.now()
+        """
+        Mark execution as successfully completed
+        
+        Conditional UPDATE, so a run that was cancelled meanwhile stays
+        cancelled. Returns False (and changes nothing) if it's no longer active.
+        """
+        completed_at = timezone.now()
+        fields = {'status': 'completed', 'completed_at': completed_at}
         if output_data:
-            self.output_data = output_data
-        self.save(update_fields=['status', 'completed_at', 'output_data'])
+            fields['output_data'] = output_data
+        if not WorkflowExecution.objects.filter(id=self.id, status__in=self.ACTIVE_STATUSES).update(**fields):
+            return False
+        for field, value in fields.items():
+            setattr(self, field, value)
+        record_event(self.id, 'execution.completed', at=completed_at)
         
         # Update workflow statistics
-        self.workflow.total_executions += 1
-        self.workflow.successful_executions += 1
-        self.workflow.save(update_fields=['total_executions', 'successful_executions'])
+        Workflow.objects.filter(id=self.workflow_id).update(
+            total_executions=models.F('total_executions') + 1,
+            successful_executions=models.F('successful_executions') + 1,
+        )
+        return True
     
     def mark_as_failed(self, error_message, failed_step=None):
-        """Mark execution as failed"""
-        self.status = 'failed'
-        self.completed_at = timezone.now()
-        self.error_message = error_message
+        """
+        Mark execution as failed
+        
+        Conditional like mark_as_completed: a step failing after a cancel
+        doesn't turn the cancelled run into a failed one.
+        """
+        completed_at = timezone.now()
+        fields = {'status': 'failed', 'completed_at': completed_at, 'error_message': error_message}
         if failed_step:
-            self.failed_step = failed_step
-        self.save(update_fields=['status', 'completed_at', 'error_message', 'failed_step'])
+            fields['failed_step'] = failed_step
+        if not WorkflowExecution.objects.filter(id=self.id, status__in=self.ACTIVE_STATUSES).update(**fields):
+            return False
+        for field, value in fields.items():
+            setattr(self, field, value)
+        record_event(self.id, 'execution.failed', at=completed_at, error=error_message[:500])
         
         # Update workflow statistics
-        self.workflow.total_executions += 1
-        self.workflow.save(update_fields=['total_executions'])
+        Workflow.objects.filter(id=self.workflow_id).update(total_executions=models.F('total_executions') + 1)
+        return True
 
 
 class TaskExecution(models.Model):
@@ -290,6 +323,8 @@ class TaskExecution(models.Model):
         ('cancelled', 'Cancelled'),
         ('skipped', 'Skipped'),     # For conditional steps that don't meet criteria
         ('retrying', 'Retrying'),   # Currently in retry loop
+        ('waiting', 'Waiting'),     # Control step waiting on child executions (e.g. sub_workflow)
+        ('timed_out', 'Timed out'), # Ran past the step's timeout_seconds
     ]
     
     id = models.UUIDField(primary_key=True, default=uuid.uuid4)
@@ -312,7 +347,8 @@ class TaskExecution(models.Model):
     started_at = models.DateTimeField(null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     
-    # Task-specific input (can be different from workflow input)
+    # Task-specific input (can be different from workflow input). Empty for
+    # root steps, which read the workflow input via get_input_data()
     input_data = models.JSONField(default=dict)
     # Example: {"phone": "+91123", "message": "Your OTP is {otp}"}
     
@@ -331,6 +367,27 @@ class TaskExecution(models.Model):
     # Execution metadata
     worker_id = models.CharField(max_length=255, blank=True)  # Which Celery worker ran this
     celery_task_id = models.CharField(max_length=255, blank=True)  # Celery task ID for tracking
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    # WHY: Workers bump this while a step runs. A 'running' row with a stale
+    # heartbeat means the worker died, and the reaper recovers it.
+    
+    # Dispatch bookkeeping. ready_at: the step was queued for dispatch (so it
+    # isn't queued twice); dispatched_at: it was handed to the broker. With
+    # fair-share dispatch, steps wait in the virtual queue named by
+    # dispatch_key (owner or workflow) between the two (see fairshare.py).
+    dispatch_key = models.CharField(max_length=64, blank=True)
+    ready_at = models.DateTimeField(null=True, blank=True)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    
+    # Set on completed steps copied into a resumed execution: the step wasn't
+    # run again, its result was taken from this TaskExecution
+    reused_from = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='reused_by'
+    )
     
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -338,8 +395,11 @@ class TaskExecution(models.Model):
         indexes = [
             models.Index(fields=['workflow_execution', 'status']),
             models.Index(fields=['status', 'next_retry_at']),  # For finding tasks to retry
+            models.Index(fields=['status', 'heartbeat_at']),   # For the stale-task reaper
             models.Index(fields=['step', 'status']),
             models.Index(fields=['created_at']),
+            models.Index(fields=['completed_at', 'id']),   # Analytics rollup watermark scan
+            models.Index(fields=['status', 'dispatch_key', 'ready_at']),  # Fair-share virtual queues
         ]
         ordering = ['step__step_order']  # Order by step sequence
         unique_together = ['workflow_execution', 'step']  # One execution per step per workflow run
@@ -355,13 +415,39 @@ class TaskExecution(models.Model):
         end_time = self.completed_at or timezone.now()
         return end_time - self.started_at
     
+    def get_input_data(self):
+        """
+        Input the step runs with
+        
+        Root steps don't store a copy of the execution input - they read it
+        from the WorkflowExecution, so a large input is stored only once.
+        """
+        if self.input_data:
+            return self.input_data
+        if not self.step.depends_on.exists():
+            return self.workflow_execution.input_data
+        return {}
+    
     def mark_as_started(self, worker_id=None):
-        """Mark task as started"""
-        self.status = 'running'
-        self.started_at = timezone.now()
-        if worker_id:
+        """
+        Mark task as started
+        
+        Conditional UPDATE, so only one worker can claim a pending/retrying task.
+        Returns False if someone else already did (duplicate or redelivered message).
+        """
+        started_at = timezone.now()
+        worker_id = worker_id or self.worker_id
+        claimed = TaskExecution.objects.filter(
+            id=self.id, status__in=['pending', 'retrying']
+        ).update(status='running', started_at=started_at, heartbeat_at=started_at, worker_id=worker_id)
+        if claimed:
+            self.status = 'running'
+            self.started_at = started_at
+            self.heartbeat_at = started_at
             self.worker_id = worker_id
-        self.save(update_fields=['status', 'started_at', 'worker_id'])
+            record_event(self.workflow_execution_id, 'task.started', self.id, at=started_at,
+                         worker=worker_id, attempt=self.retry_count)
+        return bool(claimed)
     
     def mark_as_completed(self, result=None):
         """Mark task as successfully completed"""
@@ -370,6 +456,7 @@ class TaskExecution(models.Model):
         if result:
             self.result = result
         self.save(update_fields=['status', 'completed_at', 'result'])
+        record_event(self.workflow_execution_id, 'task.completed', self.id, at=self.completed_at)
     
     def mark_as_failed(self, error_message, traceback=None):
         """Mark task as failed"""
@@ -379,6 +466,19 @@ class TaskExecution(models.Model):
         if traceback:
             self.error_traceback = traceback
         self.save(update_fields=['status', 'completed_at', 'error_message', 'error_traceback'])
+        record_event(self.workflow_execution_id, 'task.failed', self.id, at=self.completed_at,
+                     error=error_message[:500])
+    
+    def mark_as_timed_out(self):
+        """Mark task as stopped at its step's timeout (elapsed time is completed_at - started_at)"""
+        self.status = 'timed_out'
+        self.completed_at = timezone.now()
+        elapsed = (self.completed_at - self.started_at).total_seconds() if self.started_at else 0
+        self.error_message = f"Timed out after {elapsed:.1f}s (timeout_seconds={self.step.timeout_seconds})"
+        self.save(update_fields=['status', 'completed_at', 'error_message'])
+        record_event(self.workflow_execution_id, 'task.timed_out', self.id, at=self.completed_at,
+                     elapsed_seconds=round(elapsed, 3))
+        return elapsed
     
     def schedule_retry(self):
         """Schedule this task for retry"""
@@ -392,6 +492,8 @@ class TaskExecution(models.Model):
         self.retry_count += 1
         self.status = 'retrying'
         self.save(update_fields=['next_retry_at', 'retry_count', 'status'])
+        record_event(self.workflow_execution_id, 'task.retry_scheduled', self.id,
+                     attempt=self.retry_count, next_retry_at=self.next_retry_at.isoformat())
         return True
     
     def is_ready_for_execution(self):
@@ -406,4 +508,323 @@ class TaskExecution(models.Model):
             .values_list('step_id', flat=True)
         )
         
-        return self.step.can_execute(completed_steps)
\ No newline at end of file
+        return self.step.can_execute(completed_steps)
+
+class ExecutionArchiveStats(models.Model):
+    """
+    Aggregates for executions that were archived out of the hot tables
+    
+    One row per workflow per day. Retention folds every archived batch in here
+    before deleting it, so success rates and volumes survive the purge.
+    """
+    COUNTER_FIELDS = [
+        'total_executions', 'completed_executions', 'failed_executions',
+        'cancelled_executions', 'total_tasks', 'failed_tasks', 'total_retries',
+        'total_duration_ms',
+    ]
+    
+    workflow = models.ForeignKey(
+        Workflow,
+        on_delete=models.CASCADE,
+        related_name='archive_stats'
+    )
+    day = models.DateField()
+    
+    total_executions = models.IntegerField(default=0)
+    completed_executions = models.IntegerField(default=0)
+    failed_executions = models.IntegerField(default=0)
+    cancelled_executions = models.IntegerField(default=0)
+    total_tasks = models.IntegerField(default=0)
+    failed_tasks = models.IntegerField(default=0)
+    total_retries = models.IntegerField(default=0)
+    total_duration_ms = models.BigIntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['workflow', 'day']
+        ordering = ['-day']
+
+    def __str__(self):
+        return f"{self.workflow_id} - {self.day}: {self.total_executions} executions"
+
+
+class MapItemExecution(models.Model):
+    """
+    One element of a `map` step's fan-out
+    
+    A map step over N items gets N of these instead of N WorkflowSteps and
+    N TaskExecutions. Items are grouped into chunks; one Celery message runs
+    a whole chunk.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),     # Claimed by a chunk run (claimed_by)
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    task_execution = models.ForeignKey(
+        TaskExecution,
+        on_delete=models.CASCADE,
+        related_name='map_items'
+    )
+    index = models.IntegerField()  # Position in the input list (results keep this order)
+    chunk = models.IntegerField()
+    
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    input_data = models.JSONField(default=dict)
+    result = models.JSONField(null=True, blank=True)
+    error_message = models.TextField(blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    # Celery task id of the chunk run that claimed the item, so a duplicate
+    # or recovered chunk message never runs the same element twice
+    claimed_by = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        unique_together = ['task_execution', 'index']
+        indexes = [
+            models.Index(fields=['task_execution', 'chunk']),    # Loading one chunk
+            models.Index(fields=['task_execution', 'status']),   # Progress / completion checks
+        ]
+
+    def __str__(self):
+        return f"{self.task_execution_id} [{self.index}] ({self.status})"
+
+
+class SchedulerLease(models.Model):
+    """
+    Leader election for singleton services (scheduler, fair-share dispatcher)
+    
+    Processes take this row with SELECT ... FOR UPDATE and only the current
+    holder does the work. If the holder dies the lease expires and another
+    process takes over.
+    """
+    name = models.CharField(max_length=100, primary_key=True)
+    holder = models.CharField(max_length=255)  # hostname:pid of the leader
+    expires_at = models.DateTimeField()
+
+    @classmethod
+    def acquire(cls, name: str, holder: str, seconds: float) -> bool:
+        """Take or renew the lease; the row lock makes this safe between processes"""
+        now = timezone.now()
+        with transaction.atomic():
+            lease, _ = cls.objects.select_for_update().get_or_create(
+                name=name, defaults={'holder': holder, 'expires_at': now},
+            )
+            if lease.holder != holder and lease.expires_at > now:
+                return False
+            lease.holder = holder
+            lease.expires_at = now + timezone.timedelta(seconds=seconds)
+            lease.save(update_fields=['holder', 'expires_at'])
+        return True
+    
+    @classmethod
+    def release(cls, name: str, holder: str):
+        cls.objects.filter(name=name, holder=holder).update(expires_at=timezone.now())
+
+    def __str__(self):
+        return f"{self.name} held by {self.holder} until {self.expires_at}"
+
+
+class StepHourlyRollup(models.Model):
+    """
+    Pre-aggregated task execution stats, one row per step per hour
+    
+    Filled incrementally by the analytics rollup job so dashboards never scan
+    TaskExecution. Durations are kept as a log-scale histogram
+    ({bucket: count}, see analytics.py) so p50/p95 can be merged across hours.
+    """
+    workflow = models.ForeignKey(
+        Workflow,
+        on_delete=models.CASCADE,
+        related_name='step_rollups'
+    )
+    step = models.ForeignKey(
+        WorkflowStep,
+        on_delete=models.CASCADE,
+        related_name='hourly_rollups'
+    )
+    hour = models.DateTimeField()  # Start of the hour (UTC) the tasks finished in
+    
+    count = models.IntegerField(default=0)
+    failures = models.IntegerField(default=0)
+    cancelled = models.IntegerField(default=0)
+    retries = models.IntegerField(default=0)
+    timed = models.IntegerField(default=0)  # Tasks with a duration (started_at set)
+    total_duration_ms = models.BigIntegerField(default=0)
+    duration_histogram = models.JSONField(default=dict)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['step', 'hour']
+        indexes = [
+            models.Index(fields=['workflow', 'hour']),
+        ]
+        ordering = ['-hour']
+
+    def __str__(self):
+        return f"{self.step_id} @ {self.hour}: {self.count} tasks"
+
+
+class Watermark(models.Model):
+    """
+    Progress marker for incremental background jobs
+    
+    Stores the (timestamp, id) of the last row a job has processed, so the
+    next run starts right after it. The id breaks ties between rows with the
+    same timestamp.
+    """
+    name = models.CharField(max_length=100, primary_key=True)
+    position = models.DateTimeField(null=True, blank=True)
+    last_id = models.UUIDField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} at {self.position}"
+
+
+class ExecutionEvent(models.Model):
+    """
+    Append-only log of execution and step transitions
+    
+    One row per transition (dispatched, started, completed, retry scheduled,
+    cancelled, ...), never updated. Written in batches by workflows/events.py
+    and folded into ExecutionSnapshot by the compaction job. It's the audit
+    trail and the replayable timeline of a run.
+    
+    Foreign keys aren't enforced in the database: an insert never waits on
+    (or locks) the execution rows, and retention deletes events explicitly.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4)
+    workflow_execution = models.ForeignKey(
+        WorkflowExecution,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='events'
+    )
+    task_execution = models.ForeignKey(
+        TaskExecution,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name='events'
+    )
+    # 'execution.<status>' or 'task.<transition>', e.g. 'task.started'
+    event = models.CharField(max_length=40)
+    at = models.DateTimeField()
+    # When the buffer wrote it - compaction follows this, so late flushes aren't skipped
+    recorded_at = models.DateTimeField(default=timezone.now)
+    # Small per-event detail: worker, error message, retry count, elapsed seconds
+    data = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['workflow_execution', 'at']),  # Timeline of one run
+            models.Index(fields=['recorded_at', 'id']),  # Compaction watermark scan
+        ]
+
+    def __str__(self):
+        return f"{self.workflow_execution_id} {self.event} at {self.at}"
+
+
+class ExecutionSnapshot(models.Model):
+    """
+    Current state of an execution as folded from its ExecutionEvents
+    
+    Maintained by the compaction job, so timelines and dashboards read one
+    row per run instead of its TaskExecutions. `steps` maps task execution id
+    to its last known state.
+    """
+    workflow_execution = models.OneToOneField(
+        WorkflowExecution,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        primary_key=True,
+        related_name='snapshot'
+    )
+    status = models.CharField(max_length=20, blank=True)
+    # `at` of the event that set status; an older event folded later doesn't override it
+    status_at = models.DateTimeField(null=True, blank=True)
+    steps = models.JSONField(default=dict)
+    event_count = models.IntegerField(default=0)
+    first_event_at = models.DateTimeField(null=True, blank=True)
+    last_event_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.workflow_execution_id} ({self.status}, {self.event_count} events)"
+
+
+class OutboxMessage(models.Model):
+    """
+    A Celery message waiting to be published (transactional outbox)
+    
+    Written in the same transaction as the state change that calls for it
+    (e.g. a step marked dispatched), so a message exists exactly when that
+    change committed. workflows/outbox.py publishes and deletes them in
+    batches right after commit; the periodic relay picks up whatever a
+    crashed process or a broker outage left behind.
+    """
+    # Celery task name, e.g. 'workflows.tasks.execute_workflow_task'
+    task_name = models.CharField(max_length=255)
+    args = models.JSONField(default=list)
+    # apply_async options: task_id, soft_time_limit, time_limit
+    options = models.JSONField(default=dict)
+    # The step this message runs, so cancelling can drop it before it's sent
+    task_execution_id = models.UUIDField(null=True, blank=True, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Not before this time (pushed back after a failed publish)
+    available_at = models.DateTimeField(default=timezone.now)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['available_at', 'id']),  # Relay scan
+        ]
+
+    def __str__(self):
+        return f"{self.task_name}{self.args} ({self.attempts} attempts)"
+
+
+class ExecutionSearchKey(models.Model):
+    """
+    One declared input field of an execution, extracted for lookups
+    
+    A workflow lists the input fields support searches by in
+    trigger_config.search_keys (e.g. ["patient_phone", "order.id"]). Their
+    values are copied here when the execution is created, so "the execution
+    for patient_phone X" is an index lookup instead of a scan over every
+    execution's input_data (see workflows/search.py).
+    
+    Like ExecutionEvent, the foreign keys aren't enforced in the database;
+    retention deletes these rows with their execution.
+    """
+    workflow_execution = models.ForeignKey(
+        WorkflowExecution,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='search_keys'
+    )
+    workflow = models.ForeignKey(
+        Workflow,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+'
+    )
+    key = models.CharField(max_length=100)
+    value = models.CharField(max_length=255)
+    # The execution's created_at, so results come back newest first from the index
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['key', 'value', 'created_at']),  # Search across workflows
+            models.Index(fields=['workflow', 'key', 'value', 'created_at']),  # Search within one workflow
+        ]
+
+    def __str__(self):
+        return f"{self.key}={self.value} -> {self.workflow_execution_id}"
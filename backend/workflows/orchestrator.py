@@ -1,101 +1,409 @@
 #brain of the code glues everthing togethere
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
 from .models import WorkflowExecution,Workflow,WorkflowStep,TaskExecution
-from .tasks import execute_workflow_task
+from .tasks import dispatch_task_executions, enqueue_next_steps
+from .fairshare import dispatch_key_for
+from .admission import admit, hold_count
+from .dag import graph_errors, WorkflowValidationError
+from .events import record as record_event, record_many
+from .search import index_executions
+
+logger = logging.getLogger(__name__)
+
+# Guard against sub-workflows that (indirectly) include themselves
+MAX_SUB_WORKFLOW_DEPTH = 10
+# Executions that can be picked up again with resume()
+RESUMABLE_STATUSES = ['failed', 'cancelled']
+
+
+def _invalid_workflows(steps_by_workflow, edges):
+    """
+    Graph errors per workflow (cycles, dangling edges), from steps and edges already loaded
+
+    Returns:
+        dict: {workflow key of steps_by_workflow: list of errors}, only for invalid workflows
+    """
+    workflow_of_step = {step.id: key for key, steps in steps_by_workflow.items() for step in steps}
+    edges_by_workflow = defaultdict(list)
+    for step_id, dependency_id in edges:
+        edges_by_workflow[workflow_of_step[step_id]].append((step_id, dependency_id))
+    invalid = {}
+    # A workflow without edges can't have a cycle
+    for key, workflow_edges in edges_by_workflow.items():
+        steps = {step.id: {'name': step.name, 'step_order': step.step_order} for step in steps_by_workflow[key]}
+        errors = graph_errors(steps, workflow_edges)
+        if errors:
+            invalid[key] = errors
+    return invalid
+
+
 class Orchestrator:
-    def __init__(self,workflow_id,input_data=None):
-        pass
-    
-    def execute(self,workflow_id,input_data=None):
-        #create a workflow_execution with input_data
-        #create TaskExecutions too
-        #and triggers the no depenedent steps
-        #how to find non dependednt steps
-        workfow = Workflow.objects.filter(id = workflow_id).last()
-        if not workfow:
+
+    def execute(self, workflow_id, input_data=None, triggered_by=None,
+                trigger_source='manual', parent_task_execution=None, reject_when_full=False):
+        """
+        Create a WorkflowExecution with one TaskExecution per step and
+        dispatch the steps that don't depend on anything (or hold it
+        pending when the workers are saturated, see admission.py).
+
+        Returns:
+            WorkflowExecution: the new execution
+
+        Raises:
+            WorkflowValidationError: If the step graph can't run
+        """
+        executions = self.execute_many(
+            [(workflow_id, input_data)],
+            triggered_by=triggered_by,
+            trigger_source=trigger_source,
+            parent_task_execution=parent_task_execution,
+            reject_when_full=reject_when_full,
+            strict=True,
+        )
+        if not executions:
             raise Exception("Workflow Not found")
-        workflow_execution = WorkflowExecution.objects.create(
-            workfow = workfow,
-            input_data = input_data
+        return executions[0]
+
+    def execute_many(self, runs, triggered_by=None, trigger_source='manual', parent_task_execution=None,
+                     reject_when_full=False, strict=False):
+        """
+        Start many executions at once (schedules, webhook bursts, replays)
+
+        Executions and their TaskExecutions are bulk-inserted in one
+        transaction, and every root step's message goes into the outbox in
+        that same transaction with one dispatch call, so N runs cost a
+        handful of queries instead of N * steps.
+
+        Args:
+            runs: Iterable of (workflow_id, input_data) pairs. Unknown
+                workflow ids are skipped, and so are workflows whose step
+                graph has a cycle or a dangling edge (their runs would
+                never finish)
+            reject_when_full: Raise AdmissionRejected instead of holding
+                when the pending backlog is full (API triggers)
+            strict: Raise WorkflowValidationError for an invalid graph
+                instead of skipping its runs
+
+        Returns:
+            list: The new WorkflowExecutions, in input order
+        """
+        runs = [(str(workflow_id), input_data or {}) for workflow_id, input_data in runs]
+        workflows = {
+            str(workflow.id): workflow
+            for workflow in Workflow.objects.filter(id__in={workflow_id for workflow_id, _ in runs})
+        }
+        steps_by_workflow = defaultdict(list)
+        for step in WorkflowStep.objects.filter(workflow_id__in=workflows.keys()):
+            steps_by_workflow[str(step.workflow_id)].append(step)
+        # One query for the whole edge list instead of one per step
+        edges = list(
+            WorkflowStep.depends_on.through.objects
+            .filter(from_workflowstep__workflow_id__in=workflows.keys())
+            .values_list('from_workflowstep_id', 'to_workflowstep_id')
         )
-        workflow_execution.mark_as_started()
-        
-        for step in workfow.steps.all():
-            #create a taskexecution for each step
-            #check the step has depended on others
-            
-            if not step.depdepends_on:
-                #this step may be the first step
-                task_exe = TaskExecution.objects.create(
-                    workflow_execution = workflow_execution,
-                    step = step,
-                    input_data = input_data
-                    )
-                execute_workflow_task.delay(task_exe.id)
-            else:
-                #input of these steps is output of other dependent steps
-                task_exe = TaskExecution.objects.create(
-                    workflow_execution = workflow_execution,
-                    step = step
+        dependent_step_ids = {step_id for step_id, _ in edges}
+        invalid = _invalid_workflows(steps_by_workflow, edges)
+        if invalid:
+            if strict:
+                raise WorkflowValidationError(next(iter(invalid.values())))
+            for workflow_id, errors in invalid.items():
+                logger.error(f"Not starting runs of workflow {workflow_id}: {'; '.join(errors)}")
+
+        runs = [
+            (workflow_id, input_data) for workflow_id, input_data in runs
+            if workflow_id in workflows and workflow_id not in invalid
+        ]
+        # Sub-workflows belong to work that was already admitted
+        start_now = parent_task_execution is not None or admit(len(runs), reject_when_full)
+
+        now = timezone.now()
+        executions = [
+            WorkflowExecution(
+                workflow=workflows[workflow_id],
+                input_data=input_data,
+                status='running' if start_now else 'pending',
+                started_at=now if start_now else None,
+                triggered_by=triggered_by,
+                trigger_source=trigger_source,
+                parent_task_execution=parent_task_execution,
+            )
+            for workflow_id, input_data in runs
+        ]
+
+        with transaction.atomic():
+            WorkflowExecution.objects.bulk_create(executions)
+            # No per-task copy of the input: root steps read it from the
+            # execution (TaskExecution.get_input_data), so it's stored once
+            task_executions = TaskExecution.objects.bulk_create([
+                TaskExecution(
+                    workflow_execution=workflow_execution,
+                    step=step,
+                    dispatch_key=dispatch_key_for(workflow_execution.workflow),
                 )
-                
-    def is_all_tasks_exections_completed(self,wokflow_executon_id,step_ids=None):
-        try:
-            if not step_ids:
-                step_ids = WorkflowExecution.objects.get(id = wokflow_executon_id).steps.values_list("id",flat=True)
-                
-            for step_id in step_ids:
-                task_exe = TaskExecution.objects.get(workflow_exe_id =wokflow_executon_id,step_id =step_id)
-                if task_exe.status!='failed':
-                    return False,"task_failed"
-                elif task_exe.status!="completed":
-                    return True,"tasks_not_completed"
-            return True,"tasks_complelted"
-        except Exception as e:
-            import traceback
-            print(f"Error {e} : {traceback.format_exc()}")
-            return False,"error"
-
-    def get_runnable_tasks(self,wokflow_executon_id):
-        #this returns the all the the task_exection_ids which are ready to run
-        
-        all_task_executions = TaskExecution.objects.filter(wokflow_executon_id=wokflow_executon_id)
-        runnable_tasks = []
-        for task_execution in all_task_executions:
-            step = task_execution.step
-            if not step.depends_on:
-                runnable_tasks.append(task_execution.id)
-            else:
-                step_ids = step.depends_on.values_list('id')
-                if self.is_all_tasks_exections_completed(wokflow_executon_id,step_ids)[0]:
-                    runnable_tasks.append(task_execution.id)
-         
-        return runnable_tasks
-    
-    def on_task_complete(self,task_execution_id):
-        #task_execution_id is completed
-        #triggers the next task to celery
-        #if all wokflow task executions are completed then mark workflow as done
-        task_execution = TaskExecution.objects.filter(id = task_execution_id).last()
-        if not task_execution or task_execution.status!='completed':
-            raise Exception("Task is not found or not completed")
-        workflow_exe = WorkflowExecution.objects.filter(id = workflow_execution_id).last()
-        workflow_execution_id = task_execution.workflow_execution.id
-        dependent_steps = task_execution.step.dependents.all()
-        
-        for dependent_step in dependent_steps:
-            dependent_task_exe = TaskExecution.object.filter(workflow_execution = workflow_execution_id)
-            if self.is_all_tasks_exections_completed(workflow_execution_id,[dependent_step.id])[0]:
-                execute_workflow_task.delay(dependent_task_exe.id)
-        
-        workflow_completed,msg = self.is_all_tasks_exections_completed(workflow_execution_id)  
-              
-        if workflow_completed:
-            workflow_exe.mark_as_completed()
-        elif msg=='task_failed':
-            workflow_exe.mark_as_failed()
-        
-            
-        
-            
-                
-        
\ No newline at end of file
+                for workflow_execution in executions
+                for step in steps_by_workflow[str(workflow_execution.workflow_id)]
+            ], batch_size=1000)
+            index_executions(executions)
+            record_many(
+                [(workflow_execution.id, None) for workflow_execution in executions],
+                'execution.started' if start_now else 'execution.held', at=now, trigger_source=trigger_source,
+            )
+            for workflow_execution in executions:
+                if not steps_by_workflow[str(workflow_execution.workflow_id)] and workflow_execution.mark_as_completed():
+                    self.on_sub_workflow_finished(workflow_execution)
+            # Root step messages go into the outbox with the rows, so a crash
+            # can't leave runs 'running' with nothing dispatched
+            if start_now:
+                dispatch_task_executions(
+                    task_exe for task_exe in task_executions if task_exe.step_id not in dependent_step_ids
+                )
+
+        if not start_now:
+            # The admission feeder dispatches their root steps later
+            hold_count(len(executions))
+        return executions
+
+    # ===========================
+    # RESUME
+    # ===========================
+
+    def resume(self, workflow_execution, triggered_by=None, reject_when_full=False):
+        """
+        Re-run a failed or cancelled execution from where it stopped
+
+        Returns:
+            WorkflowExecution: the new child execution, or None if the
+            execution can't be resumed (not failed/cancelled, or already
+            resumed successfully or in progress)
+        """
+        executions = self.resume_many(
+            [workflow_execution.id], triggered_by=triggered_by, reject_when_full=reject_when_full,
+        )
+        return executions[0] if executions else None
+
+    def resume_many(self, execution_ids, triggered_by=None, reject_when_full=False):
+        """
+        Resume many executions at once (e.g. everything that failed in an outage)
+
+        Each resumable execution gets a child WorkflowExecution
+        (parent_execution=source, trigger_source='retry'). Completed steps are
+        bulk-copied into the child with their results and not run again; only
+        the rest - the failed step, its downstream subgraph and anything
+        that never started - is re-run. Children go through admission
+        control like new executions, so a large replay is fed to the workers
+        at the rate they drain it.
+
+        Returns:
+            list: The new child executions
+        """
+        sources = list(
+            WorkflowExecution.objects
+            .filter(id__in=list(execution_ids), status__in=RESUMABLE_STATUSES, parent_task_execution__isnull=True)
+            # Not again while an earlier resume is in progress or has succeeded
+            .exclude(retries__status__in=['pending', 'running', 'paused', 'completed'])
+            .select_related('workflow')
+        )
+        if not sources:
+            return []
+
+        workflow_ids = {source.workflow_id for source in sources}
+        steps_by_workflow = defaultdict(list)
+        for step in WorkflowStep.objects.filter(workflow_id__in=workflow_ids):
+            steps_by_workflow[step.workflow_id].append(step)
+        edges = list(
+            WorkflowStep.depends_on.through.objects
+            .filter(from_workflowstep__workflow_id__in=workflow_ids)
+            .values_list('from_workflowstep_id', 'to_workflowstep_id')
+        )
+        dependencies = defaultdict(set)
+        for step_id, dependency_id in edges:
+            dependencies[step_id].add(dependency_id)
+        # The graph may have been edited since the source ran
+        invalid = _invalid_workflows(steps_by_workflow, edges)
+        for workflow_id, errors in invalid.items():
+            logger.error(f"Not resuming runs of workflow {workflow_id}: {'; '.join(errors)}")
+        sources = [source for source in sources if source.workflow_id not in invalid]
+        if not sources:
+            return []
+        completed = defaultdict(dict)
+        for task_exe in TaskExecution.objects.filter(
+            workflow_execution__in=sources, status='completed',
+        ).order_by().only('id', 'workflow_execution_id', 'step_id', 'input_data', 'result',
+                          'started_at', 'completed_at', 'retry_count'):
+            completed[task_exe.workflow_execution_id][task_exe.step_id] = task_exe
+
+        start_now = admit(len(sources), reject_when_full)
+        now = timezone.now()
+        children = [
+            WorkflowExecution(
+                workflow=source.workflow,
+                input_data=source.input_data,
+                status='running' if start_now else 'pending',
+                started_at=now if start_now else None,
+                triggered_by=triggered_by or source.triggered_by,
+                trigger_source='retry',
+                parent_execution=source,
+            )
+            for source in sources
+        ]
+
+        task_executions = []
+        ready = []
+        finished = []
+        for source, child in zip(sources, children):
+            dispatch_key = dispatch_key_for(source.workflow)
+            reused = completed[source.id]
+            steps = steps_by_workflow[source.workflow_id]
+            if len(reused) == len(steps):
+                # Nothing left to run (e.g. it failed while finishing up)
+                finished.append(child)
+            for step in steps:
+                previous = reused.get(step.id)
+                if previous is None:
+                    task_exe = TaskExecution(workflow_execution=child, step=step, dispatch_key=dispatch_key)
+                    task_executions.append(task_exe)
+                    # Re-run steps whose dependencies were all reused go out first
+                    if dependencies[step.id] <= reused.keys():
+                        ready.append(task_exe)
+                    continue
+                # ready_at is set so trigger_next_steps never picks the copy up
+                task_executions.append(TaskExecution(
+                    workflow_execution=child, step=step, dispatch_key=dispatch_key,
+                    status='completed', input_data=previous.input_data, result=previous.result,
+                    started_at=previous.started_at, completed_at=previous.completed_at,
+                    retry_count=previous.retry_count, ready_at=now, reused_from=previous,
+                ))
+
+        with transaction.atomic():
+            WorkflowExecution.objects.bulk_create(children)
+            TaskExecution.objects.bulk_create(task_executions, batch_size=1000)
+            index_executions(children)
+            for source, child in zip(sources, children):
+                record_event(child.id, 'execution.started' if start_now else 'execution.held', at=now,
+                             trigger_source='retry', resumed_from=str(source.id))
+            record_many(
+                [(task_exe.workflow_execution_id, task_exe.id) for task_exe in task_executions if task_exe.reused_from_id],
+                'task.reused',
+            )
+            for child in finished:
+                child.mark_as_completed()
+            if start_now:
+                dispatch_task_executions(ready)
+
+        reused_count = sum(len(reused) for reused in completed.values())
+        logger.info(
+            f"Resumed {len(children)} executions: {len(task_executions) - reused_count} steps to run, "
+            f"{reused_count} reused"
+        )
+
+        if not start_now:
+            # The admission feeder dispatches their ready steps later
+            hold_count(len(children) - len(finished))
+        return children
+
+    # ===========================
+    # SUB-WORKFLOWS
+    # ===========================
+
+    def start_sub_workflow(self, task_execution):
+        """
+        Expand a `sub_workflow` step into a child WorkflowExecution
+
+        The child's TaskExecutions are only created here, when the branch is
+        actually reached. Safe to call again on a redelivered message: an
+        existing child is reused.
+
+        Step config:
+            workflow_id: Workflow to run
+            version: Optional version pin; fails if the workflow has moved on
+            input: Optional extra input merged over the parent's input
+        """
+        existing = task_execution.sub_executions.first()
+        if existing:
+            return existing
+
+        config = task_execution.step.config
+        child_workflow = Workflow.objects.filter(id=config.get('workflow_id'), is_active=True).first()
+        if not child_workflow:
+            raise ValueError(f"Sub-workflow {config.get('workflow_id')} not found or inactive")
+        if config.get('version') is not None and child_workflow.version != int(config['version']):
+            raise ValueError(
+                f"Sub-workflow '{child_workflow.name}' is at v{child_workflow.version}, "
+                f"step pins v{config['version']}"
+            )
+
+        parent_execution = task_execution.workflow_execution
+        self._check_recursion(parent_execution, child_workflow)
+
+        # Park the parent step before the child exists: a fast child may finish
+        # (and look for a waiting parent) before this worker returns
+        TaskExecution.objects.filter(id=task_execution.id).update(status='waiting')
+        task_execution.status = 'waiting'
+        record_event(parent_execution.id, 'task.waiting', task_execution.id)
+
+        input_data = {
+            **parent_execution.input_data,
+            **(task_execution.input_data or {}),
+            **config.get('input', {}),
+        }
+        return self.execute(
+            child_workflow.id,
+            input_data,
+            triggered_by=parent_execution.triggered_by,
+            trigger_source=parent_execution.trigger_source,
+            parent_task_execution=task_execution,
+        )
+
+    def on_sub_workflow_finished(self, workflow_execution):
+        """
+        Hand a finished child execution's outcome back to the waiting parent step
+
+        Called whenever an execution is marked completed/failed. Does nothing
+        for top-level executions.
+        """
+        parent_task_id = workflow_execution.parent_task_execution_id
+        if not parent_task_id or workflow_execution.status not in ('completed', 'failed'):
+            return
+
+        # Conditional update so a duplicate notification can't finish the step twice
+        claimed = TaskExecution.objects.filter(id=parent_task_id, status='waiting').update(status='running')
+        if not claimed:
+            return
+
+        parent_task = TaskExecution.objects.select_related('step', 'workflow_execution').get(id=parent_task_id)
+        if workflow_execution.status == 'completed':
+            results = {
+                task.step.name: task.result
+                for task in workflow_execution.task_executions.select_related('step').filter(status='completed')
+            }
+            with transaction.atomic():
+                parent_task.mark_as_completed(result={
+                    'sub_workflow_execution_id': str(workflow_execution.id),
+                    'status': 'completed',
+                    'results': results,
+                })
+                enqueue_next_steps([parent_task.workflow_execution_id])
+        else:
+            error = f"Sub-workflow execution {workflow_execution.id} failed: {workflow_execution.error_message}"
+            parent_task.mark_as_failed(error)
+            parent_execution = parent_task.workflow_execution
+            if parent_execution.mark_as_failed(error_message=error, failed_step=parent_task.step):
+                self.on_sub_workflow_finished(parent_execution)
+
+    def _check_recursion(self, parent_execution, child_workflow):
+        """Refuse to expand a workflow that is already one of its own ancestors"""
+        execution = parent_execution
+        depth = 0
+        while execution is not None:
+            if execution.workflow_id == child_workflow.id:
+                raise ValueError(f"Sub-workflow '{child_workflow.name}' would recurse into itself")
+            depth += 1
+            if depth > MAX_SUB_WORKFLOW_DEPTH:
+                raise ValueError(f"Sub-workflows nested deeper than {MAX_SUB_WORKFLOW_DEPTH} levels")
+            parent_task = execution.parent_task_execution
+            execution = parent_task.workflow_execution if parent_task else None
@@ -0,0 +1,164 @@
+"""
+FlowPilot Transactional Outbox
+
+Celery messages are written to the database with the state change that
+needs them and published from there.
+
+Key Concepts:
+- enqueue() inserts OutboxMessage rows inside the caller's transaction: if
+  the transaction rolls back no message is sent, and once it commits the
+  message can't be lost (a crash right after commit leaves the row behind)
+- Every engine message goes through it: steps (with the runs that create
+  them), trigger_next_steps after a step finishes and map chunks
+- After commit the same process relays the rows it just wrote, so the
+  happy path adds no latency. The periodic relay (relay_outbox task) sweeps
+  up anything left over
+- The relay locks a batch with SKIP LOCKED, publishes it over one broker
+  connection and deletes it in the same transaction. A crash between
+  publish and commit re-sends the batch; execute_workflow_task's claim
+  UPDATE keeps a duplicate message from running a step twice
+- A failed publish pushes the rest of the batch back by
+  OUTBOX_RETRY_SECONDS (doubling per attempt), so a broker outage doesn't
+  turn into a hot loop
+"""
+
+import logging
+from datetime import timedelta
+from typing import Dict, Any, List, Optional
+
+from celery import current_app
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+# Longest a failed message is pushed back
+MAX_RETRY_SECONDS = 300
+
+
+# ===========================
+# WRITING
+# ===========================
+
+def enqueue(messages: List[Dict[str, Any]]) -> List[int]:
+    """
+    Add messages to the outbox and relay them once the transaction commits
+
+    Args:
+        messages: dicts with task_name, args, options and (optionally)
+            task_execution_id
+
+    Returns:
+        list: The new OutboxMessage ids
+    """
+    if not messages:
+        return []
+    with transaction.atomic():
+        rows = OutboxMessage.objects.bulk_create(
+            [OutboxMessage(**message) for message in messages], batch_size=1000,
+        )
+        ids = [row.id for row in rows]
+        transaction.on_commit(lambda: relay_messages(ids))
+    return ids
+
+
+def discard_for_tasks(task_execution_ids) -> int:
+    """Drop unsent messages for steps that won't run (e.g. cancelled)"""
+    deleted, _ = OutboxMessage.objects.filter(task_execution_id__in=task_execution_ids).delete()
+    return deleted
+
+
+# ===========================
+# RELAY
+# ===========================
+
+def _publish(messages: List[OutboxMessage], producer=None) -> List[OutboxMessage]:
+    """Send messages in order; returns the ones sent before the first failure"""
+    sent = []
+    for message in messages:
+        task = current_app.tasks[message.task_name]
+        try:
+            task.apply_async(args=message.args, producer=producer, **message.options)
+        except Exception as exc:
+            _push_back(messages[len(sent):], exc)
+            break
+        sent.append(message)
+    return sent
+
+
+def _push_back(messages: List[OutboxMessage], exc: Exception):
+    now = timezone.now()
+    for message in messages:
+        message.attempts += 1
+        delay = min(settings.OUTBOX_RETRY_SECONDS * 2 ** (message.attempts - 1), MAX_RETRY_SECONDS)
+        message.available_at = now + timedelta(seconds=delay)
+        message.last_error = str(exc)
+    OutboxMessage.objects.bulk_update(messages, ['attempts', 'available_at', 'last_error'])
+    logger.error(f"Outbox publish failed, {len(messages)} messages pushed back: {exc}")
+
+
+def _relay_batch(queryset, batch_size: int) -> int:
+    """Publish and delete one batch; returns the number of messages sent"""
+    if current_app.conf.task_always_eager:
+        # Eager tasks run inside apply_async - don't hold the batch's row
+        # locks (and transaction) open through whole workflow runs
+        with transaction.atomic():
+            messages = list(queryset.select_for_update(skip_locked=True).order_by('id')[:batch_size])
+            OutboxMessage.objects.filter(id__in=[message.id for message in messages]).delete()
+        for message in messages:
+            current_app.tasks[message.task_name].apply_async(args=message.args, **message.options)
+        return len(messages)
+
+    with transaction.atomic():
+        messages = list(queryset.select_for_update(skip_locked=True).order_by('id')[:batch_size])
+        if not messages:
+            return 0
+        # One broker connection for the whole batch
+        with current_app.producer_or_acquire() as producer:
+            sent = _publish(messages, producer)
+        OutboxMessage.objects.filter(id__in=[message.id for message in sent]).delete()
+    return len(sent)
+
+
+def relay_messages(ids: List[int]) -> int:
+    """Publish specific messages (called on commit by enqueue())"""
+    sent = 0
+    batch_size = settings.OUTBOX_RELAY_BATCH
+    for start in range(0, len(ids), batch_size):
+        try:
+            sent += _relay_batch(OutboxMessage.objects.filter(id__in=ids[start:start + batch_size]), batch_size)
+        except Exception as exc:
+            # Still in the outbox; the periodic relay sends it
+            if current_app.conf.task_always_eager:
+                raise
+            logger.error(f"Outbox relay after commit failed: {exc}")
+            break
+    return sent
+
+
+def relay_outbox(batch_size: Optional[int] = None, max_batches: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Publish every due message in the outbox, oldest first
+
+    Returns:
+        dict: Messages sent, batches and what's left waiting
+    """
+    batch_size = batch_size or settings.OUTBOX_RELAY_BATCH
+    summary = {'sent': 0, 'batches': 0}
+
+    while max_batches is None or summary['batches'] < max_batches:
+        sent = _relay_batch(OutboxMessage.objects.filter(available_at__lte=timezone.now()), batch_size)
+        if not sent:
+            break
+        summary['sent'] += sent
+        summary['batches'] += 1
+        if sent < batch_size:
+            break
+
+    summary['waiting'] = OutboxMessage.objects.count()
+    if summary['sent']:
+        logger.info(f"Outbox relay sent {summary['sent']} messages, {summary['waiting']} waiting")
+    return summary
@@ -0,0 +1,242 @@
+"""
+FlowPilot Workflow Import / Export
+
+Compact, versioned serialization of workflows for cloning and migration.
+
+Key Concepts:
+- A blob is a bundle of one or more workflows with their steps and edges
+- Layout: b'FPWF' + format version (1 byte) + codec (b'm' msgpack, b'j' JSON)
+  + zlib-compressed payload. msgpack is used when installed, JSON otherwise;
+  import reads either.
+- Repeated strings (step names, step types) are interned into one table and
+  steps are stored as positional rows; edges are pairs of step indexes
+- Export is two queries for any number of workflows; import is three bulk
+  inserts in a single transaction
+- Secrets in trigger_config (webhook secret, tokens, passwords...) are left
+  out of exports and listed under 'redacted'; a workflow imported without
+  them comes in inactive until they are set again. Clones keep them
+- Anything wrong with a blob - header, compression, codec, shape - is a
+  WorkflowFormatError
+"""
+
+import json
+import uuid
+import zlib
+from collections import defaultdict
+from typing import Dict, Any, List, Optional
+
+from django.db import transaction, IntegrityError, DataError
+
+from .models import Workflow, WorkflowStep
+
+MAGIC = b'FPWF'
+FORMAT_VERSION = 1
+
+WORKFLOW_FIELDS = ['name', 'description', 'trigger_type', 'trigger_config', 'version', 'is_active']
+# Positional layout of one step row; name and step_type are string-table indexes
+STEP_FIELDS = ['name', 'step_type', 'step_order', 'config', 'max_retries',
+               'retry_delay_seconds', 'timeout_seconds', 'condition']
+INTERNED_STEP_FIELDS = {'name', 'step_type'}
+# trigger_config keys containing any of these are secrets
+SECRET_KEY_MARKERS = ('secret', 'token', 'password', 'api_key', 'apikey', 'private_key', 'credential')
+
+
+class WorkflowFormatError(Exception):
+    """The blob isn't a FlowPilot workflow export this version can read"""
+
+
+def _encode(payload: Dict[str, Any]) -> bytes:
+    try:
+        import msgpack
+    except ImportError:
+        return b'j' + zlib.compress(json.dumps(payload, separators=(',', ':')).encode())
+    return b'm' + zlib.compress(msgpack.packb(payload, use_bin_type=True))
+
+
+def _decode(codec: bytes, body: bytes) -> Dict[str, Any]:
+    raw = zlib.decompress(body)
+    if codec == b'j':
+        return json.loads(raw)
+    if codec == b'm':
+        import msgpack
+        return msgpack.unpackb(raw, raw=False, strict_map_key=False)
+    raise WorkflowFormatError(f"Unknown codec {codec!r}")
+
+
+def _redact(config, path: str = ''):
+    """Copy of a config without secret-looking keys, and the dotted paths left out"""
+    if not isinstance(config, dict):
+        return config, []
+    clean, redacted = {}, []
+    for key, value in config.items():
+        key_path = f"{path}{key}"
+        if any(marker in str(key).lower() for marker in SECRET_KEY_MARKERS):
+            redacted.append(key_path)
+            continue
+        clean[key], nested = _redact(value, f"{key_path}.")
+        redacted.extend(nested)
+    return clean, redacted
+
+
+def _export_fields(workflow, include_secrets: bool) -> Dict[str, Any]:
+    fields = {f: getattr(workflow, f) for f in WORKFLOW_FIELDS}
+    if not include_secrets:
+        fields['trigger_config'], redacted = _redact(workflow.trigger_config)
+        if redacted:
+            fields['redacted'] = redacted
+    return fields
+
+
+def export_workflows(workflows, include_secrets: bool = False) -> bytes:
+    """
+    Serialize workflows (a queryset or list) with their steps and edges
+
+    Args:
+        include_secrets: Keep secrets in trigger_config (only for copies
+            that never leave this database, e.g. clones)
+    """
+    workflows = list(workflows)
+    workflow_ids = [workflow.id for workflow in workflows]
+
+    strings: List[str] = []
+    string_index: Dict[str, int] = {}
+
+    def intern(value: str) -> int:
+        if value not in string_index:
+            string_index[value] = len(strings)
+            strings.append(value)
+        return string_index[value]
+
+    steps_by_workflow = defaultdict(list)
+    step_position = {}
+    for step in WorkflowStep.objects.filter(workflow_id__in=workflow_ids).order_by('workflow_id', 'step_order').values('id', 'workflow_id', *STEP_FIELDS):
+        rows = steps_by_workflow[step['workflow_id']]
+        step_position[step['id']] = len(rows)
+        rows.append([intern(step[f]) if f in INTERNED_STEP_FIELDS else step[f] for f in STEP_FIELDS])
+
+    edges_by_workflow = defaultdict(list)
+    edges = (
+        WorkflowStep.depends_on.through.objects
+        .filter(from_workflowstep__workflow_id__in=workflow_ids)
+        .values_list('from_workflowstep__workflow_id', 'from_workflowstep_id', 'to_workflowstep_id')
+    )
+    for workflow_id, step_id, dependency_id in edges:
+        if dependency_id in step_position:
+            edges_by_workflow[workflow_id].append([step_position[step_id], step_position[dependency_id]])
+
+    payload = {
+        'strings': strings,
+        'workflows': [
+            {
+                **_export_fields(workflow, include_secrets),
+                'steps': steps_by_workflow[workflow.id],
+                'edges': edges_by_workflow[workflow.id],
+            }
+            for workflow in workflows
+        ],
+    }
+    return MAGIC + bytes([FORMAT_VERSION]) + _encode(payload)
+
+
+def load_bundle(blob: bytes) -> Dict[str, Any]:
+    """Check the header and decode the payload"""
+    if len(blob) < 6 or blob[:4] != MAGIC:
+        raise WorkflowFormatError("Not a FlowPilot workflow export")
+    if blob[4] > FORMAT_VERSION:
+        raise WorkflowFormatError(f"Export format v{blob[4]} is newer than supported v{FORMAT_VERSION}")
+    try:
+        bundle = _decode(blob[5:6], blob[6:])
+    except WorkflowFormatError:
+        raise
+    except ImportError:
+        raise WorkflowFormatError("This export needs msgpack, which isn't installed")
+    except Exception as exc:
+        # zlib, JSON and msgpack each raise their own errors for a corrupt body
+        raise WorkflowFormatError(f"Corrupt workflow export: {exc}")
+    if not isinstance(bundle, dict):
+        raise WorkflowFormatError("Corrupt workflow export: payload isn't a bundle")
+    return bundle
+
+
+def _index(sequence: List, index) -> Any:
+    """sequence[index] for a reference inside the bundle (no negative indexes)"""
+    if not isinstance(index, int) or not 0 <= index < len(sequence):
+        raise WorkflowFormatError(f"Malformed workflow export: reference {index!r} out of range")
+    return sequence[index]
+
+
+def _build(bundle: Dict[str, Any], created_by, name: Optional[str]):
+    """Unsaved workflows, steps and edges of a bundle"""
+    strings = bundle['strings']
+    if name is not None and len(bundle['workflows']) != 1:
+        raise WorkflowFormatError("A name override needs a single-workflow export")
+
+    workflows, steps, edges = [], [], []
+    Edge = WorkflowStep.depends_on.through
+    for data in bundle['workflows']:
+        workflow = Workflow(
+            id=uuid.uuid4(),
+            created_by=created_by,
+            **{f: data[f] for f in WORKFLOW_FIELDS},
+        )
+        if name is not None:
+            workflow.name = name
+        if data.get('redacted'):
+            # Without its secret a webhook would take unauthenticated calls
+            workflow.is_active = False
+        workflows.append(workflow)
+
+        # Ids are generated here so edges can be built without reading steps back
+        created = []
+        for row in data['steps']:
+            if len(row) != len(STEP_FIELDS):
+                raise WorkflowFormatError(f"Malformed workflow export: step row has {len(row)} fields")
+            values = dict(zip(STEP_FIELDS, row))
+            for f in INTERNED_STEP_FIELDS:
+                values[f] = _index(strings, values[f])
+            created.append(WorkflowStep(id=uuid.uuid4(), workflow_id=workflow.id, **values))
+        steps.extend(created)
+        edges.extend(
+            Edge(from_workflowstep_id=_index(created, step).id, to_workflowstep_id=_index(created, dependency).id)
+            for step, dependency in data['edges']
+        )
+    return workflows, steps, edges
+
+
+@transaction.atomic
+def import_workflows(blob: bytes, created_by=None, name: Optional[str] = None) -> List[Workflow]:
+    """
+    Create new workflows from an export (always new ids - safe to import twice)
+
+    Args:
+        name: Override the name (only for single-workflow bundles, e.g. clones)
+
+    Returns:
+        list: The created workflows
+    """
+    bundle = load_bundle(blob)
+    try:
+        workflows, steps, edges = _build(bundle, created_by, name)
+    except WorkflowFormatError:
+        raise
+    except (KeyError, IndexError, TypeError, ValueError, AttributeError) as exc:
+        raise WorkflowFormatError(f"Malformed workflow export: {exc!r}")
+
+    Edge = WorkflowStep.depends_on.through
+    try:
+        Workflow.objects.bulk_create(workflows)
+        WorkflowStep.objects.bulk_create(steps, batch_size=1000)
+        Edge.objects.bulk_create(edges, batch_size=1000)
+    except (IntegrityError, DataError) as exc:
+        # e.g. two steps with the same step_order; the whole import rolls back
+        raise WorkflowFormatError(f"Invalid workflow export: {exc}")
+    return workflows
+
+
+def clone_workflow(workflow, name: Optional[str] = None, created_by=None) -> Workflow:
+    """Copy a workflow with all its steps and edges"""
+    return import_workflows(
+        export_workflows([workflow], include_secrets=True),
+        created_by=created_by,
+        name=name or f"{workflow.name} (copy)",
+    )[0]
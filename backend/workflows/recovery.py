@@ -0,0 +1,174 @@
+"""
+FlowPilot Worker Failure Recovery
+
+Heartbeats for running steps and a reaper for steps whose worker died.
+
+Key Concepts:
+- While a step runs, a background thread bumps TaskExecution.heartbeat_at
+- A periodic reaper finds 'running' rows whose heartbeat went stale, using
+  the (status, heartbeat_at) index, a batch at a time
+- Stale steps with retries left go back to pending and are re-dispatched;
+  the rest are failed. Either way their workflow is re-evaluated, so it
+  can finish instead of sitting 'running' forever
+- 'waiting' map steps beat while their chunks run; when every chunk died
+  (e.g. killed at the hard time limit) the reaper re-dispatches the
+  unfinished chunks
+"""
+
+import logging
+import threading
+from datetime import timedelta
+from typing import Dict, Any, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .events import record as record_event
+from .models import TaskExecution
+
+logger = logging.getLogger(__name__)
+
+
+class Heartbeat:
+    """
+    Context manager that keeps a running TaskExecution's heartbeat fresh
+
+        with Heartbeat(task_execution.id):
+            result = task_func(...)
+    """
+
+    def __init__(self, task_execution_id, interval: Optional[int] = None, status: str = 'running'):
+        self.task_execution_id = task_execution_id
+        # 'waiting' for map steps, whose chunks run while the step waits
+        self.status = status
+        self.interval = interval or settings.TASK_HEARTBEAT_INTERVAL
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"heartbeat-{task_execution_id}", daemon=True)
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.interval):
+                TaskExecution.objects.filter(id=self.task_execution_id, status=self.status).update(
+                    heartbeat_at=timezone.now()
+                )
+        except Exception as exc:
+            # A missed beat only risks a duplicate run later; never break the step itself
+            logger.warning(f"Heartbeat failed for {self.task_execution_id}: {exc}")
+        finally:
+            # Threads get their own DB connection; don't leak it
+            connection.close()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join(timeout=self.interval)
+        return False
+
+
+def reap_stale_tasks(stale_after: Optional[int] = None, batch_size: int = 500,
+                     max_batches: int = 20) -> Dict[str, Any]:
+    """
+    Recover 'running' steps whose worker stopped heartbeating
+
+    Args:
+        stale_after: Seconds without a heartbeat before a step counts as orphaned
+        batch_size: Rows handled per query
+        max_batches: Upper bound per run so one sweep can't run away
+
+    Returns:
+        dict: Number of steps re-dispatched and failed
+    """
+    from .tasks import dispatch_task_executions, enqueue_next_steps, _notify_parent_execution
+
+    stale_after = stale_after or settings.TASK_HEARTBEAT_TIMEOUT
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+    summary = {'redispatched': 0, 'failed': 0}
+
+    for _ in range(max_batches):
+        stale = list(
+            TaskExecution.objects
+            .filter(status='running', heartbeat_at__lt=cutoff)
+            .select_related('step', 'workflow_execution')
+            .order_by('heartbeat_at')[:batch_size]
+        )
+        if not stale:
+            break
+
+        to_dispatch = []
+        workflow_execution_ids = set()
+        for task_exe in stale:
+            # Match the heartbeat we saw, so a worker that just beat isn't reaped
+            still_stale = TaskExecution.objects.filter(
+                id=task_exe.id, status='running', heartbeat_at=task_exe.heartbeat_at,
+            )
+            if task_exe.retry_count < task_exe.step.max_retries:
+                if still_stale.update(status='pending', retry_count=F('retry_count') + 1, worker_id=''):
+                    to_dispatch.append(task_exe)
+                    record_event(task_exe.workflow_execution_id, 'task.reaped', task_exe.id,
+                                 last_heartbeat=task_exe.heartbeat_at.isoformat())
+            else:
+                error = f"Worker lost: no heartbeat since {task_exe.heartbeat_at.isoformat()}"
+                if still_stale.update(status='failed', completed_at=timezone.now(), error_message=error):
+                    summary['failed'] += 1
+                    record_event(task_exe.workflow_execution_id, 'task.failed', task_exe.id, error=error)
+                    workflow_execution = task_exe.workflow_execution
+                    if workflow_execution.mark_as_failed(
+                        error_message=f"Task '{task_exe.step.name}' failed: {error}",
+                        failed_step=task_exe.step,
+                    ):
+                        _notify_parent_execution(workflow_execution)
+            workflow_execution_ids.add(task_exe.workflow_execution_id)
+
+        with transaction.atomic():
+            dispatch_task_executions(to_dispatch)
+            enqueue_next_steps(workflow_execution_ids)
+        summary['redispatched'] += len(to_dispatch)
+
+        if len(stale) < batch_size:
+            break
+
+    summary['maps'] = _recover_stale_maps(cutoff, batch_size)
+
+    if summary['redispatched'] or summary['failed'] or summary['maps']:
+        logger.warning(f"Reaped stale tasks: {summary}")
+    return summary
+
+
+def _recover_stale_maps(cutoff, batch_size: int) -> int:
+    """
+    Restart 'waiting' map steps none of whose chunks has beaten since cutoff
+
+    A chunk killed at its hard time limit never dispatches its successor, so
+    without this the map step would wait forever.
+
+    Returns:
+        int: Map steps restarted
+    """
+    from .mapping import recover_map
+    from .tasks import dispatch_map_chunks
+
+    recovered = 0
+    stale = (
+        TaskExecution.objects
+        .filter(status='waiting', step__step_type='map', heartbeat_at__lt=cutoff)
+        .select_related('step')
+        .order_by('heartbeat_at')[:batch_size]
+    )
+    for task_exe in stale:
+        # Claim the recovery: bumping the beat keeps a concurrent reaper (and
+        # the next sweep) away while the fresh chunks get going
+        if not TaskExecution.objects.filter(
+            id=task_exe.id, status='waiting', heartbeat_at=task_exe.heartbeat_at,
+        ).update(heartbeat_at=timezone.now()):
+            continue
+        chunks = recover_map(task_exe)
+        dispatch_map_chunks(task_exe.id, task_exe.step, chunks)
+        record_event(task_exe.workflow_execution_id, 'task.map_recovered', task_exe.id,
+                     last_heartbeat=task_exe.heartbeat_at.isoformat(), chunks=chunks)
+        recovered += 1
+    return recovered
@@ -0,0 +1,192 @@
+"""
+FlowPilot CPU Rendering
+
+Vectorized Mandelbrot renderer used by the `render_fractal` step type.
+
+Key Concepts:
+- The escape-time loop runs on whole NumPy arrays instead of one pixel at a time
+- Points that already escaped are dropped from the working set every iteration
+- The image is split into horizontal tiles that can run in a process pool
+- The PNG is written once from a palette image (1 byte per pixel)
+- Step configs are untrusted: output_path is confined to FRACTAL_OUTPUT_DIR and
+  width/height/max_iter are capped by the FRACTAL_MAX_* settings
+"""
+
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Tuple
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Same defaults as the original fractal.py script
+DEFAULT_BOUNDS = (-1.5, 0.5, -1.0, 1.0)  # x_min, x_max, y_min, y_max
+DEFAULT_COLOR = 'F08A5D'
+
+
+def escape_time_tile(width: int, height: int, row_start: int, row_end: int,
+                     max_iter: int, bounds: Tuple[float, float, float, float]) -> np.ndarray:
+    """
+    Compute escape-time iteration counts for rows [row_start, row_end)
+
+    Pixel -> complex plane mapping is identical to the original script:
+    x0 = x_min + px / (width - 1) * (x_max - x_min)
+
+    Returns:
+        np.ndarray: uint16 array of shape (row_end - row_start, width).
+        Points inside the set hold max_iter.
+    """
+    x_min, x_max, y_min, y_max = bounds
+    xs = x_min + (np.arange(width) / (width - 1)) * (x_max - x_min)
+    ys = y_min + (np.arange(row_start, row_end) / (height - 1)) * (y_max - y_min)
+    c = (xs[np.newaxis, :] + 1j * ys[:, np.newaxis]).ravel()
+
+    counts = np.full(c.size, max_iter, dtype=np.uint16)
+    z = np.zeros_like(c)
+    idx = np.arange(c.size)
+
+    for iteration in range(1, max_iter + 1):
+        z = z * z + c
+        escaped = (z.real * z.real + z.imag * z.imag) > 4.0
+        if escaped.any():
+            counts[idx[escaped]] = iteration
+            # Shrink the working set so later iterations only touch live points
+            alive = ~escaped
+            z, c, idx = z[alive], c[alive], idx[alive]
+            if not idx.size:
+                break
+
+    return counts.reshape(row_end - row_start, width)
+
+
+def _render_tile(args):
+    """Process-pool entry point (must be a top-level function to be picklable)"""
+    return escape_time_tile(*args)
+
+
+def split_tiles(height: int, tile_rows: int) -> List[Tuple[int, int]]:
+    """Split the image into horizontal bands of at most tile_rows rows"""
+    return [(start, min(start + tile_rows, height)) for start in range(0, height, tile_rows)]
+
+
+def can_use_process_pool() -> bool:
+    """
+    Daemonic processes (e.g. Celery prefork children) can't spawn children,
+    so tiles are rendered in-process there.
+    """
+    return not multiprocessing.current_process().daemon
+
+
+def render_mandelbrot(width: int, height: int, max_iter: int = 200,
+                      bounds: Tuple[float, float, float, float] = DEFAULT_BOUNDS,
+                      tile_rows: int = 128, workers: int = 1) -> np.ndarray:
+    """
+    Render the full image as an iteration-count array of shape (height, width)
+
+    Args:
+        tile_rows: Rows per tile. Smaller tiles balance better, larger tiles
+            have less per-task overhead.
+        workers: Process pool size. 1 renders serially in this process.
+    """
+    if width < 2 or height < 2:
+        raise ValueError("Fractal needs at least a 2x2 image")
+    if max_iter < 1 or max_iter > np.iinfo(np.uint16).max:
+        raise ValueError("max_iter must be between 1 and 65535")
+
+    tiles = split_tiles(height, tile_rows)
+    jobs = [(width, height, start, end, max_iter, bounds) for start, end in tiles]
+    counts = np.empty((height, width), dtype=np.uint16)
+
+    if workers > 1 and len(tiles) > 1 and can_use_process_pool():
+        with ProcessPoolExecutor(max_workers=min(workers, len(tiles))) as pool:
+            for (start, end), tile in zip(tiles, pool.map(_render_tile, jobs)):
+                counts[start:end] = tile
+    else:
+        for (start, end), job in zip(tiles, jobs):
+            counts[start:end] = escape_time_tile(*job)
+
+    return counts
+
+
+def save_png(counts: np.ndarray, max_iter: int, output_path: str, color: str = DEFAULT_COLOR):
+    """
+    Write the image in one go
+
+    Uses the original colouring: points that never escaped are black,
+    everything else gets `color`. A 2-entry palette image keeps it at
+    1 byte per pixel instead of 3.
+    """
+    from PIL import Image
+
+    rgb = [int(color[i:i + 2], 16) for i in (0, 2, 4)]
+    img = Image.fromarray((counts < max_iter).astype(np.uint8), mode='P')
+    img.putpalette([0, 0, 0] + rgb)
+    img.save(output_path)
+
+
+def resolve_output_path(output_path: str) -> str:
+    """
+    Resolve a step's output_path under FRACTAL_OUTPUT_DIR
+
+    Relative paths are taken from the output directory; absolute paths, `..`
+    and symlinks are fine as long as the result stays inside it.
+    """
+    root = os.path.realpath(settings.FRACTAL_OUTPUT_DIR)
+    path = os.path.realpath(os.path.join(root, output_path))
+    if os.path.commonpath([root, path]) != root or path == root:
+        raise ValueError(f"output_path must be a file inside {settings.FRACTAL_OUTPUT_DIR}: {output_path}")
+    return path
+
+
+def _bounded(config: Dict[str, Any], key: str, default: int, maximum: int) -> int:
+    value = int(config.get(key, default))
+    if value > maximum:
+        raise ValueError(f"{key} must be at most {maximum} (got {value})")
+    return value
+
+
+def render_fractal(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Render a Mandelbrot PNG from a step config
+
+    Config keys (all optional): width, height, max_iter, x_min, x_max,
+    y_min, y_max, tile_rows, workers, color, output_path (relative to
+    FRACTAL_OUTPUT_DIR)
+    """
+    width = _bounded(config, 'width', 400, settings.FRACTAL_MAX_WIDTH)
+    height = _bounded(config, 'height', 400, settings.FRACTAL_MAX_HEIGHT)
+    max_iter = _bounded(config, 'max_iter', 200, settings.FRACTAL_MAX_ITER)
+    bounds = (
+        float(config.get('x_min', DEFAULT_BOUNDS[0])),
+        float(config.get('x_max', DEFAULT_BOUNDS[1])),
+        float(config.get('y_min', DEFAULT_BOUNDS[2])),
+        float(config.get('y_max', DEFAULT_BOUNDS[3])),
+    )
+    tile_rows = int(config.get('tile_rows', 128))
+    # More processes than cores only adds overhead
+    workers = min(int(config.get('workers', multiprocessing.cpu_count())), multiprocessing.cpu_count())
+    output_path = resolve_output_path(config.get('output_path', 'mandelbrot.png'))
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    start = time.perf_counter()
+    counts = render_mandelbrot(width, height, max_iter, bounds, tile_rows, workers)
+    render_ms = (time.perf_counter() - start) * 1000
+    save_png(counts, max_iter, output_path, config.get('color', DEFAULT_COLOR))
+    total_ms = (time.perf_counter() - start) * 1000
+
+    logger.info(f"Rendered {width}x{height} fractal in {total_ms:.0f}ms -> {output_path}")
+
+    return {
+        'image_path': output_path,
+        'width': width,
+        'height': height,
+        'max_iter': max_iter,
+        'tiles': len(split_tiles(height, tile_rows)),
+        'render_ms': round(render_ms, 2),
+        'duration_ms': round(total_ms, 2),
+    }
@@ -0,0 +1,214 @@
+"""
+FlowPilot Execution Retention
+
+Moves old executions out of the hot tables into compressed archive files.
+
+Key Concepts:
+- Only finished executions (completed/failed/cancelled) older than the cutoff are archived
+- Each batch is written as JSONL (one execution + its tasks per line), compressed
+  with zstd when `zstandard` is installed, gzip otherwise
+- Per-workflow/per-day aggregates are folded into ExecutionArchiveStats before rows go
+- Every batch is its own short transaction, so deletes never hold long locks
+- A batch is claimed with SELECT ... FOR UPDATE SKIP LOCKED, so overlapping runs
+  (the daily beat job and a manual call) never archive or count the same rows twice;
+  stats are folded in the transaction that deletes the rows
+- A run's execution events go into its archive line and are deleted with it
+  (its search keys are just deleted; input_data is archived)
+"""
+
+import gzip
+import io
+import json
+import logging
+import os
+from collections import defaultdict
+from datetime import timedelta
+from typing import Dict, Any, List, Optional
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    WorkflowExecution, TaskExecution, ExecutionArchiveStats, ExecutionEvent, ExecutionSnapshot, ExecutionSearchKey,
+)
+
+logger = logging.getLogger(__name__)
+
+ARCHIVABLE_STATUSES = ['completed', 'failed', 'cancelled']
+
+EXECUTION_FIELDS = [
+    'id', 'workflow_id', 'status', 'started_at', 'completed_at', 'input_data',
+    'output_data', 'error_message', 'failed_step_id', 'triggered_by_id',
+    'trigger_source', 'parent_execution_id', 'parent_task_execution_id', 'created_at',
+]
+
+TASK_FIELDS = [
+    'id', 'workflow_execution_id', 'step_id', 'status', 'started_at', 'completed_at',
+    'input_data', 'result', 'error_message', 'error_traceback', 'retry_count',
+    'worker_id', 'celery_task_id', 'created_at',
+]
+
+
+def _open_archive(directory: str, name: str):
+    """Open a compressed archive file, preferring zstd"""
+    os.makedirs(directory, exist_ok=True)
+    try:
+        import zstandard
+    except ImportError:
+        path = os.path.join(directory, f"{name}.jsonl.gz")
+        return path, gzip.open(path, 'wt', encoding='utf-8')
+
+    path = os.path.join(directory, f"{name}.jsonl.zst")
+    raw = open(path, 'wb')
+    stream = zstandard.ZstdCompressor(level=10).stream_writer(raw, closefd=True)
+    return path, io.TextIOWrapper(stream, encoding='utf-8')
+
+
+def _duration_ms(row: Dict[str, Any]) -> int:
+    if not row['started_at'] or not row['completed_at']:
+        return 0
+    return int((row['completed_at'] - row['started_at']).total_seconds() * 1000)
+
+
+def _fold_stats(executions: List[Dict[str, Any]], tasks_by_execution: Dict[Any, List[Dict[str, Any]]]):
+    """Add a batch of executions to the per-workflow/per-day aggregates"""
+    totals = defaultdict(lambda: defaultdict(int))
+    for execution in executions:
+        bucket = totals[(execution['workflow_id'], execution['created_at'].date())]
+        tasks = tasks_by_execution.get(execution['id'], [])
+        bucket['total_executions'] += 1
+        bucket[f"{execution['status']}_executions"] += 1
+        bucket['total_tasks'] += len(tasks)
+        bucket['failed_tasks'] += sum(1 for t in tasks if t['status'] in ('failed', 'timed_out'))
+        bucket['total_retries'] += sum(t['retry_count'] for t in tasks)
+        bucket['total_duration_ms'] += _duration_ms(execution)
+
+    existing = {
+        (stats.workflow_id, stats.day): stats
+        for stats in ExecutionArchiveStats.objects.select_for_update().filter(
+            workflow_id__in={key[0] for key in totals},
+            day__in={key[1] for key in totals},
+        )
+    }
+    fields = ExecutionArchiveStats.COUNTER_FIELDS
+    to_create, to_update = [], []
+    for (workflow_id, day), values in totals.items():
+        stats = existing.get((workflow_id, day))
+        if stats is None:
+            to_create.append(ExecutionArchiveStats(workflow_id=workflow_id, day=day, **{f: values[f] for f in fields}))
+        else:
+            for f in fields:
+                setattr(stats, f, getattr(stats, f) + values[f])
+            to_update.append(stats)
+
+    ExecutionArchiveStats.objects.bulk_create(to_create)
+    ExecutionArchiveStats.objects.bulk_update(to_update, fields)
+
+
+def _archive_batch(cutoff, batch_size: int, archive_dir: str, number: int):
+    """
+    Claim, archive and delete one batch of executions
+
+    Returns:
+        tuple: (archive path, executions archived, tasks deleted)
+    """
+    path = None
+    try:
+        with transaction.atomic():
+            # Claim the batch: a concurrent run (beat + a manual call) skips these
+            # rows instead of writing and counting them a second time
+            executions = list(
+                WorkflowExecution.objects
+                .select_for_update(skip_locked=True)
+                .filter(created_at__lt=cutoff, status__in=ARCHIVABLE_STATUSES)
+                .order_by('created_at')
+                .values(*EXECUTION_FIELDS)[:batch_size]
+            )
+            if not executions:
+                return None, 0, 0
+            ids = [execution['id'] for execution in executions]
+
+            tasks_by_execution = defaultdict(list)
+            for task in TaskExecution.objects.filter(workflow_execution_id__in=ids).order_by().values(*TASK_FIELDS):
+                tasks_by_execution[task['workflow_execution_id']].append(task)
+            events_by_execution = defaultdict(list)
+            for event in (
+                ExecutionEvent.objects.filter(workflow_execution_id__in=ids)
+                .order_by('at', 'id').values('workflow_execution_id', 'task_execution_id', 'event', 'at', 'data')
+            ):
+                events_by_execution[event.pop('workflow_execution_id')].append(event)
+
+            # Write the archive before deleting anything, so a crash never loses rows
+            name = f"executions-{timezone.now():%Y%m%dT%H%M%S%f}-{number:05d}"
+            path, archive = _open_archive(archive_dir, name)
+            with archive:
+                for execution in executions:
+                    execution['tasks'] = tasks_by_execution.get(execution['id'], [])
+                    execution['events'] = events_by_execution.get(execution['id'], [])
+                    archive.write(json.dumps(execution, cls=DjangoJSONEncoder) + '\n')
+
+            # Child rows first, so deleting the executions doesn't have to cascade
+            ExecutionEvent.objects.filter(workflow_execution_id__in=ids).delete()
+            ExecutionSnapshot.objects.filter(workflow_execution_id__in=ids).delete()
+            ExecutionSearchKey.objects.filter(workflow_execution_id__in=ids).delete()
+            deleted_tasks, _ = TaskExecution.objects.filter(workflow_execution_id__in=ids).delete()
+            WorkflowExecution.objects.filter(id__in=ids).delete()
+            # The claimed rows are exactly the ones deleted here, so nothing is counted twice
+            _fold_stats(executions, tasks_by_execution)
+    except BaseException:
+        # The rows are still there (rolled back); don't leave a second copy of them on disk
+        if path and os.path.exists(path):
+            os.remove(path)
+        raise
+
+    return path, len(executions), deleted_tasks
+
+
+def archive_executions(older_than_days: Optional[int] = None, batch_size: Optional[int] = None,
+                       archive_dir: Optional[str] = None, max_batches: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Archive and delete finished executions older than the retention window
+
+    Args:
+        older_than_days: Retention window (defaults to EXECUTION_RETENTION_DAYS)
+        batch_size: Executions per archive file / delete transaction
+        archive_dir: Where archive files are written
+        max_batches: Stop after this many batches (None = until nothing is left)
+
+    Returns:
+        dict: Number of archived executions/tasks and the files written
+    """
+    older_than_days = older_than_days if older_than_days is not None else settings.EXECUTION_RETENTION_DAYS
+    batch_size = batch_size or settings.EXECUTION_RETENTION_BATCH_SIZE
+    archive_dir = archive_dir or settings.EXECUTION_ARCHIVE_DIR
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+
+    summary = {'executions': 0, 'tasks': 0, 'files': [], 'cutoff': cutoff.isoformat()}
+    batches = 0
+
+    while max_batches is None or batches < max_batches:
+        path, archived, deleted_tasks = _archive_batch(cutoff, batch_size, archive_dir, batches)
+        if not archived:
+            break
+        summary['executions'] += archived
+        summary['tasks'] += deleted_tasks
+        summary['files'].append(path)
+        batches += 1
+        logger.info(f"Archived {archived} executions to {path}")
+
+    return summary
+
+
+def read_archive(path: str):
+    """Iterate the executions stored in an archive file (for restores and audits)"""
+    if path.endswith('.zst'):
+        import zstandard
+        raw = open(path, 'rb')
+        lines = io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True), encoding='utf-8')
+    else:
+        lines = gzip.open(path, 'rt', encoding='utf-8')
+    with lines:
+        for line in lines:
+            yield json.loads(line)
@@ -0,0 +1,286 @@
+"""
+FlowPilot Scheduler
+
+Fires workflows with trigger_type='schedule' from cron expressions.
+
+Key Concepts:
+- Every active scheduled workflow sits in a min-heap keyed by its next fire time
+- The loop sleeps until the earliest fire time (or the next housekeeping
+  tick) instead of polling the database every second
+- Everything due at the same moment is launched with one bulk insert
+- Schedules are reloaded only when the cheap (count, max updated_at)
+  signature of scheduled workflows changes; unchanged schedules keep their
+  pending fire time across a reload
+- Only the holder of the SchedulerLease row fires; the row is taken under
+  SELECT ... FOR UPDATE, so two schedulers never double-fire
+
+trigger_config:
+    cron: Five-field cron expression ("*/5 * * * *") or @hourly/@daily/...
+    timezone: IANA zone the expression is evaluated in (default TIME_ZONE)
+    input: Input data for every scheduled run (optional)
+
+Run with: python manage.py run_scheduler
+"""
+
+import heapq
+import logging
+import os
+import socket
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, Any, List, Optional
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .events import flush_events
+from .models import Workflow, SchedulerLease
+
+logger = logging.getLogger(__name__)
+
+CRON_MACROS = {
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+    '@monthly': '0 0 1 * *',
+    '@weekly': '0 0 * * 0',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@hourly': '0 * * * *',
+}
+
+# (min, max) for minute, hour, day of month, month, day of week (0 = Sunday, 7 also Sunday)
+CRON_FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+
+class CronExpression:
+    """
+    Minimal five-field cron expression
+
+    Supports *, lists (1,15), ranges (1-5), steps (*/10, 8-18/2). When both
+    day-of-month and day-of-week are restricted, either may match (like cron).
+    """
+
+    def __init__(self, expression: str, tz=None):
+        self.expression = expression
+        self.tz = tz or ZoneInfo(settings.TIME_ZONE)
+        fields = CRON_MACROS.get(expression.strip(), expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields, got {expression!r}")
+
+        parsed = [self._parse_field(field, low, high) for field, (low, high) in zip(fields, CRON_FIELD_RANGES)]
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        self.weekdays = {day % 7 for day in weekdays}
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    @staticmethod
+    def _parse_field(field: str, low: int, high: int) -> set:
+        values = set()
+        for part in field.split(','):
+            step = 1
+            if '/' in part:
+                part, step_text = part.split('/', 1)
+                step = int(step_text)
+                if step < 1:
+                    raise ValueError(f"Invalid cron step in {field!r}")
+            if part == '*':
+                start, end = low, high
+            elif '-' in part:
+                start, end = (int(value) for value in part.split('-', 1))
+            else:
+                start = end = int(part)
+            if start < low or end > high or start > end:
+                raise ValueError(f"Cron field {field!r} out of range {low}-{high}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, day: datetime) -> bool:
+        in_month = day.day in self.days
+        # isoweekday: Monday=1..Sunday=7 -> cron Sunday=0
+        in_week = day.isoweekday() % 7 in self.weekdays
+        if self.any_day and self.any_weekday:
+            return True
+        if self.any_day:
+            return in_week
+        if self.any_weekday:
+            return in_month
+        return in_month or in_week
+
+    def next_after(self, moment: datetime) -> datetime:
+        """
+        First fire time strictly after `moment` (returned timezone-aware)
+
+        Wall times skipped by a DST change run at the same instant an hour
+        later (02:30 -> 03:30); wall times repeated by one run once, at the
+        first occurrence.
+        """
+        # Through UTC: astimezone() into the zone a datetime already has is a
+        # no-op, and would leave a skipped wall time (02:00) as it is
+        local = moment.astimezone(dt_timezone.utc).astimezone(self.tz)
+        local = local.replace(tzinfo=None, second=0, microsecond=0) + timedelta(minutes=1)
+        limit = local + timedelta(days=366 * 5)
+
+        while local < limit:
+            if local.month not in self.months:
+                # Jump to the first day of the next month
+                local = (local.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0)
+                continue
+            if not self._day_matches(local):
+                local = (local + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if local.hour not in self.hours:
+                local = (local + timedelta(hours=1)).replace(minute=0)
+                continue
+            if local.minute not in self.minutes:
+                local += timedelta(minutes=1)
+                continue
+            # Normalized, so a skipped wall time comes back as the real one
+            return local.replace(tzinfo=self.tz).astimezone(dt_timezone.utc).astimezone(self.tz)
+
+        raise ValueError(f"Cron expression {self.expression!r} never fires")
+
+
+class Scheduler:
+    """
+    Long-running scheduler loop
+
+    Keeps one heap entry per scheduled workflow: (fire_timestamp, workflow_id).
+    """
+
+    def __init__(self, name: str = 'default', reload_interval: Optional[float] = None,
+                 lease_seconds: Optional[int] = None):
+        self.name = name
+        self.holder = f"{socket.gethostname()}:{os.getpid()}"
+        self.reload_interval = reload_interval or settings.SCHEDULER_RELOAD_INTERVAL
+        self.lease_seconds = lease_seconds or settings.SCHEDULER_LEASE_SECONDS
+        self.heap: List[tuple] = []
+        self.schedules: Dict[str, Dict[str, Any]] = {}
+        self.signature = None
+        self.is_leader = False
+        self._stop = threading.Event()
+
+    # ---- leadership ----
+
+    def acquire_lease(self) -> bool:
+        return SchedulerLease.acquire(self.name, self.holder, self.lease_seconds)
+
+    def release_lease(self):
+        SchedulerLease.release(self.name, self.holder)
+
+    # ---- schedules ----
+
+    def _scheduled_workflows(self):
+        return Workflow.objects.filter(trigger_type='schedule', is_active=True)
+
+    def current_signature(self):
+        """One cheap aggregate instead of re-reading every schedule"""
+        # Inactive rows count too: deactivating a workflow bumps updated_at
+        aggregate = Workflow.objects.filter(trigger_type='schedule').aggregate(
+            count=Count('id'), latest=Max('updated_at'),
+        )
+        return aggregate['count'], aggregate['latest']
+
+    def load(self, now: Optional[datetime] = None):
+        """
+        (Re)build the heap from the database
+
+        Schedules whose cron and timezone didn't change keep their pending
+        fire time, so a reload on the tick they are due doesn't skip them;
+        new and changed ones fire from `now` on.
+        """
+        now = now or timezone.now()
+        pending = {workflow_id: fire_ts for fire_ts, workflow_id in self.heap}
+        previous = self.schedules
+        self.schedules = {}
+        self.heap = []
+        for workflow_id, config in self._scheduled_workflows().values_list('id', 'trigger_config'):
+            workflow_id = str(workflow_id)
+            try:
+                tz = ZoneInfo(config['timezone']) if config.get('timezone') else None
+                cron = CronExpression(config['cron'], tz)
+            except Exception as exc:
+                logger.error(f"Skipping schedule for workflow {workflow_id}: {exc}")
+                continue
+            self.schedules[workflow_id] = {'cron': cron, 'input': config.get('input', {})}
+            old = previous.get(workflow_id)
+            if old and workflow_id in pending and (old['cron'].expression, old['cron'].tz) == (cron.expression, cron.tz):
+                fire_ts = pending[workflow_id]
+            else:
+                fire_ts = cron.next_after(now).timestamp()
+            self.heap.append((fire_ts, workflow_id))
+        heapq.heapify(self.heap)
+        self.signature = self.current_signature()
+        logger.info(f"Scheduler loaded {len(self.heap)} schedules")
+
+    def pop_due(self, now: datetime) -> List[tuple]:
+        """Pop everything due at `now` and push each entry's next fire time"""
+        due = []
+        now_ts = now.timestamp()
+        while self.heap and self.heap[0][0] <= now_ts:
+            fire_ts, workflow_id = heapq.heappop(self.heap)
+            schedule = self.schedules[workflow_id]
+            due.append((workflow_id, schedule['input']))
+            fire_at = datetime.fromtimestamp(fire_ts, tz=schedule['cron'].tz)
+            heapq.heappush(self.heap, (schedule['cron'].next_after(max(fire_at, now)).timestamp(), workflow_id))
+        return due
+
+    def fire(self, due: List[tuple]):
+        """Launch all due runs with a single bulk insert"""
+        from .orchestrator import Orchestrator
+
+        executions = Orchestrator().execute_many(due, trigger_source='schedule')
+        logger.info(f"Scheduler fired {len(executions)} workflows")
+        return executions
+
+    # ---- loop ----
+
+    def tick(self) -> float:
+        """
+        One pass of the loop
+
+        Returns:
+            float: Seconds to sleep before the next pass
+        """
+        close_old_connections()
+        self.is_leader = self.acquire_lease()
+        if not self.is_leader:
+            self.heap = []
+            self.signature = None
+            return self.lease_seconds / 2
+
+        now = timezone.now()
+        if self.signature is None or self.current_signature() != self.signature:
+            self.load(now)
+
+        due = self.pop_due(now)
+        if due:
+            self.fire(due)
+
+        # Wake for the next fire, or in time to renew the lease / look for changes
+        wake_in = min(self.reload_interval, self.lease_seconds / 3)
+        if self.heap:
+            wake_in = min(wake_in, self.heap[0][0] - timezone.now().timestamp())
+        return max(wake_in, 0)
+
+    def run_forever(self):
+        logger.info(f"Scheduler {self.holder} starting")
+        try:
+            while not self._stop.is_set():
+                try:
+                    sleep_for = self.tick()
+                except Exception as exc:
+                    logger.exception(f"Scheduler tick failed: {exc}")
+                    sleep_for = 5
+                # Don't let this pass's events wait out a long sleep
+                flush_events()
+                self._stop.wait(sleep_for)
+        finally:
+            flush_events()
+            if self.is_leader:
+                self.release_lease()
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,182 @@
+"""
+FlowPilot Execution Search
+
+Find executions by declared fields of their input.
+
+Key Concepts:
+- A workflow declares searchable input fields in
+  trigger_config.search_keys; dotted names reach into nested objects
+  ("patient.phone")
+- index_executions() copies those values into ExecutionSearchKey rows in
+  the same transaction that creates the executions (execute_many,
+  resume_many), so a run is searchable as soon as it exists
+- search() only reads the (key, value, created_at) /
+  (workflow, key, value, created_at) indexes and then fetches executions by
+  primary key - it never looks inside input_data, so a lookup costs the
+  same at 1K or 500M executions
+- Values are matched exactly as strings (numbers and booleans via str());
+  lists, objects and missing fields aren't indexed
+- Only keys a workflow declares right now are searched: rows left from a
+  key since removed from search_keys are ignored, and backfill() deletes
+  them. backfill() also indexes runs created before a key was declared
+"""
+
+import logging
+from typing import Dict, Any, List, Optional
+
+from django.db import transaction
+
+from .models import ExecutionSearchKey, Workflow, WorkflowExecution
+
+logger = logging.getLogger(__name__)
+
+MAX_SEARCH_KEYS = 10
+MAX_KEY_LENGTH = 100
+MAX_VALUE_LENGTH = 255
+
+
+class SearchKeyError(ValueError):
+    """Invalid trigger_config.search_keys"""
+
+
+# ===========================
+# DECLARING
+# ===========================
+
+def validate_search_keys(search_keys) -> List[str]:
+    """
+    Check a workflow's trigger_config.search_keys
+
+    Returns:
+        list: The keys
+    """
+    if not isinstance(search_keys, list) or not all(isinstance(key, str) and key for key in search_keys):
+        raise SearchKeyError("search_keys must be a list of input field names")
+    if len(search_keys) > MAX_SEARCH_KEYS:
+        raise SearchKeyError(f"At most {MAX_SEARCH_KEYS} search_keys per workflow")
+    too_long = [key for key in search_keys if len(key) > MAX_KEY_LENGTH]
+    if too_long:
+        raise SearchKeyError(f"search_keys longer than {MAX_KEY_LENGTH} characters: {too_long}")
+    return search_keys
+
+
+def search_keys_for(workflow) -> List[str]:
+    """The input fields a workflow's executions are searchable by"""
+    search_keys = (workflow.trigger_config or {}).get('search_keys') or []
+    # Imported workflows skip the serializer's validation
+    if not isinstance(search_keys, list):
+        return []
+    return [key for key in search_keys[:MAX_SEARCH_KEYS] if isinstance(key, str) and 0 < len(key) <= MAX_KEY_LENGTH]
+
+
+def _lookup(input_data: Dict[str, Any], key: str):
+    value = input_data
+    for part in key.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    if value is None or isinstance(value, (dict, list)):
+        return None
+    return str(value).strip()[:MAX_VALUE_LENGTH] or None
+
+
+def extract(workflow, input_data) -> List[tuple]:
+    """(key, value) pairs of an execution's declared search keys"""
+    if not isinstance(input_data, dict):
+        return []
+    pairs = []
+    for key in search_keys_for(workflow):
+        value = _lookup(input_data, key)
+        if value is not None:
+            pairs.append((key, value))
+    return pairs
+
+
+# ===========================
+# INDEXING
+# ===========================
+
+def index_executions(executions) -> int:
+    """
+    Write the search keys of new executions
+
+    Call inside the transaction that creates them. Executions need their
+    workflow loaded (the caller already has it) and created_at set.
+
+    Returns:
+        int: Rows written
+    """
+    rows = [
+        ExecutionSearchKey(
+            workflow_execution_id=execution.id,
+            workflow_id=execution.workflow_id,
+            key=key,
+            value=value,
+            created_at=execution.created_at,
+        )
+        for execution in executions
+        for key, value in extract(execution.workflow, execution.input_data)
+    ]
+    ExecutionSearchKey.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def backfill(workflow, batch_size: int = 1000, max_batches: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Re-index a workflow's existing executions (after changing search_keys)
+
+    Rows of keys no longer declared are deleted. Walks the executions by primary key; each batch replaces its rows in
+    one transaction, so it can be stopped and re-run at any point.
+
+    Returns:
+        dict: Executions visited and rows written
+    """
+    summary = {'executions': 0, 'keys': 0}
+    last_id, batches = None, 0
+    while max_batches is None or batches < max_batches:
+        queryset = WorkflowExecution.objects.filter(workflow=workflow).order_by('id')
+        if last_id is not None:
+            queryset = queryset.filter(id__gt=last_id)
+        executions = list(queryset.only('id', 'workflow_id', 'input_data', 'created_at')[:batch_size])
+        if not executions:
+            break
+        for execution in executions:
+            execution.workflow = workflow
+        with transaction.atomic():
+            ExecutionSearchKey.objects.filter(
+                workflow_execution_id__in=[execution.id for execution in executions]
+            ).delete()
+            summary['keys'] += index_executions(executions)
+        summary['executions'] += len(executions)
+        last_id = executions[-1].id
+        batches += 1
+
+    logger.info(f"Indexed {summary['keys']} search keys of {summary['executions']} executions of {workflow.id}")
+    return summary
+
+
+# ===========================
+# SEARCHING
+# ===========================
+
+def search(key: str, value, workflow_id=None, limit: int = 50) -> List[WorkflowExecution]:
+    """
+    Executions whose declared input field `key` equals `value`, newest first
+
+    Args:
+        workflow_id: Only this workflow's executions
+    """
+    workflows = Workflow.objects.only('id', 'trigger_config')
+    if workflow_id:
+        workflows = workflows.filter(id=workflow_id)
+    # Workflows declaring the key now; rows from a key since removed don't match
+    workflow_ids = [workflow.id for workflow in workflows.iterator() if key in search_keys_for(workflow)]
+    if not workflow_ids:
+        return []
+    queryset = ExecutionSearchKey.objects.filter(
+        key=key, value=str(value).strip()[:MAX_VALUE_LENGTH], workflow_id__in=workflow_ids,
+    )
+    execution_ids = list(queryset.order_by('-created_at').values_list('workflow_execution_id', flat=True)[:limit])
+    executions = WorkflowExecution.objects.in_bulk(execution_ids)
+    # Rows whose execution was just archived are skipped
+    return [executions[execution_id] for execution_id in execution_ids if execution_id in executions]
@@ -1,7 +1,21 @@
 from rest_framework import serializers
-from .models import Workflow
+from .models import Workflow, WorkflowExecution
+from .search import validate_search_keys, SearchKeyError
 
 class WorkflowSerializer(serializers.ModelSerializer):
     class Meta:
         model = Workflow
         fields = "__all__"
+
+    def validate_trigger_config(self, value):
+        if 'search_keys' in value:
+            try:
+                validate_search_keys(value['search_keys'])
+            except SearchKeyError as exc:
+                raise serializers.ValidationError(str(exc))
+        return value
+
+class WorkflowExecutionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = WorkflowExecution
+        fields = "__all__"
@@ -9,16 +9,29 @@ Key Concepts:
 - Tasks receive configuration and return results
 - Tasks handle their own errors and retries
 - Tasks are stateless (no side effects between calls)
+- Integration step types live in workflows/integrations and are imported
+  on first use, keeping worker startup light
 """
 
 import logging
-import time
 import traceback
-from typing import Dict, Any, Optional
+import uuid
+from importlib.metadata import entry_points
+from typing import Optional
 
 from celery import shared_task
+from celery.exceptions import SoftTimeLimitExceeded
+from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
+from django.utils.module_loading import import_string
 
+from .circuit import CircuitOpen
+from .control import get_execution_state
+from .events import record as record_event, record_many
+from .memo import run_memoized, StepInFlight
+from .outbox import enqueue as enqueue_messages
+from .recovery import Heartbeat
 from .models import TaskExecution, WorkflowExecution
 
 # Configure logging
@@ -32,32 +45,166 @@ class TaskRegistry:
     """
     Central registry for all workflow tasks
     
-    This allows dynamic task discovery and execution
+    This allows dynamic task discovery and execution. Step types come from:
+    - @register on functions in this module (engine-level control steps)
+    - register_lazy('type', 'dotted.path.to.func'): imported on first use
+    - settings.WORKFLOW_STEP_TYPES and the 'flowpilot.step_types' entry point
+      group, both read only when a step type isn't otherwise known
     """
     _tasks = {}
+    _control_tasks = set()
+    _lazy_tasks = {}
+    _declared_loaded = False
     
     @classmethod
-    def register(cls, task_type: str):
-        """Decorator to register a task function"""
+    def register(cls, task_type: str, control: bool = False):
+        """
+        Decorator to register a task function
+        
+        control=True marks engine-level steps (e.g. sub_workflow). They get the
+        TaskExecution instead of its input and may return STEP_DEFERRED when
+        the step finishes later.
+        """
         def decorator(func):
             cls._tasks[task_type] = func
-            logger.info(f"Registered task: {task_type}")
+            if control:
+                cls._control_tasks.add(task_type)
+            logger.debug(f"Registered task: {task_type}")
             return func
         return decorator
     
+    @classmethod
+    def register_lazy(cls, task_type: str, path: str, control: bool = False):
+        """Declare a step type by dotted path; the module is imported the first time it runs"""
+        cls._lazy_tasks[task_type] = path
+        if control:
+            cls._control_tasks.add(task_type)
+        logger.debug(f"Declared task: {task_type} -> {path}")
+    
+    @classmethod
+    def _load_declared(cls):
+        """Pick up step types declared in settings and by installed packages (once)"""
+        if cls._declared_loaded:
+            return
+        cls._declared_loaded = True
+        for task_type, path in getattr(settings, 'WORKFLOW_STEP_TYPES', {}).items():
+            cls._lazy_tasks.setdefault(task_type, path)
+        for entry_point in entry_points(group='flowpilot.step_types'):
+            # Entry points use "module:attr"
+            cls._lazy_tasks.setdefault(entry_point.name, entry_point.value.replace(':', '.'))
+    
     @classmethod
     def get_task(cls, task_type: str):
-        """Get a task function by type"""
-        return cls._tasks.get(task_type)
+        """Get a task function by type, importing a lazily declared one on first use"""
+        func = cls._tasks.get(task_type)
+        if func is not None:
+            return func
+        if task_type not in cls._lazy_tasks:
+            cls._load_declared()
+        path = cls._lazy_tasks.get(task_type)
+        if path is None:
+            return None
+        try:
+            func = import_string(path)
+        except ImportError as exc:
+            # Not cached: the next step of this type tries again (e.g. after a deploy)
+            raise ImportError(f"Step type '{task_type}' is declared as '{path}', which can't be imported: {exc}") from exc
+        cls._tasks[task_type] = func
+        logger.debug(f"Loaded task: {task_type} from {path}")
+        return func
+    
+    @classmethod
+    def is_control_task(cls, task_type: str) -> bool:
+        """Whether the task type is an engine-level control step"""
+        return task_type in cls._control_tasks
     
     @classmethod
     def list_tasks(cls):
-        """List all registered tasks"""
-        return list(cls._tasks.keys())
+        """List all registered tasks (without importing lazy ones)"""
+        cls._load_declared()
+        return sorted(set(cls._tasks) | set(cls._lazy_tasks))
 
 # Global task registry instance
 task_registry = TaskRegistry()
 
+# Returned by control steps that complete asynchronously (e.g. when a child
+# execution finishes). The TaskExecution stays 'waiting' until then.
+STEP_DEFERRED = object()
+
+# ===========================
+# DISPATCH
+# ===========================
+
+def dispatch_task_executions(task_executions):
+    """
+    Send TaskExecutions to the workers
+    
+    Steps are stamped ready_at first, so a later trigger_next_steps doesn't
+    queue them a second time. With FAIR_SHARE_ENABLED they then wait in
+    their owner's virtual queue for the fair-share dispatcher; otherwise
+    they go to the broker right away.
+    """
+    task_executions = list(task_executions)
+    if not task_executions:
+        return
+    now = timezone.now()
+    for task_exe in task_executions:
+        task_exe.ready_at = now
+        task_exe.dispatched_at = None
+    if settings.FAIR_SHARE_ENABLED:
+        TaskExecution.objects.bulk_update(task_executions, ['ready_at', 'dispatched_at'])
+        return
+    publish_task_executions(task_executions)
+
+def step_time_limits(step):
+    """
+    Celery (soft_time_limit, time_limit) for a step
+    
+    The soft limit is the step's timeout_seconds: the worker raises
+    SoftTimeLimitExceeded inside the step and execute_workflow_task records
+    it as timed_out. The hard limit, STEP_TIMEOUT_GRACE_SECONDS later, kills
+    a step that ignores the soft one; the reaper then recovers the row.
+    """
+    soft = max(step.timeout_seconds, 1)
+    return soft, soft + settings.STEP_TIMEOUT_GRACE_SECONDS
+
+def publish_task_executions(task_executions):
+    """
+    Hand TaskExecutions to the broker
+    
+    Celery task ids are generated up front and stored on the rows, so queued
+    messages can be revoked in bulk when an execution is cancelled. The
+    messages go into the outbox in the same transaction as the rows' update
+    and are published once it commits (see outbox.py), with time limits
+    taken from the step (see step_time_limits).
+    """
+    task_executions = list(task_executions)
+    if not task_executions:
+        return
+    now = timezone.now()
+    for task_exe in task_executions:
+        task_exe.celery_task_id = str(uuid.uuid4())
+        task_exe.dispatched_at = now
+    messages = []
+    for task_exe in task_executions:
+        soft_time_limit, time_limit = step_time_limits(task_exe.step)
+        messages.append({
+            'task_name': execute_workflow_task.name,
+            'args': [str(task_exe.id)],
+            'options': {
+                'task_id': task_exe.celery_task_id,
+                'soft_time_limit': soft_time_limit,
+                'time_limit': time_limit,
+            },
+            'task_execution_id': task_exe.id,
+        })
+    with transaction.atomic():
+        TaskExecution.objects.bulk_update(task_executions, ['celery_task_id', 'ready_at', 'dispatched_at'])
+        enqueue_messages(messages)
+        record_many(
+            [(task_exe.workflow_execution_id, task_exe.id) for task_exe in task_executions], 'task.dispatched', at=now,
+        )
+
 # ===========================
 # CORE EXECUTION TASK
 # ===========================
@@ -74,40 +221,105 @@ def execute_workflow_task(self, task_execution_id: str):
         task_execution_id: UUID of the TaskExecution to run
         
     Returns:
-        dict: Task result or error information
+        dict: Task execution id and outcome (the step result is stored on the TaskExecution)
     """
     
     task_execution = None
     
     try:
         # Get the task execution record
-        task_execution = TaskExecution.objects.get(id=task_execution_id)
+        task_execution = TaskExecution.objects.select_related('step', 'workflow_execution').get(id=task_execution_id)
         step = task_execution.step
         
+        # Cancelled / paused executions don't start new steps (cached check, no DB hit)
+        state = get_execution_state(task_execution.workflow_execution_id)
+        if state == 'cancelled':
+            TaskExecution.objects.filter(id=task_execution_id, status__in=['pending', 'retrying']).update(
+                status='cancelled', completed_at=timezone.now()
+            )
+            logger.info(f"Skipping task of cancelled execution: {task_execution_id}")
+            return {'task_execution_id': str(task_execution_id), 'status': 'cancelled'}
+        if state == 'paused':
+            # Left pending and un-queued; unpausing the execution dispatches it again
+            TaskExecution.objects.filter(id=task_execution_id, status__in=['pending', 'retrying']).update(
+                status='pending', ready_at=None, dispatched_at=None,
+            )
+            logger.info(f"Holding task of paused execution: {task_execution_id}")
+            return {'task_execution_id': str(task_execution_id), 'status': 'paused'}
+        
         logger.info(f"Starting task execution: {task_execution_id} ({step.step_type})")
         
-        # Mark task as started
-        task_execution.mark_as_started(worker_id=self.request.id)
+        # Mark task as started - a redelivered or duplicate message finds it already claimed
+        if not task_execution.mark_as_started(worker_id=self.request.id):
+            logger.info(f"Skipping already claimed task execution: {task_execution_id}")
+            return {'task_execution_id': str(task_execution_id), 'status': 'already_claimed'}
         
         # Get the task function
         task_func = task_registry.get_task(step.step_type)
         if not task_func:
             raise ValueError(f"Unknown task type: {step.step_type}")
         
-        ### Execute the actual task function
-        result = task_func(task_execution.input_data)
+        ### Execute the actual task function (heartbeating so the reaper knows we're alive)
+        with Heartbeat(task_execution.id):
+            if task_registry.is_control_task(step.step_type):
+                result = task_func(task_execution)
+            else:
+                # Steps with an idempotency_key reuse a stored result for the same input
+                result, _ = run_memoized(step, task_execution.get_input_data(), task_func)
+        
+        if result is STEP_DEFERRED:
+            logger.info(f"Task execution waiting on child work: {task_execution_id}")
+            return {'task_execution_id': str(task_execution_id), 'status': 'waiting'}
         
-        # Mark task as completed
-        task_execution.mark_as_completed(result=result)
+        # Mark task as completed and queue the next steps in the same transaction
+        with transaction.atomic():
+            task_execution.mark_as_completed(result=result)
+            enqueue_next_steps([task_execution.workflow_execution_id])
         
         logger.info(f"Task execution completed: {task_execution_id}")
         
-        # Trigger next steps in the workflow
-        trigger_next_steps.delay(task_execution.workflow_execution.id)
-        
-        return result
+        # The result lives on the TaskExecution; the result backend only gets a summary
+        return {'task_execution_id': str(task_execution_id), 'status': 'completed'}
+    
+    except SoftTimeLimitExceeded:
+        # Ran past step.timeout_seconds. Not retried (a hung dependency would
+        # just hang again) - record it and give the worker slot back.
+        if not task_execution or task_execution.status != 'running':
+            raise
+        elapsed = task_execution.mark_as_timed_out()
+        logger.warning(f"Task execution timed out: {task_execution_id} after {elapsed:.1f}s")
+        workflow_execution = task_execution.workflow_execution
+        if workflow_execution.mark_as_failed(
+            error_message=f"Task '{task_execution.step.name}' timed out after {elapsed:.1f}s",
+            failed_step=task_execution.step
+        ):
+            _notify_parent_execution(workflow_execution)
+        return {'task_execution_id': str(task_execution_id), 'status': 'timed_out', 'elapsed_seconds': round(elapsed, 3)}
         
     except Exception as exc:
+        if isinstance(exc, CircuitOpen) and not self.request.is_eager and _should_defer(task_execution):
+            # The step's host is known to be down: wait until its breaker may
+            # let calls through again instead of using up a retry (eager runs
+            # can't wait, they fail as usual)
+            TaskExecution.objects.filter(id=task_execution_id, status='running').update(
+                status='retrying', next_retry_at=timezone.now() + timezone.timedelta(seconds=exc.retry_after),
+            )
+            logger.info(f"Deferring task execution {task_execution_id} for {exc.retry_after}s: {exc}")
+            record_event(task_execution.workflow_execution_id, 'task.deferred', task_execution.id,
+                         circuit=exc.key, retry_after=exc.retry_after)
+            raise self.retry(exc=exc, countdown=exc.retry_after, max_retries=None)
+        
+        if isinstance(exc, StepInFlight) and not self.request.is_eager and task_execution:
+            # An identical keyed step is running: look again shortly (and
+            # reuse its result) without counting it as a retry
+            TaskExecution.objects.filter(id=task_execution_id, status='running').update(
+                status='retrying',
+                next_retry_at=timezone.now() + timezone.timedelta(seconds=settings.STEP_IN_FLIGHT_RETRY_SECONDS),
+            )
+            logger.info(f"Deferring task execution {task_execution_id}: {exc}")
+            record_event(task_execution.workflow_execution_id, 'task.deferred', task_execution.id, in_flight=True)
+            raise self.retry(exc=exc, countdown=settings.STEP_IN_FLIGHT_RETRY_SECONDS, max_retries=None)
+        
         error_msg = str(exc)
         error_traceback = traceback.format_exc()
         
@@ -126,16 +338,44 @@ def execute_workflow_task(self, task_execution_id: str):
                 # Mark as permanently failed
                 task_execution.mark_as_failed(error_msg, error_traceback)
                 
-                # Mark the entire workflow execution as failed
+                # Mark the entire workflow execution as failed (unless it was cancelled meanwhile)
                 workflow_execution = task_execution.workflow_execution
-                workflow_execution.mark_as_failed(
+                if workflow_execution.mark_as_failed(
                     error_message=f"Task '{task_execution.step.name}' failed: {error_msg}",
                     failed_step=task_execution.step
-                )
+                ):
+                    _notify_parent_execution(workflow_execution)
         
         # Re-raise the exception for Celery
         raise
 
+def _should_defer(task_execution) -> bool:
+    """
+    Defer a step refused by an open circuit breaker?
+    
+    Yes unless the step sets on_circuit_open='fail' (or CIRCUIT_OPEN_ACTION
+    does), for up to CIRCUIT_MAX_DEFER_SECONDS after the step was created.
+    After that the refusal is handled like any other failure.
+    """
+    if task_execution is None or task_execution.status != 'running':
+        return False
+    if task_execution.step.config.get('on_circuit_open', settings.CIRCUIT_OPEN_ACTION) != 'defer':
+        return False
+    return (timezone.now() - task_execution.created_at).total_seconds() < settings.CIRCUIT_MAX_DEFER_SECONDS
+
+def enqueue_next_steps(workflow_execution_ids):
+    """
+    Queue trigger_next_steps for executions through the outbox
+    
+    Call it in the transaction that finished the step: the message goes out
+    once that commits, and a crash in between can't leave a completed step
+    with nothing to pick up what comes after it.
+    """
+    enqueue_messages([
+        {'task_name': trigger_next_steps.name, 'args': [str(workflow_execution_id)], 'options': {}}
+        for workflow_execution_id in workflow_execution_ids
+    ])
+
 @shared_task
 def trigger_next_steps(workflow_execution_id: str):
     """
@@ -144,219 +384,216 @@ def trigger_next_steps(workflow_execution_id: str):
     This runs after each task completion to see if new tasks can start
     """
     try:
+        state = get_execution_state(workflow_execution_id)
+        if state in ('cancelled', 'paused'):
+            logger.info(f"Not triggering steps of {state} execution: {workflow_execution_id}")
+            return
+        
         workflow_execution = WorkflowExecution.objects.get(id=workflow_execution_id)
         
-        # Get all pending task executions
-        pending_tasks = workflow_execution.task_executions.filter(status='pending')
+        # Pending steps that haven't been queued for dispatch yet
+        pending_tasks = workflow_execution.task_executions.filter(status='pending', ready_at__isnull=True)
         
+        ready_tasks = []
         for task_exec in pending_tasks:
             if task_exec.is_ready_for_execution():
                 logger.info(f"Triggering next step: {task_exec.step.name}")
-                execute_workflow_task.delay(str(task_exec.id))
+                ready_tasks.append(task_exec)
+        dispatch_task_executions(ready_tasks)
         
         # Check if workflow is complete
         all_tasks = workflow_execution.task_executions.all()
-        if all(task.status in ['completed', 'failed', 'skipped'] for task in all_tasks):
+        if all(task.status in ['completed', 'failed', 'timed_out', 'skipped'] for task in all_tasks):
             # All tasks are done
-            failed_tasks = all_tasks.filter(status='failed')
+            failed_tasks = all_tasks.filter(status__in=['failed', 'timed_out'])
             if failed_tasks.exists():
-                workflow_execution.mark_as_failed(
+                finished = workflow_execution.mark_as_failed(
                     error_message=f"{failed_tasks.count()} tasks failed",
                     failed_step=failed_tasks.first().step
                 )
             else:
                 # All tasks completed successfully
-                workflow_execution.mark_as_completed()
+                finished = workflow_execution.mark_as_completed()
+            if finished:
+                _notify_parent_execution(workflow_execution)
                 
     except Exception as exc:
         logger.error(f"Error triggering next steps: {exc}")
 
+def dispatch_map_chunks(task_execution_id, step, chunks):
+    """
+    Send chunks of a map step, each under the step's time limits (see step_time_limits)
+    
+    Through the outbox, tagged with the map step so cancelling it drops
+    chunks not sent yet.
+    """
+    soft_time_limit, time_limit = step_time_limits(step)
+    enqueue_messages([
+        {
+            'task_name': execute_map_chunk.name,
+            'args': [str(task_execution_id), chunk],
+            'options': {'soft_time_limit': soft_time_limit, 'time_limit': time_limit},
+            'task_execution_id': task_execution_id,
+        }
+        for chunk in chunks
+    ])
+
+@shared_task(bind=True)
+def execute_map_chunk(self, task_execution_id: str, chunk: int):
+    """
+    Run one chunk of a `map` step, then slide the window to the next chunk
+    
+    Each lane dispatches its own successor, so the number of map messages on
+    the broker never exceeds the step's max_parallelism. The map step stays
+    'waiting' meanwhile; its heartbeat tells the reaper the lanes are alive.
+    """
+    from .mapping import run_chunk
+    
+    with Heartbeat(task_execution_id, status='waiting'):
+        outcome = run_chunk(task_execution_id, chunk, run_id=self.request.id or str(uuid.uuid4()))
+    if outcome['next_chunk'] is not None:
+        step = TaskExecution.objects.select_related('step').get(id=task_execution_id).step
+        dispatch_map_chunks(task_execution_id, step, [outcome['next_chunk']])
+    return outcome
+
+def _notify_parent_execution(workflow_execution):
+    """If this is a sub-workflow run, resume the parent step waiting on it"""
+    if workflow_execution.parent_task_execution_id:
+        from .orchestrator import Orchestrator
+        Orchestrator().on_sub_workflow_finished(workflow_execution)
+
 # ===========================
-# SPECIFIC TASK IMPLEMENTATIONS
+# MAINTENANCE TASKS
 # ===========================
 
-@task_registry.register('send_sms')
-def send_sms_task(config: Dict[str, Any]) -> Dict[str, Any]:
+@shared_task
+def archive_old_executions(older_than_days: Optional[int] = None, max_batches: Optional[int] = None):
     """
-    Send SMS using configured SMS service
+    Move finished executions past the retention window into archive files
     
-    Args:
-        config: Task configuration containing phone number and message
-        
-    Returns:
-        dict: Result with SMS ID and delivery status
+    Scheduled daily via CELERY_BEAT_SCHEDULE. Each batch commits on its own,
+    so this can be stopped and resumed at any point.
     """
-    phone = config.get('phone')
-    message = config.get('message')
-    
-    if not phone or not message:
-        raise ValueError("SMS task requires 'phone' and 'message' in config")
-    
-    logger.info(f"Sending SMS to {phone}: {message}")
+    from .retention import archive_executions
     
-    # Simulate SMS sending (replace with actual SMS service integration)
-    time.sleep(2)  # Simulate network delay
-    
-    # TODO: Integrate with actual SMS service (Twilio, AWS SNS, etc.)
-    sms_id = f"sms_{int(time.time())}"
-    
-    return {
-        'sms_sent': True,
-        'sms_id': sms_id,
-        'phone': phone,
-        'message': message,
-        'sent_at': timezone.now().isoformat(),
-        'cost': 0.05  # Mock cost
-    }
+    summary = archive_executions(older_than_days=older_than_days, max_batches=max_batches)
+    logger.info(f"Retention run archived {summary['executions']} executions in {len(summary['files'])} files")
+    return {'executions': summary['executions'], 'tasks': summary['tasks']}
 
-@task_registry.register('send_email')
-def send_email_task(config: Dict[str, Any]) -> Dict[str, Any]:
+@shared_task
+def reap_stale_tasks():
     """
-    Send email using configured email service
+    Recover steps whose worker died mid-run (no heartbeat for TASK_HEARTBEAT_TIMEOUT)
     
-    Args:
-        config: Task configuration containing email, subject, and content
-        
-    Returns:
-        dict: Result with email delivery status
+    Scheduled every minute via CELERY_BEAT_SCHEDULE.
     """
-    email = config.get('email')
-    subject = config.get('subject', 'FlowPilot Notification')
-    content = config.get('content') or config.get('message')
-    template = config.get('template')
-    
-    if not email:
-        raise ValueError("Email task requires 'email' in config")
-    
-    if not content and not template:
-        raise ValueError("Email task requires 'content' or 'template' in config")
-    
-    logger.info(f"Sending email to {email}: {subject}")
-    
-    # Simulate email sending
-    time.sleep(1)
+    from .recovery import reap_stale_tasks as reap
     
-    # TODO: Integrate with actual email service (SendGrid, AWS SES, etc.)
-    
-    return {
-        'email_sent': True,
-        'email': email,
-        'subject': subject,
-        'sent_at': timezone.now().isoformat(),
-        'message_id': f"email_{int(time.time())}"
-    }
+    return reap()
 
-@task_registry.register('create_patient')
-def create_patient_task(config: Dict[str, Any]) -> Dict[str, Any]:
+@shared_task
+def drain_webhook_spool():
     """
-    Create patient record in the system
+    Turn spooled webhook events into executions
     
-    Args:
-        config: Patient information (name, phone, email, etc.)
-        
-    Returns:
-        dict: Created patient information with ID
+    Only sees this host's spool - schedule it on web hosts, or use
+    `python manage.py drain_webhooks` as a sidecar.
     """
-    name = config.get('name')
-    phone = config.get('phone')
-    email = config.get('email')
-    
-    if not name:
-        raise ValueError("Patient creation requires 'name' in config")
-    
-    logger.info(f"Creating patient record for {name}")
+    from .webhooks import drain_spool
     
-    # Simulate database operation
-    time.sleep(1)
+    return drain_spool()
+
+@shared_task
+def admit_pending_executions():
+    """
+    Start executions held by admission control once workers have capacity
     
-    # TODO: Integrate with actual patient management system
-    patient_id = int(time.time())  # Mock patient ID
+    Scheduled every couple of seconds via CELERY_BEAT_SCHEDULE.
+    """
+    from .admission import feed_pending_executions
     
-    return {
-        'patient_created': True,
-        'patient_id': patient_id,
-        'name': name,
-        'phone': phone,
-        'email': email,
-        'created_at': timezone.now().isoformat()
-    }
+    summary = feed_pending_executions()
+    return {'started': summary['started']}
 
-@task_registry.register('http_request')
-def http_request_task(config: Dict[str, Any]) -> Dict[str, Any]:
+@shared_task
+def roll_up_task_executions():
     """
-    Make HTTP request to external service
+    Fold newly finished steps into the hourly analytics rollups
     
-    Args:
-        config: HTTP request configuration (url, method, headers, data)
-        
-    Returns:
-        dict: HTTP response information
+    Scheduled every minute via CELERY_BEAT_SCHEDULE.
     """
-    import requests
+    from .analytics import roll_up_task_executions as roll_up
     
-    url = config.get('url')
-    method = config.get('method', 'GET').upper()
-    headers = config.get('headers', {})
-    data = config.get('data')
-    timeout = config.get('timeout', 30)
-    
-    if not url:
-        raise ValueError("HTTP request requires 'url' in config")
+    summary = roll_up()
+    return {'tasks': summary['tasks']}
+
+@shared_task
+def compact_execution_events():
+    """
+    Fold new execution events into the ExecutionSnapshot table
     
-    logger.info(f"Making {method} request to {url}")
+    Scheduled every 30 seconds via CELERY_BEAT_SCHEDULE.
+    """
+    from .events import compact_events
     
-    try:
-        response = requests.request(
-            method=method,
-            url=url,
-            headers=headers,
-            json=data if data else None,
-            timeout=timeout
-        )
-        
-        return {
-            'request_completed': True,
-            'status_code': response.status_code,
-            'url': url,
-            'method': method,
-            'response_data': response.json() if response.headers.get('content-type', '').startswith('application/json') else response.text,
-            'response_headers': dict(response.headers),
-            'duration_ms': response.elapsed.total_seconds() * 1000
-        }
-        
-    except requests.RequestException as e:
-        raise ValueError(f"HTTP request failed: {str(e)}")
+    summary = compact_events()
+    return {'events': summary['events']}
 
-@task_registry.register('delay')
-def delay_task(config: Dict[str, Any]) -> Dict[str, Any]:
+@shared_task
+def relay_outbox():
     """
-    Simple delay/wait task
+    Publish outbox messages the after-commit relay didn't get to
     
-    Args:
-        config: Configuration with 'seconds' to wait
-        
-    Returns:
-        dict: Delay completion information
+    Scheduled every few seconds via CELERY_BEAT_SCHEDULE.
     """
-    seconds = config.get('seconds', 1)
+    from .outbox import relay_outbox as relay
     
-    if not isinstance(seconds, (int, float)) or seconds < 0:
-        raise ValueError("Delay task requires positive 'seconds' value")
+    summary = relay()
+    return {'sent': summary['sent'], 'waiting': summary['waiting']}
+
+# ===========================
+# SPECIFIC TASK IMPLEMENTATIONS
+# ===========================
+
+# Integration steps live in their own modules and are imported on first use,
+# so a worker only pays for the integrations it actually runs
+task_registry.register_lazy('send_sms', 'workflows.integrations.messaging.send_sms_task')
+task_registry.register_lazy('send_email', 'workflows.integrations.messaging.send_email_task')
+task_registry.register_lazy('create_patient', 'workflows.integrations.patients.create_patient_task')
+task_registry.register_lazy('http_request', 'workflows.integrations.http.http_request_task')
+task_registry.register_lazy('delay', 'workflows.integrations.utility.delay_task')
+task_registry.register_lazy('display_for_test', 'workflows.integrations.utility.display_testing')
+task_registry.register_lazy('render_fractal', 'workflows.rendering.render_fractal')
+
+@task_registry.register('sub_workflow', control=True)
+def sub_workflow_task(task_execution):
+    """
+    Run another Workflow as a child execution of this step
     
-    logger.info(f"Delaying for {seconds} seconds")
+    The child is expanded lazily, only when this step is reached. The step
+    stays 'waiting' until the child finishes, then takes the child's result.
     
-    time.sleep(seconds)
+    Config:
+        workflow_id: Workflow to run
+        version: Optional version pin
+        input: Optional extra input for the child
+    """
+    from .orchestrator import Orchestrator
     
-    return {
-        'delay_completed': True,
-        'delayed_seconds': seconds,
-        'completed_at': timezone.now().isoformat()
-    }
+    child = Orchestrator().start_sub_workflow(task_execution)
+    logger.info(f"Expanded sub-workflow {child.workflow_id} as execution {child.id}")
+    return STEP_DEFERRED
 
-@task_registry.register('display_for_test')
-def display_testing(input_data):
-    msg = input_data.get("message","empty")
-    print(f"***{msg}***")
+@task_registry.register('map', control=True)
+def map_task(task_execution):
+    """
+    Run a child step type once per element of a list from the execution context
+    
+    Elements run in chunks with at most max_parallelism chunks in flight; see
+    mapping.py for the full config. The step stays 'waiting' until the last
+    chunk finishes and aggregates the results.
+    """
+    from .mapping import start_map
     
-# Log all registered tasks on module load
-logger.info(f"Registered tasks: {task_registry.list_tasks()}")
\ No newline at end of file
+    dispatch_map_chunks(task_execution.id, task_execution.step, start_map(task_execution))
+    return STEP_DEFERRED
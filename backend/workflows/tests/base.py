@@ -0,0 +1,48 @@
+"""
+Shared setup for the workflows tests
+
+Engine tests run Celery eagerly (messages execute inline when published, and
+a failing step is recorded rather than raised into the publisher, as on a
+worker) and use TransactionTestCase, because dispatch happens in
+transaction.on_commit callbacks that a wrapping TestCase transaction would
+never fire.
+"""
+
+from django.core.cache import caches
+from django.test import TransactionTestCase
+
+from flowpilot.celery import app
+from workflows import events
+from workflows.models import Workflow, WorkflowStep
+
+
+class EngineTestCase(TransactionTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for alias in ('default', 'step_results'):
+            caches[alias].clear()
+        # Write this test's buffered events before its rows are truncated
+        self.addCleanup(events.buffer.flush)
+        # The app reads Django settings under the CELERY_ namespace, and
+        # those keys win over the plain option names
+        for option, value in (('CELERY_TASK_ALWAYS_EAGER', True), ('CELERY_TASK_EAGER_PROPAGATES', False)):
+            self.addCleanup(setattr, app.conf, option, app.conf.get(option))
+            setattr(app.conf, option, value)
+
+    def make_workflow(self, *steps, name='test', **fields):
+        """
+        A workflow with one step per (name, step_type, config, depends_on) tuple
+
+        Returns:
+            tuple: (workflow, {step name: WorkflowStep})
+        """
+        workflow = Workflow.objects.create(name=name, **fields)
+        created = {}
+        for order, (step_name, step_type, config, depends_on) in enumerate(steps, 1):
+            step = WorkflowStep.objects.create(
+                workflow=workflow, name=step_name, step_type=step_type, step_order=order, config=config or {},
+            )
+            step.depends_on.set([created[dependency] for dependency in depends_on])
+            created[step_name] = step
+        return workflow, created
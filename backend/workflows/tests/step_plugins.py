@@ -0,0 +1,5 @@
+"""Step handlers the registry tests declare by dotted path (imported lazily)"""
+
+
+def shout(config):
+    return {'text': str(config.get('text', '')).upper()}
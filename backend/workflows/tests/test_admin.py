@@ -0,0 +1,52 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from workflows.admin import EstimatedCountPaginator
+from workflows.models import Workflow, WorkflowExecution
+
+
+class EstimatedCountPaginatorTests(TestCase):
+
+    def setUp(self):
+        self.workflow = Workflow.objects.create(name='admin')
+        WorkflowExecution.objects.bulk_create([
+            WorkflowExecution(workflow=self.workflow, status='failed' if n % 2 else 'completed') for n in range(5)
+        ])
+
+    def test_filtered_count_stops_at_the_limit(self):
+        executions = WorkflowExecution.objects.order_by('created_at')
+
+        with mock.patch('workflows.admin.EXACT_COUNT_LIMIT', 3):
+            paginator = EstimatedCountPaginator(executions.filter(workflow=self.workflow), 2)
+            self.assertEqual((paginator.count, paginator.num_pages), (3, 2))
+
+            self.assertEqual(EstimatedCountPaginator(executions.filter(status='failed'), 2).count, 2)
+
+    def test_unfiltered_list_uses_the_estimate(self):
+        executions = WorkflowExecution.objects.order_by('created_at')
+
+        with mock.patch.object(EstimatedCountPaginator, '_estimate', return_value=2_000_000):
+            with self.assertNumQueries(0):
+                self.assertEqual(EstimatedCountPaginator(executions, 100).count, 2_000_000)
+            self.assertEqual(EstimatedCountPaginator(executions.filter(status='failed'), 100).count, 2)
+
+    def test_no_estimate_outside_postgres(self):
+        if connection.vendor == 'postgresql':
+            self.skipTest("Estimates are PostgreSQL-only")
+        self.assertEqual(EstimatedCountPaginator(WorkflowExecution.objects.order_by('created_at'), 100).count, 5)
+
+    def test_changelist_count_is_bounded(self):
+        user = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/workflows/workflowexecution/?status__exact=failed')
+
+        self.assertEqual(response.status_code, 200)
+        counts = [query['sql'] for query in queries if 'COUNT(' in query['sql']]
+        self.assertTrue(counts)
+        self.assertTrue(all('LIMIT' in sql for sql in counts), counts)
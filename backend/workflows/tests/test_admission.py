@@ -0,0 +1,98 @@
+from datetime import timedelta
+
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from workflows.admission import feed_pending_executions
+from workflows.models import OutboxMessage, TaskExecution, WorkflowExecution
+from workflows.orchestrator import Orchestrator
+from workflows.scheduler import Scheduler
+
+from .base import EngineTestCase
+
+
+@override_settings(ADMISSION_CONTROL_ENABLED=True, ADMISSION_MAX_QUEUED=100, ADMISSION_RETRY_AFTER=7)
+class AdmissionTests(EngineTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.workflow, _ = self.make_workflow(
+            ('a', 'delay', {'seconds': 0}, []),
+            ('b', 'delay', {'seconds': 0}, ['a']),
+        )
+
+    def assert_held(self, execution):
+        execution.refresh_from_db()
+        self.assertEqual((execution.status, execution.started_at), ('pending', None))
+        self.assertFalse(execution.task_executions.filter(ready_at__isnull=False).exists())
+        self.assertFalse(OutboxMessage.objects.filter(task_execution_id__in=execution.task_executions.values('id')).exists())
+
+    def hold(self, count):
+        """Executions held pending, oldest first"""
+        with self.settings(ADMISSION_MAX_IN_FLIGHT=0):
+            executions = [Orchestrator().execute(self.workflow.id, {'n': n}) for n in range(count)]
+        now = timezone.now()
+        for age, execution in enumerate(reversed(executions), 1):
+            WorkflowExecution.objects.filter(id=execution.id).update(created_at=now - timedelta(minutes=age))
+        return executions
+
+    @override_settings(ADMISSION_MAX_IN_FLIGHT=0)
+    def test_over_capacity_trigger_is_held_with_nothing_dispatched(self):
+        execution = Orchestrator().execute(self.workflow.id, {})
+
+        self.assert_held(execution)
+
+    @override_settings(ADMISSION_MAX_IN_FLIGHT=3)
+    def test_feeder_starts_the_oldest_within_the_headroom(self):
+        oldest, middle, newest = self.hold(3)
+        # One step already in flight elsewhere leaves room for two
+        busy = WorkflowExecution.objects.create(workflow=self.workflow, status='running')
+        TaskExecution.objects.create(
+            workflow_execution=busy, step=self.workflow.steps.get(name='a'), status='running',
+            dispatched_at=timezone.now(),
+        )
+
+        summary = feed_pending_executions()
+
+        self.assertEqual((summary['started'], summary['pending_executions'], summary['running']), (2, 3, 1))
+        for execution in (oldest, middle):
+            execution.refresh_from_db()
+            self.assertEqual(execution.status, 'completed')
+        self.assert_held(newest)
+
+        TaskExecution.objects.filter(workflow_execution=busy).update(status='completed')
+        self.assertEqual(feed_pending_executions()['started'], 1)
+        newest.refresh_from_db()
+        self.assertEqual(newest.status, 'completed')
+
+    @override_settings(ADMISSION_MAX_IN_FLIGHT=0)
+    def test_feeder_does_nothing_without_headroom(self):
+        execution, = self.hold(1)
+
+        self.assertEqual(feed_pending_executions()['started'], 0)
+        self.assert_held(execution)
+
+    @override_settings(ADMISSION_MAX_IN_FLIGHT=0, ADMISSION_MAX_PENDING=2)
+    def test_api_trigger_past_the_pending_cap_is_rejected(self):
+        client = APIClient()
+        url = f'/api/workflows/{self.workflow.id}/execute/'
+        self.hold(1)
+
+        accepted = client.post(url, {'input_data': {}}, format='json')
+        rejected = client.post(url, {'input_data': {}}, format='json')
+
+        self.assertEqual((accepted.status_code, accepted.data['execution_status']), (200, 'pending'))
+        self.assertEqual(rejected.status_code, 429)
+        self.assertEqual(rejected['Retry-After'], '7')
+        self.assertEqual(WorkflowExecution.objects.count(), 2)
+
+    @override_settings(ADMISSION_MAX_IN_FLIGHT=0, ADMISSION_MAX_PENDING=1)
+    def test_scheduled_runs_are_held_when_the_backlog_is_full(self):
+        self.hold(1)
+
+        execution, = Scheduler(name='test').fire([(self.workflow.id, {})])
+
+        self.assertEqual(execution.trigger_source, 'schedule')
+        self.assert_held(execution)
+        self.assertEqual(WorkflowExecution.objects.filter(status='pending').count(), 2)
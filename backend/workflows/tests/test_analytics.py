@@ -0,0 +1,160 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from workflows.analytics import (
+    duration_bucket, histogram_percentile, roll_up_task_executions, workflow_analytics,
+)
+from workflows.models import StepHourlyRollup, TaskExecution, Watermark, Workflow, WorkflowExecution, WorkflowStep
+
+
+class HistogramTests(TestCase):
+
+    def test_duration_bucket(self):
+        # bucket = floor(log2(ms) * 4): 100ms -> 26.57, 1000ms -> 39.86
+        self.assertEqual(duration_bucket(0.5), 0)
+        self.assertEqual(duration_bucket(1), 0)
+        self.assertEqual(duration_bucket(2), 4)
+        self.assertEqual(duration_bucket(100), 26)
+        self.assertEqual(duration_bucket(1000), 39)
+        self.assertEqual(duration_bucket(10 ** 12), 128)
+
+    def test_percentile_is_the_middle_of_the_bucket_holding_the_rank(self):
+        histogram = {'26': 18, '39': 2}
+
+        # 2^(26.5/4) = 98.7, 2^(39.5/4) = 939.0
+        self.assertEqual(histogram_percentile(histogram, 0.5), 98.7)
+        self.assertEqual(histogram_percentile(histogram, 0.9), 98.7)
+        self.assertEqual(histogram_percentile(histogram, 0.95), 939.0)
+        self.assertIsNone(histogram_percentile({}, 0.5))
+
+
+class RollupTests(TestCase):
+
+    def setUp(self):
+        self.workflow = Workflow.objects.create(name='analytics')
+        self.fetch = WorkflowStep.objects.create(workflow=self.workflow, name='fetch', step_type='delay', step_order=1)
+        self.store = WorkflowStep.objects.create(workflow=self.workflow, name='store', step_type='delay', step_order=2)
+        self.hour = (timezone.now() - timedelta(hours=3)).replace(minute=0, second=0, microsecond=0)
+
+    def task(self, step, completed_at, duration_ms=100, status='completed', **fields):
+        started_at = completed_at - timedelta(milliseconds=duration_ms) if duration_ms is not None else None
+        # One task per step per run, so each gets its own execution
+        execution = WorkflowExecution.objects.create(workflow=self.workflow, status='completed')
+        return TaskExecution.objects.create(
+            workflow_execution=execution, step=step, status=status,
+            started_at=started_at, completed_at=completed_at, **fields,
+        )
+
+    def make_fixture(self):
+        """
+        fetch: 18 x 100ms + 1 x 1000ms failed + 1 x 1000ms timed_out (2 retries each), split over two hours
+        store: 3 x 400ms, one cancelled, plus one that never started
+        """
+        for i in range(18):
+            self.task(self.fetch, self.hour + timedelta(minutes=i, seconds=30))
+        self.task(self.fetch, self.hour + timedelta(hours=1, minutes=5), 1000, 'failed', retry_count=2)
+        self.task(self.fetch, self.hour + timedelta(hours=1, minutes=6), 1000, 'timed_out', retry_count=2)
+        for i in range(3):
+            self.task(self.store, self.hour + timedelta(minutes=20 + i), 400, 'cancelled' if i == 0 else 'completed')
+        self.task(self.store, self.hour + timedelta(minutes=30), None, 'failed')
+
+    def analytics(self, **kwargs):
+        return workflow_analytics(
+            self.workflow, since=self.hour - timedelta(hours=1), until=timezone.now(), **kwargs,
+        )
+
+    def test_counts_and_percentiles_match_the_fixture(self):
+        self.make_fixture()
+
+        summary = roll_up_task_executions()
+        result = self.analytics(series=True)
+
+        self.assertEqual(summary['tasks'], 24)
+        totals = result['totals']
+        self.assertEqual(totals['count'], 24)
+        self.assertEqual(totals['failures'], 3)
+        self.assertEqual(totals['cancelled'], 1)
+        self.assertEqual(totals['failure_rate'], 0.125)
+        self.assertEqual(totals['retries'], 4)
+        # (18*100 + 2*1000 + 3*400) / 23 timed tasks
+        self.assertEqual(totals['avg_duration_ms'], round(5000 / 23, 1))
+        # 18 of 23 timed tasks are in the 100ms bucket; rank 0.95*23 = 21.85 lands in 1000ms
+        self.assertEqual(totals['p50_duration_ms'], 98.7)
+        self.assertEqual(totals['p95_duration_ms'], 939.0)
+
+        fetch, store = result['steps']
+        self.assertEqual((fetch['name'], fetch['count'], fetch['failures'], fetch['retries']), ('fetch', 20, 2, 4))
+        self.assertEqual((fetch['p50_duration_ms'], fetch['p95_duration_ms']), (98.7, 939.0))
+        self.assertEqual(fetch['avg_duration_ms'], 190.0)
+        self.assertEqual((store['name'], store['count'], store['failures'], store['cancelled']), ('store', 4, 1, 1))
+        # 2^(34.5/4) = 394.8
+        self.assertEqual((store['p50_duration_ms'], store['p95_duration_ms']), (394.8, 394.8))
+
+        self.assertEqual([point['count'] for point in result['series']], [22, 2])
+        self.assertEqual(StepHourlyRollup.objects.count(), 3)
+
+    def test_rerun_and_small_batches_count_each_task_once(self):
+        self.make_fixture()
+        # Same completed_at on both sides of a batch boundary: the id breaks the tie
+        tie = self.hour + timedelta(minutes=45)
+        self.task(self.store, tie)
+        self.task(self.store, tie)
+
+        roll_up_task_executions(batch_size=5, max_batches=2)
+        roll_up_task_executions(batch_size=3)
+        roll_up_task_executions()
+
+        self.assertEqual(self.analytics()['totals']['count'], 26)
+        self.assertEqual(Watermark.objects.get(name='task-execution-rollup').position, self.hour + timedelta(hours=1, minutes=6))
+
+    @override_settings(ANALYTICS_ROLLUP_LAG_SECONDS=600)
+    def test_rows_inside_the_lag_wait_for_a_later_run(self):
+        old = self.task(self.fetch, timezone.now() - timedelta(minutes=20))
+        recent = self.task(self.fetch, timezone.now() - timedelta(minutes=5))
+
+        first = roll_up_task_executions()
+        self.assertEqual(first['tasks'], 1)
+        self.assertEqual(first['watermark'], old.completed_at)
+
+        with override_settings(ANALYTICS_ROLLUP_LAG_SECONDS=0):
+            second = roll_up_task_executions()
+        self.assertEqual(second['tasks'], 1)
+        self.assertEqual(second['watermark'], recent.completed_at)
+        self.assertEqual(roll_up_task_executions()['tasks'], 0)
+        self.assertEqual(sum(StepHourlyRollup.objects.values_list('count', flat=True)), 2)
+
+    def test_reused_steps_are_not_counted_again(self):
+        original = self.task(self.fetch, self.hour + timedelta(minutes=1))
+        self.task(self.fetch, self.hour + timedelta(minutes=2), reused_from=original)
+
+        self.assertEqual(roll_up_task_executions()['tasks'], 1)
+        self.assertEqual(self.analytics()['totals']['count'], 1)
+
+    def test_unfinished_tasks_are_ignored(self):
+        self.task(self.fetch, None, None, 'running')
+
+        self.assertEqual(roll_up_task_executions()['tasks'], 0)
+        self.assertEqual(self.analytics()['totals']['count'], 0)
+
+
+class AnalyticsEndpointTests(TestCase):
+
+    def setUp(self):
+        self.workflow = Workflow.objects.create(name='analytics')
+        self.client = APIClient()
+        self.url = f'/api/workflows/{self.workflow.id}/analytics/'
+
+    def test_window_params(self):
+        response = self.client.get(self.url, {'since': '2025-01-01T00:00:00Z', 'series': 'true'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['totals']['count'], 0)
+        self.assertEqual(response.data['series'], [])
+
+    def test_bad_datetimes_are_400(self):
+        for params in ({'since': '2025-13-01T00:00:00'}, {'until': 'yesterday'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(self.url, params).status_code, 400)
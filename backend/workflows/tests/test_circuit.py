@@ -0,0 +1,92 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from workflows.circuit import CircuitBreaker, CircuitOpen
+
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.now = 1000.0
+        patcher = mock.patch('workflows.circuit.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def breaker(self, **options):
+        options = {'failure_ratio': 0.5, 'min_calls': 4, 'window_seconds': 60, 'open_seconds': 30, **options}
+        return CircuitBreaker('partner.example', **options)
+
+    def fail(self, breaker, times=1):
+        for _ in range(times):
+            breaker.before_call()
+            breaker.record_failure()
+
+    def test_opens_once_enough_calls_fail(self):
+        breaker = self.breaker()
+        self.fail(breaker, 3)
+        self.assertEqual(breaker.state, 'closed')
+
+        self.fail(breaker)
+
+        self.assertEqual(breaker.state, 'open')
+        with self.assertRaises(CircuitOpen) as raised:
+            breaker.before_call()
+        self.assertEqual(raised.exception.retry_after, 30)
+        self.assertEqual(breaker.snapshot()['rejected'], 1)
+
+    def test_failures_outside_the_window_are_forgotten(self):
+        breaker = self.breaker()
+        self.fail(breaker, 3)
+        self.now += 61
+
+        self.fail(breaker)
+
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_half_open_probe_success_closes(self):
+        breaker = self.breaker()
+        self.fail(breaker, 4)
+        self.now += 30
+
+        breaker.before_call()
+        self.assertEqual(breaker.state, 'half_open')
+        # Only one probe at a time
+        with self.assertRaises(CircuitOpen):
+            breaker.before_call()
+        breaker.record_success()
+
+        self.assertEqual(breaker.state, 'closed')
+        breaker.before_call()
+
+    def test_half_open_probe_failure_opens_again(self):
+        breaker = self.breaker()
+        self.fail(breaker, 4)
+        self.now += 30
+
+        self.fail(breaker)
+
+        self.assertEqual(breaker.state, 'open')
+        self.assertEqual(breaker.snapshot()['opened'], 2)
+
+    def test_lost_probe_stops_counting_after_open_seconds(self):
+        breaker = self.breaker()
+        self.fail(breaker, 4)
+        self.now += 30
+        breaker.before_call()  # The probe's worker dies; nothing is recorded
+
+        self.now += 30
+
+        breaker.before_call()
+        self.assertEqual(breaker.state, 'half_open')
+
+    def test_shared_breaker_opens_in_other_processes(self):
+        self.fail(self.breaker(shared=True), 4)
+        other = self.breaker(shared=True)
+
+        with self.assertRaises(CircuitOpen):
+            other.before_call()
+        self.assertEqual(other.state, 'open')
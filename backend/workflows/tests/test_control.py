@@ -0,0 +1,176 @@
+from datetime import timedelta
+
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from workflows.admission import feed_pending_executions
+from workflows.control import cancel_executions, pause_execution, unpause_execution, ACTIVE_STATUSES
+from workflows.models import WorkflowExecution, WorkflowStep
+from workflows.orchestrator import Orchestrator
+from workflows.tasks import task_registry
+
+from .base import EngineTestCase
+
+hooks = {}
+
+
+@task_registry.register('test_hook')
+def hook(config):
+    """Runs the callable named by the input's 'hook' (root steps) or hooks['downstream']"""
+    return hooks[config.get('hook', 'downstream')]()
+
+
+def _active_ids():
+    return list(WorkflowExecution.objects.filter(status__in=ACTIVE_STATUSES).values_list('id', flat=True))
+
+
+class ExecutionControlTests(EngineTestCase):
+
+    def setUp(self):
+        super().setUp()
+        hooks.clear()
+        hooks['ok'] = hooks['downstream'] = lambda: {'ok': True}
+
+    def make_chain(self):
+        workflow, steps = self.make_workflow(
+            ('a', 'test_hook', {}, []),
+            ('b', 'test_hook', {}, ['a']),
+        )
+        WorkflowStep.objects.filter(workflow=workflow).update(max_retries=0)
+        return workflow
+
+    def test_cancel_stops_downstream_steps(self):
+        def cancel():
+            cancel_executions(_active_ids())
+            return {}
+        hooks['a'] = cancel
+        workflow = self.make_chain()
+
+        execution = Orchestrator().execute(workflow.id, {'hook': 'a'})
+
+        execution.refresh_from_db()
+        statuses = dict(execution.task_executions.values_list('step__name', 'status'))
+        self.assertEqual(execution.status, 'cancelled')
+        self.assertEqual(statuses, {'a': 'completed', 'b': 'cancelled'})
+
+    def test_step_failing_after_cancel_leaves_the_run_cancelled(self):
+        def cancel_then_fail():
+            cancel_executions(_active_ids())
+            raise RuntimeError("boom")
+        hooks['a'] = cancel_then_fail
+        workflow = self.make_chain()
+
+        execution = Orchestrator().execute(workflow.id, {'hook': 'a'})
+
+        execution.refresh_from_db()
+        workflow.refresh_from_db()
+        self.assertEqual(execution.status, 'cancelled')
+        self.assertEqual(execution.task_executions.get(step__name='a').status, 'failed')
+        self.assertEqual(workflow.total_executions, 0)
+
+    def test_finishing_twice_counts_once(self):
+        workflow = self.make_chain()
+        execution = Orchestrator().execute(workflow.id, {'hook': 'ok'})
+
+        self.assertFalse(execution.mark_as_failed("late failure"))
+        execution.refresh_from_db()
+        workflow.refresh_from_db()
+        self.assertEqual(execution.status, 'completed')
+        self.assertEqual((workflow.total_executions, workflow.successful_executions), (1, 1))
+
+    def test_pause_holds_steps_until_unpaused(self):
+        def pause():
+            for execution in WorkflowExecution.objects.filter(id__in=_active_ids()):
+                pause_execution(execution)
+            return {}
+        hooks['a'] = pause
+        workflow = self.make_chain()
+
+        execution = Orchestrator().execute(workflow.id, {'hook': 'a'})
+
+        execution.refresh_from_db()
+        self.assertEqual(execution.status, 'paused')
+        self.assertEqual(execution.task_executions.get(step__name='b').status, 'pending')
+
+        self.assertTrue(unpause_execution(execution))
+        execution.refresh_from_db()
+        self.assertEqual(execution.status, 'completed')
+        self.assertFalse(unpause_execution(execution))
+
+    @override_settings(ADMISSION_CONTROL_ENABLED=True, ADMISSION_MAX_IN_FLIGHT=0)
+    def test_unpausing_a_held_execution_waits_for_admission(self):
+        workflow = self.make_chain()
+        execution = Orchestrator().execute(workflow.id, {'hook': 'ok'})
+        self.assertEqual(execution.status, 'pending')
+        pause_execution(execution)
+
+        self.assertTrue(unpause_execution(execution))
+
+        execution.refresh_from_db()
+        self.assertEqual(execution.status, 'pending')
+        self.assertFalse(execution.task_executions.filter(dispatched_at__isnull=False).exists())
+
+        with self.settings(ADMISSION_MAX_IN_FLIGHT=10):
+            self.assertEqual(feed_pending_executions()['started'], 1)
+        execution.refresh_from_db()
+        self.assertEqual(execution.status, 'completed')
+
+    def test_resume_reuses_completed_steps(self):
+        calls = []
+
+        def flaky():
+            calls.append('b')
+            if len(calls) == 1:
+                raise RuntimeError("down")
+            return {'ok': True}
+        hooks['downstream'] = flaky
+        workflow = self.make_chain()
+
+        failed = Orchestrator().execute(workflow.id, {'hook': 'ok'})
+        failed.refresh_from_db()
+        self.assertEqual(failed.status, 'failed')
+
+        resumed = Orchestrator().resume(failed)
+
+        resumed.refresh_from_db()
+        tasks = {task.step.name: task for task in resumed.task_executions.select_related('step')}
+        self.assertEqual(resumed.status, 'completed')
+        self.assertIsNotNone(tasks['a'].reused_from_id)
+        self.assertEqual(tasks['b'].result, {'ok': True})
+        self.assertEqual(calls, ['b', 'b'])
+
+    def make_failed_runs(self, *completed_at):
+        workflow = self.make_chain()
+        WorkflowExecution.objects.bulk_create([
+            WorkflowExecution(workflow=workflow, input_data={'hook': 'ok'}, status='failed', completed_at=moment)
+            for moment in completed_at
+        ])
+        return workflow
+
+    def test_bulk_resume_only_resumes_the_window(self):
+        workflow = self.make_failed_runs(
+            timezone.now() - timedelta(days=2), timezone.now() - timedelta(hours=1),
+        )
+
+        response = APIClient().post('/api/executions/resume/', {
+            'workflow': str(workflow.id), 'since': (timezone.now() - timedelta(days=1)).isoformat(),
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['resumed'], 1)
+
+    def test_bulk_resume_rejects_bad_input(self):
+        workflow = self.make_failed_runs(timezone.now())
+        cases = {
+            'garbage since': {'workflow': str(workflow.id), 'since': 'garbage'},
+            'impossible until': {'workflow': str(workflow.id), 'until': '2025-13-01T00:00:00'},
+            'bad workflow': {'workflow': 'nope'},
+            'bad ids': {'ids': ['nope']},
+            'ids not a list': {'ids': str(workflow.id)},
+        }
+        for case, data in cases.items():
+            with self.subTest(case):
+                response = APIClient().post('/api/executions/resume/', data, format='json')
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(WorkflowExecution.objects.filter(trigger_source='retry').exists())
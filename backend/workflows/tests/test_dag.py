@@ -0,0 +1,74 @@
+from rest_framework.test import APIClient
+
+from workflows.dag import WorkflowValidationError, analyze_workflow
+from workflows.models import WorkflowExecution, WorkflowStep
+from workflows.orchestrator import Orchestrator
+
+from .base import EngineTestCase
+
+
+class WorkflowGraphTests(EngineTestCase):
+
+    def make_cycle(self):
+        workflow, steps = self.make_workflow(
+            ('a', 'delay', {'seconds': 0}, []),
+            ('b', 'delay', {'seconds': 0}, ['a']),
+        )
+        # Edited into a cycle after the fact
+        steps['a'].depends_on.add(steps['b'])
+        return workflow
+
+    def make_chain(self):
+        workflow, _ = self.make_workflow(
+            ('a', 'delay', {'seconds': 0}, []),
+            ('b', 'delay', {'seconds': 0}, ['a']),
+            ('c', 'delay', {'seconds': 0}, ['a']),
+            ('d', 'delay', {'seconds': 0}, ['b', 'c']),
+        )
+        return workflow
+
+    def test_analysis(self):
+        analysis = analyze_workflow(self.make_chain())
+
+        self.assertEqual(analysis['levels'], [['a'], ['b', 'c'], ['d']])
+        self.assertEqual((analysis['depth'], analysis['max_width'], analysis['edges']), (3, 2, 4))
+
+    def test_cyclic_workflow_does_not_start(self):
+        workflow = self.make_cycle()
+
+        with self.assertRaises(WorkflowValidationError) as raised:
+            Orchestrator().execute(workflow.id, {})
+
+        self.assertIn('cycle', str(raised.exception))
+        self.assertFalse(WorkflowExecution.objects.exists())
+
+    def test_dangling_edge_does_not_start(self):
+        workflow = self.make_chain()
+        other, other_steps = self.make_workflow(('x', 'delay', {}, []), name='other')
+        WorkflowStep.objects.get(workflow=workflow, name='d').depends_on.add(other_steps['x'])
+
+        with self.assertRaises(WorkflowValidationError):
+            Orchestrator().execute(workflow.id, {})
+
+    def test_batch_skips_only_invalid_workflows(self):
+        cyclic, valid = self.make_cycle(), self.make_chain()
+
+        executions = Orchestrator().execute_many([(cyclic.id, {}), (valid.id, {}), (cyclic.id, {})])
+
+        self.assertEqual([execution.workflow_id for execution in executions], [valid.id])
+        self.assertEqual(WorkflowExecution.objects.get().status, 'completed')
+
+    def test_api_execute_of_invalid_workflow_is_a_400(self):
+        workflow = self.make_cycle()
+
+        response = APIClient().post(f'/api/workflows/{workflow.id}/execute/', {}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()['valid'])
+
+    def test_publish_rejects_a_cycle(self):
+        workflow = self.make_cycle()
+
+        response = APIClient().post(f'/api/workflows/{workflow.id}/publish/')
+
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,197 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import OperationalError, connections
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+
+from flowpilot.db import (
+    PrimaryReplicaRouter, ReplicaRoutingMiddleware, isolation, run_with_isolation, use_replica,
+)
+from workflows.models import Workflow
+
+
+def read_alias():
+    """Where a workflows read would go right now"""
+    return Workflow.objects.all().db
+
+
+class ReplicaAliasMixin:
+    """Adds a 'replica' alias to DATABASES for the test (routing only; nothing connects to it)"""
+
+    def setUp(self):
+        super().setUp()
+        replica = {**connections['default'].settings_dict, 'TEST': {'MIRROR': 'default'}}
+        patcher = mock.patch.dict(settings.DATABASES, {'replica': replica})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+
+
+class RouterTests(ReplicaAliasMixin, SimpleTestCase):
+
+    def test_reads_use_the_replica_only_when_asked(self):
+        self.assertEqual(read_alias(), 'default')
+        with use_replica():
+            self.assertEqual(read_alias(), 'replica')
+            self.assertEqual(User.objects.all().db, 'default')
+            with use_replica(False):
+                self.assertEqual(read_alias(), 'default')
+        self.assertEqual(read_alias(), 'default')
+
+    def test_writes_and_migrations_stay_on_the_primary(self):
+        router = PrimaryReplicaRouter()
+        with use_replica():
+            self.assertEqual(router.db_for_write(Workflow), 'default')
+        self.assertTrue(router.allow_migrate('default', 'workflows'))
+        self.assertFalse(router.allow_migrate('replica', 'workflows'))
+
+    def test_no_replica_alias_means_primary(self):
+        del settings.DATABASES['replica']
+        with use_replica():
+            self.assertEqual(read_alias(), 'default')
+
+
+@override_settings(REPLICA_STICKY_SECONDS=10)
+class ReplicaRoutingMiddlewareTests(ReplicaAliasMixin, SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.factory = RequestFactory()
+        self.seen = []
+
+    def respond(self, status=200):
+        def view(request):
+            self.seen.append(read_alias())
+            return HttpResponse(status=status)
+        return ReplicaRoutingMiddleware(view)
+
+    def request(self, method='get', status=200, addr='10.0.0.1', user=None):
+        request = getattr(self.factory, method)('/api/workflows/', REMOTE_ADDR=addr)
+        if user is not None:
+            request.user = user
+        return self.respond(status)(request)
+
+    def test_safe_requests_read_from_the_replica(self):
+        self.request('get')
+        self.request('head')
+        self.request('options')
+        self.request('post', status=400)
+
+        self.assertEqual(self.seen, ['replica', 'replica', 'replica', 'default'])
+        self.assertEqual(read_alias(), 'default')
+
+    def test_successful_write_pins_the_client_to_the_primary(self):
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            self.request('post')
+        cache_set.assert_called_once_with('db-pin:addr:10.0.0.1', True, 10)
+
+        self.request('get')
+        self.request('get', addr='10.0.0.2')
+        # The pin expires after REPLICA_STICKY_SECONDS
+        cache.delete('db-pin:addr:10.0.0.1')
+        self.request('get')
+
+        self.assertEqual(self.seen, ['default', 'default', 'replica', 'replica'])
+
+    def test_failed_write_does_not_pin(self):
+        self.request('delete', status=404)
+        self.request('get')
+
+        self.assertEqual(self.seen, ['default', 'replica'])
+
+    def test_pin_follows_the_user_across_addresses(self):
+        user = SimpleNamespace(pk=7, is_authenticated=True)
+
+        self.request('patch', user=user, addr='10.0.0.1')
+        self.request('get', user=user, addr='10.0.0.9')
+
+        self.assertEqual(self.seen, ['default', 'default'])
+
+    def test_streamed_response_keeps_the_routing(self):
+        def rows():
+            for _ in range(3):
+                yield read_alias() + '\n'
+
+        middleware = ReplicaRoutingMiddleware(lambda request: StreamingHttpResponse(rows()))
+        response = middleware(self.factory.get('/api/export/', REMOTE_ADDR='10.0.0.1'))
+        # The body is produced after the middleware returned
+        self.assertEqual(read_alias(), 'default')
+        self.assertEqual(b''.join(response.streaming_content), b'replica\nreplica\nreplica\n')
+
+        self.request('put')
+        response = middleware(self.factory.get('/api/export/', REMOTE_ADDR='10.0.0.1'))
+        self.assertEqual(b''.join(response.streaming_content), b'default\ndefault\ndefault\n')
+
+    def test_no_replica_alias_leaves_requests_alone(self):
+        del settings.DATABASES['replica']
+
+        with mock.patch.object(cache, 'set') as cache_set:
+            self.request('post')
+        self.request('get')
+
+        cache_set.assert_not_called()
+        self.assertEqual(self.seen, ['default', 'default'])
+
+
+class DriverError(Exception):
+    """Stands in for the psycopg error Django wraps (it carries the SQLSTATE)"""
+
+    def __init__(self, sqlstate):
+        super().__init__(sqlstate)
+        self.sqlstate = sqlstate
+
+
+def operational_error(sqlstate):
+    exc = OperationalError(f'SQLSTATE {sqlstate}')
+    exc.__cause__ = DriverError(sqlstate)
+    return exc
+
+
+class IsolationTests(TransactionTestCase):
+
+    def test_isolation_is_a_transaction(self):
+        with isolation():
+            self.assertTrue(connections['default'].in_atomic_block)
+            Workflow.objects.create(name='isolated')
+        self.assertTrue(Workflow.objects.filter(name='isolated').exists())
+
+    def test_isolation_cannot_be_nested(self):
+        with isolation():
+            with self.assertRaisesMessage(RuntimeError, "can't be nested"):
+                with isolation('repeatable read'):
+                    pass
+
+    @mock.patch('flowpilot.db.time.sleep')
+    def test_serialization_failures_are_retried(self, sleep):
+        calls = []
+
+        def func():
+            calls.append(connections['default'].in_atomic_block)
+            if len(calls) < 3:
+                raise operational_error('40001')
+            return 'done'
+
+        self.assertEqual(run_with_isolation(func), 'done')
+        self.assertEqual(calls, [True, True, True])
+        self.assertEqual(sleep.call_count, 2)
+
+    @mock.patch('flowpilot.db.time.sleep')
+    def test_other_errors_are_raised_at_once(self, sleep):
+        func = mock.Mock(side_effect=operational_error('57014'))
+
+        with self.assertRaises(OperationalError):
+            run_with_isolation(func)
+        self.assertEqual(func.call_count, 1)
+        sleep.assert_not_called()
+
+    @mock.patch('flowpilot.db.time.sleep')
+    def test_retries_give_up_after_the_last_attempt(self, sleep):
+        func = mock.Mock(side_effect=operational_error('40P01'))
+
+        with self.assertRaises(OperationalError):
+            run_with_isolation(func, attempts=2)
+        self.assertEqual(func.call_count, 2)
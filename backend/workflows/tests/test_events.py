@@ -0,0 +1,94 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.test import override_settings
+from django.utils import timezone
+
+from workflows import events
+from workflows.models import ExecutionEvent, ExecutionSnapshot
+from workflows.orchestrator import Orchestrator
+
+from .base import EngineTestCase
+
+
+@override_settings(EVENT_COMPACTION_LAG_SECONDS=0)
+class EventCompactionTests(EngineTestCase):
+
+    def run_chain(self):
+        workflow, _ = self.make_workflow(
+            ('a', 'delay', {'seconds': 0}, []),
+            ('b', 'delay', {'seconds': 0}, ['a']),
+        )
+        execution = Orchestrator().execute(workflow.id, {})
+        events.buffer.flush()
+        return execution
+
+    def test_compaction_folds_a_run_into_its_snapshot(self):
+        execution = self.run_chain()
+
+        summary = events.compact_events()
+
+        snapshot = ExecutionSnapshot.objects.get(workflow_execution=execution)
+        self.assertEqual(summary['events'], ExecutionEvent.objects.count())
+        self.assertEqual(snapshot.event_count, summary['events'])
+        self.assertEqual(snapshot.status, 'completed')
+        self.assertEqual({state['status'] for state in snapshot.steps.values()}, {'completed'})
+        self.assertEqual(events.compact_events()['events'], 0)
+
+    def test_an_event_flushed_late_is_folded_without_overriding_newer_state(self):
+        execution = self.run_chain()
+        events.compact_events()
+        step = execution.task_executions.get(step__name='b')
+
+        # Happened before the run finished, but written only now
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+        events.record(execution.id, 'execution.paused', at=an_hour_ago)
+        events.record(execution.id, 'task.started', task_execution_id=step.id, at=an_hour_ago)
+        events.buffer.flush()
+
+        self.assertEqual(events.compact_events()['events'], 2)
+        snapshot = ExecutionSnapshot.objects.get(workflow_execution=execution)
+        self.assertEqual(snapshot.status, 'completed')
+        self.assertEqual(snapshot.steps[str(step.id)]['status'], 'completed')
+        self.assertEqual(snapshot.first_event_at, an_hour_ago)
+
+    def test_unstarted_steps_of_a_cancelled_run_stay_cancelled(self):
+        execution = self.run_chain()
+        step = execution.task_executions.get(step__name='b')
+        events.record(execution.id, 'execution.cancelled')
+        events.buffer.flush()
+        events.compact_events()
+
+        events.record(execution.id, 'task.reaped', task_execution_id=step.id)
+        events.buffer.flush()
+        events.compact_events()
+
+        snapshot = ExecutionSnapshot.objects.get(workflow_execution=execution)
+        self.assertEqual(snapshot.steps[str(step.id)]['status'], 'cancelled')
+
+    def test_events_wait_for_the_transaction_that_records_them(self):
+        execution = self.run_chain()
+        before = ExecutionEvent.objects.count()
+
+        with transaction.atomic():
+            events.record(execution.id, 'execution.paused')
+            self.assertEqual(events.buffer.flush(), 0)
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            events.record(execution.id, 'execution.unpaused')
+            raise RuntimeError
+
+        events.buffer.flush()
+        self.assertEqual(
+            list(ExecutionEvent.objects.order_by('recorded_at')[before:].values_list('event', flat=True)),
+            ['execution.paused'],
+        )
+
+    def test_a_failed_flush_leaves_the_callers_transaction_usable(self):
+        execution = self.run_chain()
+        duplicate = ExecutionEvent.objects.first()
+
+        with transaction.atomic():
+            events.buffer.add([ExecutionEvent(id=duplicate.id, workflow_execution_id=execution.id,
+                                              event='execution.paused', at=timezone.now())])
+            self.assertEqual(events.buffer.flush(), 0)
+            execution.refresh_from_db()
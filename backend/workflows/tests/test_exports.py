@@ -0,0 +1,76 @@
+import csv
+import io
+import json
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from workflows.models import TaskExecution, Workflow, WorkflowExecution, WorkflowStep
+
+
+class ExecutionExportTests(TestCase):
+
+    def setUp(self):
+        self.workflow = Workflow.objects.create(name='export')
+        step = WorkflowStep.objects.create(workflow=self.workflow, name='fetch', step_type='delay', step_order=1)
+        self.now = timezone.now()
+        self.old = WorkflowExecution.objects.create(workflow=self.workflow, status='failed', input_data={'n': 1})
+        self.new = WorkflowExecution.objects.create(
+            workflow=self.workflow, status='completed',
+            input_data={'n': 2, 'auth': {'api_key': 'k', 'user': 'u'}, 'items': [{'password': 'p'}]},
+        )
+        WorkflowExecution.objects.filter(id=self.old.id).update(created_at=self.now - timedelta(days=2))
+        TaskExecution.objects.create(workflow_execution=self.new, step=step, status='completed',
+                                     result={'token': 't', 'rows': 3})
+        self.client = APIClient()
+        self.url = f'/api/workflows/{self.workflow.id}/executions/export/'
+
+    def export(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def ndjson(self, **params):
+        return [json.loads(line) for line in self.export(**params).splitlines()]
+
+    def test_ndjson_executions(self):
+        rows = {row['id']: row for row in self.ndjson()}
+
+        self.assertEqual(set(rows), {str(self.old.id), str(self.new.id)})
+        self.assertEqual(rows[str(self.old.id)]['status'], 'failed')
+        self.assertEqual(rows[str(self.new.id)]['input_data']['n'], 2)
+
+    def test_csv_tasks(self):
+        header, row = list(csv.reader(io.StringIO(self.export(rows='tasks', output='csv'))))
+
+        self.assertEqual(header[:4], ['id', 'workflow_execution_id', 'step', 'status'])
+        self.assertEqual(row[2:4], ['fetch', 'completed'])
+        self.assertEqual(json.loads(row[header.index('result')]), {'token': '[redacted]', 'rows': 3})
+
+    def test_window_and_status_filters(self):
+        since = (self.now - timedelta(days=1)).isoformat()
+        until = (self.now - timedelta(days=1)).isoformat()
+
+        self.assertEqual([row['id'] for row in self.ndjson(since=since)], [str(self.new.id)])
+        self.assertEqual([row['id'] for row in self.ndjson(until=until)], [str(self.old.id)])
+        self.assertEqual([row['id'] for row in self.ndjson(status='failed')], [str(self.old.id)])
+
+    def test_secrets_in_json_columns_are_redacted(self):
+        row, = self.ndjson(status='completed')
+
+        self.assertEqual(row['input_data'], {
+            'n': 2, 'auth': {'api_key': '[redacted]', 'user': 'u'}, 'items': [{'password': '[redacted]'}],
+        })
+
+    def test_bad_parameters_are_a_400(self):
+        cases = {
+            'rows': {'rows': 'steps'},
+            'output': {'output': 'xml'},
+            'garbage since': {'since': 'yesterday'},
+            'impossible until': {'until': '2025-13-01T00:00:00'},
+        }
+        for case, params in cases.items():
+            with self.subTest(case):
+                self.assertEqual(self.client.get(self.url, params).status_code, 400)
@@ -0,0 +1,44 @@
+from django.test import SimpleTestCase
+
+from workflows.fairshare import DeficitRoundRobin
+
+
+class DeficitRoundRobinTests(SimpleTestCase):
+
+    def test_equal_weights_split_capacity_evenly(self):
+        grants = DeficitRoundRobin().allocate({'a': 100, 'b': 100}, 10)
+
+        self.assertEqual(grants, {'a': 5, 'b': 5})
+
+    def test_weights_set_relative_shares(self):
+        grants = DeficitRoundRobin(weights={'a': 3}).allocate({'a': 100, 'b': 100}, 8)
+
+        self.assertEqual(grants, {'a': 6, 'b': 2})
+
+    def test_a_short_queue_leaves_its_share_to_the_others(self):
+        grants = DeficitRoundRobin().allocate({'a': 1, 'b': 100}, 10)
+
+        self.assertEqual(grants, {'a': 1, 'b': 9})
+
+    def test_quota_caps_in_flight_steps(self):
+        drr = DeficitRoundRobin(quotas={'a': 4})
+
+        grants = drr.allocate({'a': 100, 'b': 100}, 10, in_flight={'a': 3})
+
+        self.assertEqual(grants, {'a': 1, 'b': 9})
+
+    def test_small_grants_rotate_through_every_queue(self):
+        drr = DeficitRoundRobin()
+        backlog = {'a': 10, 'b': 10, 'c': 10}
+
+        granted = [next(iter(drr.allocate(backlog, 1))) for _ in range(3)]
+
+        self.assertEqual(sorted(granted), ['a', 'b', 'c'])
+
+    def test_non_positive_weights_are_rejected(self):
+        for weight in (0, -1, 'heavy', None):
+            with self.subTest(weight), self.assertRaises(ValueError):
+                DeficitRoundRobin(weights={'a': weight})
+
+    def test_zero_quantum_does_not_spin(self):
+        self.assertEqual(DeficitRoundRobin(quantum=0).allocate({'a': 5}, 5), {})
@@ -0,0 +1,94 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from workflows.mapping import run_chunk, start_map, _settings
+from workflows.models import MapItemExecution, TaskExecution
+from workflows.orchestrator import Orchestrator
+from workflows.recovery import reap_stale_tasks
+from workflows.tasks import task_registry
+
+from .base import EngineTestCase
+
+calls = []
+
+
+@task_registry.register('test_double')
+def double(config):
+    calls.append(config['item'])
+    return config['item'] * 2
+
+
+class MapStepTests(EngineTestCase):
+
+    def setUp(self):
+        super().setUp()
+        calls.clear()
+
+    def make_map(self, **config):
+        workflow, steps = self.make_workflow(
+            ('map', 'map', {'items': 'input.xs', 'step_type': 'test_double', **config}, []),
+        )
+        return workflow, steps['map']
+
+    def test_map_completes_with_ordered_results(self):
+        workflow, _ = self.make_map(chunk_size=3, max_parallelism=2)
+        execution = Orchestrator().execute(workflow.id, {'xs': list(range(7))})
+
+        execution.refresh_from_db()
+        task = execution.task_executions.get()
+        self.assertEqual(execution.status, 'completed')
+        self.assertEqual(task.result['results'], [x * 2 for x in range(7)])
+        self.assertEqual(sorted(calls), list(range(7)))
+
+    def test_chunks_are_sized_to_fit_the_step_timeout(self):
+        _, step = self.make_map(chunk_size=50, item_timeout_seconds=30)
+        step.timeout_seconds = 90
+        self.assertEqual(_settings(step)['chunk_size'], 3)
+        step.config['item_timeout_seconds'] = 500
+        self.assertEqual(_settings(step)['chunk_size'], 1)
+
+    def test_duplicate_chunk_run_does_not_rerun_items(self):
+        workflow, step = self.make_map(chunk_size=4, max_parallelism=1)
+        execution = Orchestrator().execute_many([(workflow.id, {'xs': [1, 2, 3, 4]})], reject_when_full=False)[0]
+        task = execution.task_executions.get()
+        # Start the map without its chunk messages
+        TaskExecution.objects.filter(id=task.id).update(status='waiting')
+        MapItemExecution.objects.filter(task_execution=task).delete()
+        task.refresh_from_db()
+        calls.clear()
+        start_map(task)
+
+        run_chunk(str(task.id), 0, run_id='first')
+        run_chunk(str(task.id), 0, run_id='duplicate')
+
+        self.assertEqual(sorted(calls), [1, 2, 3, 4])
+
+    def test_reaper_restarts_a_map_whose_chunks_died(self):
+        workflow, step = self.make_map(chunk_size=2, max_parallelism=2)
+        execution = Orchestrator().execute(workflow.id, {'xs': []})
+        task = execution.task_executions.get()
+        # A map whose chunk workers were killed: waiting, items claimed by dead runs, no beat
+        TaskExecution.objects.filter(id=task.id).update(status='waiting', result={'items': 5, 'chunks': 3})
+        execution.__class__.objects.filter(id=execution.id).update(status='running', completed_at=None)
+        MapItemExecution.objects.bulk_create([
+            MapItemExecution(task_execution=task, index=i, chunk=i // 2, input_data={'item': i},
+                             status='running' if i < 2 else 'pending', claimed_by='dead' if i < 2 else '')
+            for i in range(5)
+        ])
+        TaskExecution.objects.filter(id=task.id).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+
+        summary = reap_stale_tasks(stale_after=60)
+
+        task.refresh_from_db()
+        self.assertEqual(summary['maps'], 1)
+        self.assertEqual(task.status, 'completed')
+        self.assertEqual(task.result['results'], [0, 2, 4, 6, 8])
+
+    def test_waiting_map_with_a_fresh_heartbeat_is_left_alone(self):
+        workflow, _ = self.make_map()
+        execution = Orchestrator().execute(workflow.id, {'xs': []})
+        task = execution.task_executions.get()
+        TaskExecution.objects.filter(id=task.id).update(status='waiting', heartbeat_at=timezone.now())
+
+        self.assertEqual(reap_stale_tasks(stale_after=60)['maps'], 0)
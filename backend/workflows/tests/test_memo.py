@@ -0,0 +1,65 @@
+from unittest import mock
+
+from celery.exceptions import Retry
+from django.core.cache import caches
+from django.test import override_settings
+
+from workflows.memo import idempotency_key, run_memoized, StepInFlight
+from workflows.models import TaskExecution
+from workflows.orchestrator import Orchestrator
+from workflows.tasks import execute_workflow_task, task_registry
+
+from .base import EngineTestCase
+
+sent = []
+
+
+@task_registry.register('test_send')
+def send(config):
+    sent.append(config['to'])
+    return {'sent_to': config['to']}
+
+
+class MemoizedStepTests(EngineTestCase):
+
+    def setUp(self):
+        super().setUp()
+        sent.clear()
+
+    def test_identical_input_reuses_the_stored_result(self):
+        workflow, _ = self.make_workflow(('send', 'test_send', {'idempotency_key': ['to']}, []))
+
+        first = Orchestrator().execute(workflow.id, {'to': '555', 'trace': 'a'})
+        second = Orchestrator().execute(workflow.id, {'to': '555', 'trace': 'b'})
+
+        self.assertEqual(sent, ['555'])
+        for execution in (first, second):
+            self.assertEqual(execution.task_executions.get().result, {'sent_to': '555'})
+
+    def test_identical_run_in_progress_raises_step_in_flight(self):
+        _, steps = self.make_workflow(('send', 'test_send', {'idempotency_key': '*'}, []))
+        caches['step_results'].add(f"{idempotency_key(steps['send'], {'to': '1'})}:lock", 1)
+
+        with self.assertRaises(StepInFlight):
+            run_memoized(steps['send'], {'to': '1'}, send)
+        self.assertEqual(sent, [])
+
+    @override_settings(STEP_IN_FLIGHT_RETRY_SECONDS=7)
+    def test_waiting_on_an_in_flight_step_does_not_use_a_retry(self):
+        workflow, steps = self.make_workflow(('send', 'test_send', {'idempotency_key': '*'}, []))
+        execution = Orchestrator().execute_many([(workflow.id, {'to': '1'})], reject_when_full=False)[0]
+        task = execution.task_executions.get()
+        # Back to pending with no stored result, as if another run were still going
+        TaskExecution.objects.filter(id=task.id).update(status='pending')
+        caches['step_results'].clear()
+        caches['step_results'].add(f"{idempotency_key(steps['send'], {'to': '1'})}:lock", 1)
+
+        with mock.patch.object(execute_workflow_task, 'retry', side_effect=Retry()) as retry:
+            with self.assertRaises(Retry):
+                execute_workflow_task.run(str(task.id))
+
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'retrying')
+        self.assertEqual(task.retry_count, 0)
+        self.assertEqual(retry.call_args.kwargs['countdown'], 7)
+        self.assertIsNone(retry.call_args.kwargs['max_retries'])
@@ -0,0 +1,99 @@
+from contextlib import nullcontext
+from datetime import timedelta
+from unittest import mock
+
+from django.test import override_settings
+from django.utils import timezone
+
+from flowpilot.celery import app
+from workflows import outbox
+from workflows.models import OutboxMessage, WorkflowExecution
+from workflows.orchestrator import Orchestrator
+from workflows.tasks import trigger_next_steps
+
+from .base import EngineTestCase
+
+
+@override_settings(OUTBOX_RETRY_SECONDS=5)
+class OutboxRelayTests(EngineTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Publish to a (mocked) broker instead of running tasks inline
+        self.addCleanup(setattr, app.conf, 'CELERY_TASK_ALWAYS_EAGER', True)
+        app.conf.CELERY_TASK_ALWAYS_EAGER = False
+        patcher = mock.patch.object(app, 'producer_or_acquire', lambda *args: nullcontext())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def add_messages(self, count):
+        return [
+            OutboxMessage.objects.create(task_name=trigger_next_steps.name, args=[str(n)]).id
+            for n in range(count)
+        ]
+
+    def test_relay_publishes_in_order_and_deletes(self):
+        self.add_messages(3)
+
+        with mock.patch.object(trigger_next_steps, 'apply_async') as apply_async:
+            summary = outbox.relay_outbox()
+
+        self.assertEqual((summary['sent'], summary['waiting']), (3, 0))
+        self.assertEqual([call.kwargs['args'] for call in apply_async.call_args_list], [['0'], ['1'], ['2']])
+
+    def test_failed_publish_pushes_the_rest_back_with_a_growing_delay(self):
+        self.add_messages(3)
+
+        with mock.patch.object(trigger_next_steps, 'apply_async', side_effect=[None, OSError('broker down')]):
+            summary = outbox.relay_outbox()
+
+        self.assertEqual((summary['sent'], summary['waiting']), (1, 2))
+        waiting = list(OutboxMessage.objects.order_by('id'))
+        self.assertEqual([message.args for message in waiting], [['1'], ['2']])
+        self.assertEqual({message.attempts for message in waiting}, {1})
+        self.assertEqual(waiting[0].last_error, 'broker down')
+        delay = waiting[0].available_at - timezone.now()
+        self.assertTrue(timedelta(seconds=4) < delay <= timedelta(seconds=5))
+
+        # Not due yet, so a sweep leaves them alone
+        with mock.patch.object(trigger_next_steps, 'apply_async') as apply_async:
+            self.assertEqual(outbox.relay_outbox()['sent'], 0)
+        apply_async.assert_not_called()
+
+        OutboxMessage.objects.update(available_at=timezone.now())
+        with mock.patch.object(trigger_next_steps, 'apply_async', side_effect=OSError('still down')):
+            outbox.relay_outbox()
+        message = OutboxMessage.objects.order_by('id').first()
+        self.assertEqual(message.attempts, 2)
+        self.assertTrue(message.available_at - timezone.now() > timedelta(seconds=9))
+
+    def test_push_back_is_capped(self):
+        ids = self.add_messages(1)
+        OutboxMessage.objects.filter(id__in=ids).update(attempts=20)
+
+        with mock.patch.object(trigger_next_steps, 'apply_async', side_effect=OSError('down')):
+            outbox.relay_outbox()
+
+        delay = OutboxMessage.objects.get().available_at - timezone.now()
+        self.assertLessEqual(delay, timedelta(seconds=outbox.MAX_RETRY_SECONDS))
+
+
+class OutboxCreationTests(EngineTestCase):
+
+    def test_root_steps_are_in_the_outbox_when_the_runs_commit(self):
+        workflow, _ = self.make_workflow(
+            ('a', 'delay', {'seconds': 0}, []),
+            ('b', 'delay', {'seconds': 0}, ['a']),
+        )
+
+        # The process dies before relaying what it committed
+        with mock.patch('workflows.outbox.relay_messages'):
+            execution, = Orchestrator().execute_many([(workflow.id, {})])
+
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.task_execution_id, execution.task_executions.get(step__name='a').id)
+
+        outbox.relay_outbox()
+
+        self.assertEqual(WorkflowExecution.objects.get().status, 'completed')
+        self.assertFalse(OutboxMessage.objects.exists())
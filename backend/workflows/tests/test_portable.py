@@ -0,0 +1,84 @@
+import json
+import zlib
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from workflows.models import Workflow, WorkflowStep
+from workflows.portable import (
+    MAGIC, FORMAT_VERSION, clone_workflow, export_workflows, import_workflows, load_bundle, WorkflowFormatError,
+)
+
+
+def json_blob(payload) -> bytes:
+    return MAGIC + bytes([FORMAT_VERSION]) + b'j' + zlib.compress(json.dumps(payload).encode())
+
+
+class PortableWorkflowTests(TestCase):
+
+    def setUp(self):
+        self.workflow = Workflow.objects.create(
+            name='intake', trigger_type='webhook',
+            trigger_config={'secret': 's3cret', 'search_keys': ['phone'], 'auth': {'api_key': 'k'}},
+        )
+        a = WorkflowStep.objects.create(workflow=self.workflow, name='a', step_type='delay', step_order=1)
+        b = WorkflowStep.objects.create(workflow=self.workflow, name='b', step_type='delay', step_order=2,
+                                        config={'seconds': 1})
+        b.depends_on.add(a)
+
+    def test_round_trip_keeps_steps_and_edges(self):
+        imported, = import_workflows(export_workflows([self.workflow]))
+
+        steps = {step.name: step for step in imported.steps.all()}
+        self.assertNotEqual(imported.id, self.workflow.id)
+        self.assertEqual(sorted(steps), ['a', 'b'])
+        self.assertEqual(steps['b'].config, {'seconds': 1})
+        self.assertEqual(list(steps['b'].depends_on.all()), [steps['a']])
+
+    def test_export_leaves_secrets_out_and_import_deactivates(self):
+        bundle = load_bundle(export_workflows([self.workflow]))
+        exported = bundle['workflows'][0]
+        self.assertEqual(exported['trigger_config'], {'search_keys': ['phone'], 'auth': {}})
+        self.assertEqual(exported['redacted'], ['secret', 'auth.api_key'])
+
+        imported, = import_workflows(export_workflows([self.workflow]))
+        self.assertFalse(imported.is_active)
+
+    def test_clone_keeps_secrets(self):
+        clone = clone_workflow(self.workflow)
+
+        self.assertEqual(clone.trigger_config, self.workflow.trigger_config)
+        self.assertTrue(clone.is_active)
+        self.assertEqual(clone.name, 'intake (copy)')
+
+    def test_malformed_blobs_are_format_errors(self):
+        good = load_bundle(export_workflows([self.workflow]))
+        step_row = good['workflows'][0]['steps'][0]
+        blobs = {
+            'header': b'nope',
+            'compression': MAGIC + bytes([FORMAT_VERSION]) + b'j' + b'not zlib',
+            'codec': MAGIC + bytes([FORMAT_VERSION]) + b'x' + zlib.compress(b'{}'),
+            'json': MAGIC + bytes([FORMAT_VERSION]) + b'j' + zlib.compress(b'{"strings": ['),
+            'not a bundle': json_blob([1, 2]),
+            'missing key': json_blob({'workflows': []}),
+            'missing field': json_blob({'strings': [], 'workflows': [{'name': 'x'}]}),
+            'short row': json_blob({**good, 'workflows': [{**good['workflows'][0], 'steps': [step_row[:3]]}]}),
+            'bad string ref': json_blob({**good, 'strings': []}),
+            'negative edge': json_blob({**good, 'workflows': [{**good['workflows'][0], 'edges': [[1, -1]]}]}),
+            'bad edge': json_blob({**good, 'workflows': [{**good['workflows'][0], 'edges': [[1]]}]}),
+            'wrong types': json_blob({'strings': 3, 'workflows': 'x'}),
+            'duplicate step_order': json_blob(
+                {**good, 'workflows': [{**good['workflows'][0], 'steps': [step_row, step_row], 'edges': []}]}
+            ),
+        }
+        for case, blob in blobs.items():
+            with self.subTest(case), self.assertRaises(WorkflowFormatError):
+                import_workflows(blob)
+        self.assertEqual(Workflow.objects.count(), 1)
+
+    def test_import_endpoint_answers_400_for_a_broken_blob(self):
+        response = APIClient().post(
+            '/api/workflows/import/', data=json_blob({'strings': []}), content_type='application/octet-stream',
+        )
+
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,67 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from workflows.models import TaskExecution, WorkflowExecution, WorkflowStep
+from workflows.recovery import reap_stale_tasks
+
+from .base import EngineTestCase
+
+
+class ReaperTests(EngineTestCase):
+
+    def start_run(self, heartbeat_age, max_retries=3):
+        """A run whose first step a worker claimed and last beat heartbeat_age ago"""
+        workflow, steps = self.make_workflow(
+            ('a', 'delay', {'seconds': 0}, []),
+            ('b', 'delay', {'seconds': 0}, ['a']),
+        )
+        WorkflowStep.objects.filter(workflow=workflow).update(max_retries=max_retries)
+        started_at = timezone.now() - timedelta(minutes=30)
+        execution = WorkflowExecution.objects.create(workflow=workflow, status='running', started_at=started_at)
+        TaskExecution.objects.create(
+            workflow_execution=execution, step=steps['a'], status='running', worker_id='dead-worker',
+            started_at=started_at, heartbeat_at=timezone.now() - heartbeat_age,
+        )
+        TaskExecution.objects.create(workflow_execution=execution, step=steps['b'])
+        return execution
+
+    def statuses(self, execution):
+        return dict(execution.task_executions.values_list('step__name', 'status'))
+
+    def test_stale_step_with_retries_left_is_redispatched(self):
+        execution = self.start_run(timedelta(minutes=10))
+
+        summary = reap_stale_tasks(stale_after=120)
+
+        self.assertEqual((summary['redispatched'], summary['failed']), (1, 0))
+        execution.refresh_from_db()
+        a = execution.task_executions.get(step__name='a')
+        self.assertEqual(a.retry_count, 1)
+        self.assertNotEqual(a.worker_id, 'dead-worker')
+        # The re-dispatched step ran (eagerly) and the run carried on
+        self.assertEqual(self.statuses(execution), {'a': 'completed', 'b': 'completed'})
+        self.assertEqual(execution.status, 'completed')
+
+    def test_stale_step_without_retries_fails_its_run(self):
+        execution = self.start_run(timedelta(minutes=10), max_retries=0)
+
+        summary = reap_stale_tasks(stale_after=120)
+
+        self.assertEqual((summary['redispatched'], summary['failed']), (0, 1))
+        execution.refresh_from_db()
+        a = execution.task_executions.get(step__name='a')
+        self.assertEqual(a.status, 'failed')
+        self.assertIn('Worker lost: no heartbeat since', a.error_message)
+        self.assertEqual((execution.status, execution.failed_step_id), ('failed', a.step_id))
+        self.assertEqual(self.statuses(execution)['b'], 'pending')
+
+    def test_step_with_a_fresh_heartbeat_is_left_alone(self):
+        execution = self.start_run(timedelta(seconds=5))
+
+        summary = reap_stale_tasks(stale_after=120)
+
+        self.assertEqual((summary['redispatched'], summary['failed']), (0, 0))
+        a = execution.task_executions.get(step__name='a')
+        self.assertEqual((a.status, a.retry_count, a.worker_id), ('running', 0, 'dead-worker'))
+        self.assertEqual(WorkflowExecution.objects.get(id=execution.id).status, 'running')
@@ -0,0 +1,87 @@
+import sys
+from importlib.metadata import EntryPoint
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+from django.utils.module_loading import import_string
+
+from workflows.tasks import TaskRegistry
+
+PLUGIN_MODULE = 'workflows.tests.step_plugins'
+
+
+class Registry(TaskRegistry):
+    """A registry of its own, so the tests don't touch the global step types"""
+    _tasks = {}
+    _control_tasks = set()
+    _lazy_tasks = {}
+    _declared_loaded = False
+
+
+class LazyRegistryTests(SimpleTestCase):
+
+    def setUp(self):
+        for name in ('_tasks', '_lazy_tasks'):
+            setattr(Registry, name, {})
+        Registry._control_tasks = set()
+        Registry._declared_loaded = False
+        sys.modules.pop(PLUGIN_MODULE, None)
+        patcher = mock.patch('workflows.tasks.entry_points', return_value=[])
+        self.entry_points = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_dotted_path_is_imported_on_first_use_then_cached(self):
+        Registry.register_lazy('shout', f'{PLUGIN_MODULE}.shout')
+
+        self.assertNotIn(PLUGIN_MODULE, sys.modules)
+        self.assertIn('shout', Registry.list_tasks())
+        self.assertNotIn(PLUGIN_MODULE, sys.modules)
+
+        with mock.patch('workflows.tasks.import_string', wraps=import_string) as spy:
+            func = Registry.get_task('shout')
+            self.assertIs(Registry.get_task('shout'), func)
+
+        spy.assert_called_once_with(f'{PLUGIN_MODULE}.shout')
+        self.assertEqual(func({'text': 'hi'}), {'text': 'HI'})
+
+    def test_bad_dotted_path_names_the_step_type(self):
+        Registry.register_lazy('broken', f'{PLUGIN_MODULE}.missing')
+        Registry.register_lazy('gone', 'workflows.no_such_module.run')
+
+        with self.assertRaisesMessage(ImportError, f"Step type 'broken' is declared as '{PLUGIN_MODULE}.missing'"):
+            Registry.get_task('broken')
+        with self.assertRaisesMessage(ImportError, "Step type 'gone'"):
+            Registry.get_task('gone')
+        self.assertNotIn('broken', Registry._tasks)
+
+    def test_unknown_type_is_none(self):
+        self.assertIsNone(Registry.get_task('nope'))
+
+    @override_settings(WORKFLOW_STEP_TYPES={'from_settings': f'{PLUGIN_MODULE}.shout'})
+    def test_types_declared_in_settings_and_entry_points_are_registered(self):
+        self.entry_points.return_value = [
+            EntryPoint(name='from_plugin', value=f'{PLUGIN_MODULE}:shout', group='flowpilot.step_types'),
+        ]
+
+        self.assertIn('from_settings', Registry.list_tasks())
+        self.assertIn('from_plugin', Registry.list_tasks())
+        self.entry_points.assert_called_once_with(group='flowpilot.step_types')
+        self.assertEqual(Registry.get_task('from_plugin')({'text': 'a'}), {'text': 'A'})
+        self.assertEqual(Registry.get_task('from_settings')({'text': 'b'}), {'text': 'B'})
+
+    def test_declared_types_are_read_only_for_unknown_types(self):
+        Registry.register_lazy('shout', f'{PLUGIN_MODULE}.shout')
+
+        Registry.get_task('shout')
+        self.entry_points.assert_not_called()
+
+        Registry.get_task('nope')
+        Registry.get_task('still_nope')
+        self.entry_points.assert_called_once()
+
+    @override_settings(WORKFLOW_STEP_TYPES={'shout': 'workflows.no_such_module.run'})
+    def test_code_registrations_win_over_declared_ones(self):
+        Registry.register_lazy('shout', f'{PLUGIN_MODULE}.shout')
+        Registry.list_tasks()
+
+        self.assertEqual(Registry.get_task('shout')({'text': 'c'}), {'text': 'C'})
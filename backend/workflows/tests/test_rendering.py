@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+from PIL import Image
+
+import fractal
+from workflows.rendering import DEFAULT_BOUNDS, escape_time_tile, render_fractal, render_mandelbrot
+
+
+class RendererMatchesReferenceTests(SimpleTestCase):
+
+    def reference_counts(self, width, height, max_iter):
+        """Iteration counts from the same per-pixel loop as fractal.render_basic"""
+        counts = np.empty((height, width), dtype=np.uint16)
+        for px in range(width):
+            for py in range(height):
+                x0 = fractal.x_min + (px / (width - 1)) * (fractal.x_max - fractal.x_min)
+                y0 = fractal.y_min + (py / (height - 1)) * (fractal.y_max - fractal.y_min)
+                c = complex(x0, y0)
+                z = 0 + 0j
+                iteration = 0
+                while abs(z) <= 2 and iteration < max_iter:
+                    z = z * z + c
+                    iteration += 1
+                counts[py, px] = iteration
+        return counts
+
+    def test_iteration_counts_match_the_original_loop(self):
+        expected = self.reference_counts(48, 36, fractal.max_iter)
+
+        np.testing.assert_array_equal(render_mandelbrot(48, 36, fractal.max_iter, tile_rows=7), expected)
+        np.testing.assert_array_equal(escape_time_tile(48, 36, 10, 20, fractal.max_iter, DEFAULT_BOUNDS), expected[10:20])
+
+    def test_png_matches_render_basic(self):
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir)
+
+        with override_settings(FRACTAL_OUTPUT_DIR=output_dir):
+            result = render_fractal({'width': 40, 'height': 30, 'max_iter': fractal.max_iter, 'tile_rows': 8, 'workers': 1})
+
+        rendered = np.asarray(Image.open(result['image_path']).convert('RGB'))
+        np.testing.assert_array_equal(rendered, np.asarray(fractal.render_basic(40, 30)))
+        self.assertEqual(result['tiles'], 4)
+
+
+class RenderFractalConfigTests(SimpleTestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir)
+        settings = override_settings(
+            FRACTAL_OUTPUT_DIR=self.output_dir, FRACTAL_MAX_WIDTH=64, FRACTAL_MAX_HEIGHT=32, FRACTAL_MAX_ITER=50,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def render(self, **config):
+        return render_fractal({'width': 8, 'height': 8, 'max_iter': 10, 'workers': 1, **config})
+
+    def test_output_path_is_resolved_under_the_output_dir(self):
+        result = self.render(output_path='runs/a.png')
+
+        self.assertEqual(result['image_path'], os.path.join(os.path.realpath(self.output_dir), 'runs', 'a.png'))
+        self.assertTrue(os.path.exists(result['image_path']))
+
+    def test_paths_outside_the_output_dir_are_rejected(self):
+        os.symlink(tempfile.gettempdir(), os.path.join(self.output_dir, 'link'))
+        for path in ('../escape.png', '/tmp/escape.png', 'runs/../../escape.png', 'link/escape.png', '.'):
+            with self.subTest(path=path), self.assertRaises(ValueError):
+                self.render(output_path=path)
+
+    def test_size_and_iteration_limits(self):
+        self.render(width=64, height=32, max_iter=50)
+        for config in ({'width': 65}, {'height': 33}, {'max_iter': 51}):
+            with self.subTest(config=config), self.assertRaises(ValueError):
+                self.render(**config)
@@ -0,0 +1,122 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.db.models.query import QuerySet
+from django.test import TestCase
+from django.utils import timezone
+
+from workflows.models import (
+    Workflow, WorkflowStep, WorkflowExecution, TaskExecution, ExecutionArchiveStats, ExecutionSearchKey,
+)
+from workflows.retention import archive_executions, read_archive
+
+
+class RetentionTests(TestCase):
+
+    def setUp(self):
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir)
+        self.workflow = Workflow.objects.create(name='retained')
+        self.step = WorkflowStep.objects.create(workflow=self.workflow, name='a', step_type='delay', step_order=1)
+
+    def make_execution(self, status, days_old, retry_count=0):
+        created_at = timezone.now() - timedelta(days=days_old)
+        execution = WorkflowExecution.objects.create(
+            workflow=self.workflow, status=status, input_data={'phone': '555'},
+            started_at=created_at, completed_at=created_at + timedelta(seconds=2),
+        )
+        # created_at is auto_now_add
+        WorkflowExecution.objects.filter(id=execution.id).update(created_at=created_at)
+        TaskExecution.objects.create(
+            workflow_execution=execution, step=self.step, retry_count=retry_count,
+            status='failed' if status == 'failed' else 'completed',
+        )
+        ExecutionSearchKey.objects.create(
+            workflow_execution=execution, workflow=self.workflow, key='phone', value='555', created_at=created_at,
+        )
+        return execution
+
+    def archive(self, **kwargs):
+        return archive_executions(older_than_days=30, archive_dir=self.archive_dir, **kwargs)
+
+    def test_archives_and_deletes_only_old_finished_runs(self):
+        old_done = self.make_execution('completed', 40)
+        old_failed = self.make_execution('failed', 40, retry_count=2)
+        old_running = self.make_execution('running', 40)
+        recent = self.make_execution('completed', 1)
+
+        summary = self.archive()
+
+        self.assertEqual((summary['executions'], summary['tasks']), (2, 2))
+        self.assertEqual(
+            set(WorkflowExecution.objects.values_list('id', flat=True)), {old_running.id, recent.id},
+        )
+        self.assertFalse(TaskExecution.objects.filter(workflow_execution_id__in=[old_done.id, old_failed.id]).exists())
+        self.assertFalse(ExecutionSearchKey.objects.filter(workflow_execution_id=old_done.id).exists())
+
+        archived = [line for path in summary['files'] for line in read_archive(path)]
+        self.assertEqual({line['id'] for line in archived}, {str(old_done.id), str(old_failed.id)})
+        self.assertTrue(all(len(line['tasks']) == 1 for line in archived))
+        self.assertEqual(archived[0]['input_data'], {'phone': '555'})
+
+    def test_folds_archived_runs_into_daily_stats(self):
+        self.make_execution('completed', 40)
+        self.make_execution('failed', 40, retry_count=2)
+
+        self.archive(batch_size=1)
+
+        stats = ExecutionArchiveStats.objects.get(workflow=self.workflow)
+        self.assertEqual(
+            (stats.total_executions, stats.completed_executions, stats.failed_executions),
+            (2, 1, 1),
+        )
+        self.assertEqual((stats.total_tasks, stats.failed_tasks, stats.total_retries), (2, 1, 2))
+        self.assertEqual(stats.total_duration_ms, 4000)
+
+    def test_max_batches_stops_early_and_resumes(self):
+        for _ in range(3):
+            self.make_execution('completed', 40)
+
+        first = self.archive(batch_size=2, max_batches=1)
+        second = self.archive(batch_size=2)
+
+        self.assertEqual((first['executions'], second['executions']), (2, 1))
+        self.assertFalse(WorkflowExecution.objects.exists())
+
+    def test_rows_claimed_by_another_run_are_skipped(self):
+        claimed = self.make_execution('completed', 40)
+        free = self.make_execution('failed', 40)
+        select_for_update = QuerySet.select_for_update
+
+        def skip_claimed(queryset, **kwargs):
+            # SQLite has no row locks: stand in for the other run's lock on `claimed`
+            queryset = select_for_update(queryset, **kwargs)
+            return queryset.exclude(id=claimed.id) if kwargs.get('skip_locked') else queryset
+
+        with mock.patch.object(QuerySet, 'select_for_update', autospec=True, side_effect=skip_claimed):
+            summary = self.archive()
+
+        self.assertEqual(summary['executions'], 1)
+        archived = [line['id'] for path in summary['files'] for line in read_archive(path)]
+        self.assertEqual(archived, [str(free.id)])
+        self.assertEqual(list(WorkflowExecution.objects.values_list('id', flat=True)), [claimed.id])
+        stats = ExecutionArchiveStats.objects.get(workflow=self.workflow)
+        self.assertEqual((stats.total_executions, stats.failed_executions, stats.completed_executions), (1, 1, 0))
+
+    def test_failed_batch_leaves_no_archive_and_no_stats(self):
+        execution = self.make_execution('completed', 40)
+
+        with mock.patch('workflows.retention._fold_stats', side_effect=RuntimeError('db gone')):
+            with self.assertRaises(RuntimeError):
+                self.archive()
+
+        self.assertEqual(os.listdir(self.archive_dir), [])
+        self.assertTrue(TaskExecution.objects.filter(workflow_execution=execution).exists())
+        self.assertFalse(ExecutionArchiveStats.objects.exists())
+
+        summary = self.archive()
+        self.assertEqual(len(summary['files']), 1)
+        self.assertEqual(ExecutionArchiveStats.objects.get(workflow=self.workflow).total_executions, 1)
@@ -0,0 +1,130 @@
+from datetime import datetime, timezone as dt_timezone
+from unittest import mock
+from zoneinfo import ZoneInfo
+
+from django.test import SimpleTestCase, TestCase
+
+from workflows.models import Workflow
+from workflows.scheduler import CronExpression, Scheduler
+
+NEW_YORK = ZoneInfo('America/New_York')
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=dt_timezone.utc)
+
+
+def fires(expression, start, count, tz=NEW_YORK):
+    """The next `count` fire times after `start`, in UTC"""
+    cron = CronExpression(expression, tz)
+    moments = []
+    for _ in range(count):
+        start = cron.next_after(start)
+        moments.append(start.astimezone(dt_timezone.utc))
+    return moments
+
+
+class CronParsingTests(SimpleTestCase):
+
+    def test_fields(self):
+        cron = CronExpression('*/15 8-18/2 1,15 * 1-5', dt_timezone.utc)
+        self.assertEqual(cron.minutes, {0, 15, 30, 45})
+        self.assertEqual(cron.hours, {8, 10, 12, 14, 16, 18})
+        self.assertEqual(cron.days, {1, 15})
+        self.assertEqual(cron.months, set(range(1, 13)))
+        self.assertEqual(cron.weekdays, {1, 2, 3, 4, 5})
+
+    def test_sunday_is_0_or_7(self):
+        self.assertEqual(CronExpression('0 0 * * 7', dt_timezone.utc).weekdays, {0})
+
+    def test_macros(self):
+        self.assertEqual(CronExpression('@daily', dt_timezone.utc).hours, {0})
+        self.assertEqual(CronExpression('@hourly', dt_timezone.utc).minutes, {0})
+
+    def test_invalid_expressions(self):
+        for expression in ('* * * *', '60 * * * *', '* * 0 * *', '*/0 * * * *', '5-1 * * * *', 'x * * * *'):
+            with self.subTest(expression=expression), self.assertRaises(ValueError):
+                CronExpression(expression, dt_timezone.utc)
+
+    def test_never_firing_expression(self):
+        with self.assertRaises(ValueError):
+            CronExpression('0 0 31 2 *', dt_timezone.utc).next_after(utc(2026, 1, 1))
+
+    def test_fires_strictly_after(self):
+        self.assertEqual(fires('*/5 * * * *', utc(2026, 1, 1, 10, 5), 1, dt_timezone.utc), [utc(2026, 1, 1, 10, 10)])
+
+    def test_day_of_month_or_day_of_week(self):
+        # The 13th, or any Friday
+        moments = fires('0 12 13 * 5', utc(2026, 2, 1), 4, dt_timezone.utc)
+        self.assertEqual([moment.day for moment in moments], [6, 13, 20, 27])
+
+
+class CronDaylightSavingTests(SimpleTestCase):
+    """America/New_York: DST starts 2026-03-08 02:00, ends 2026-11-01 02:00"""
+
+    def test_daily_run_keeps_local_time_across_the_change(self):
+        moments = fires('0 9 * * *', utc(2026, 3, 6, 15), 3)
+        self.assertEqual(moments, [utc(2026, 3, 7, 14), utc(2026, 3, 8, 13), utc(2026, 3, 9, 13)])
+
+    def test_time_skipped_by_spring_forward_fires_an_hour_later(self):
+        # 02:30 doesn't exist on the 8th; it runs at 03:30 EDT
+        moments = fires('30 2 * * *', utc(2026, 3, 7, 12), 2)
+        self.assertEqual(moments, [utc(2026, 3, 8, 7, 30), utc(2026, 3, 9, 6, 30)])
+
+    def test_hourly_run_across_spring_forward(self):
+        moments = fires('0 * * * *', utc(2026, 3, 8, 5, 30), 3)
+        # 01:00 EST, then 02:00 (= 03:00 EDT), then 04:00 EDT
+        self.assertEqual(moments, [utc(2026, 3, 8, 6), utc(2026, 3, 8, 7), utc(2026, 3, 8, 8)])
+
+    def test_time_repeated_by_fall_back_fires_once(self):
+        # 01:30 happens twice on 2026-11-01 (EDT, then EST)
+        moments = fires('30 1 * * *', utc(2026, 10, 31, 12), 2)
+        self.assertEqual(moments, [utc(2026, 11, 1, 5, 30), utc(2026, 11, 2, 6, 30)])
+
+
+class SchedulerReloadTests(TestCase):
+
+    def setUp(self):
+        self.now = utc(2026, 1, 5, 10, 2)
+        patcher = mock.patch('django.utils.timezone.now', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.fired = []
+        patcher = mock.patch.object(Scheduler, 'fire', lambda scheduler, due: self.fired.extend(due))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.scheduler = Scheduler(name='test')
+
+    def schedule(self, name, cron):
+        return Workflow.objects.create(
+            name=name, trigger_type='schedule', trigger_config={'cron': cron, 'timezone': 'UTC'},
+        )
+
+    def test_editing_one_schedule_keeps_the_others_due(self):
+        every_five = self.schedule('every five', '*/5 * * * *')
+        hourly = self.schedule('hourly', '0 * * * *')
+        self.scheduler.tick()
+
+        # The loop wakes just after 10:05, when someone has just edited the hourly schedule
+        self.now = utc(2026, 1, 5, 10, 5, 0, 300000)
+        hourly.trigger_config = {'cron': '30 * * * *', 'timezone': 'UTC'}
+        hourly.save()
+        self.scheduler.tick()
+
+        self.assertEqual([workflow_id for workflow_id, _ in self.fired], [str(every_five.id)])
+        self.assertEqual(
+            sorted(self.scheduler.heap),
+            [(utc(2026, 1, 5, 10, 10).timestamp(), str(every_five.id)),
+             (utc(2026, 1, 5, 10, 30).timestamp(), str(hourly.id))],
+        )
+
+    def test_input_changes_apply_without_moving_the_fire_time(self):
+        workflow = self.schedule('every five', '*/5 * * * *')
+        self.scheduler.tick()
+
+        self.now = utc(2026, 1, 5, 10, 5, 0, 300000)
+        workflow.trigger_config = {**workflow.trigger_config, 'input': {'batch': 2}}
+        workflow.save()
+        self.scheduler.tick()
+
+        self.assertEqual(self.fired, [(str(workflow.id), {'batch': 2})])
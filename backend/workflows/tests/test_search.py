@@ -0,0 +1,70 @@
+from rest_framework.test import APIClient
+
+from workflows.models import ExecutionSearchKey, Workflow
+from workflows.orchestrator import Orchestrator
+from workflows.search import backfill, search
+
+from .base import EngineTestCase
+
+
+class ExecutionSearchTests(EngineTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.workflow, _ = self.make_workflow(
+            ('a', 'delay', {'seconds': 0}, []),
+            trigger_config={'search_keys': ['patient.phone', 'mrn']},
+        )
+
+    def run_with(self, *inputs):
+        return Orchestrator().execute_many([(self.workflow.id, input_data) for input_data in inputs])
+
+    def declare(self, *search_keys):
+        self.workflow.trigger_config = {'search_keys': list(search_keys)}
+        Workflow.objects.filter(id=self.workflow.id).update(trigger_config=self.workflow.trigger_config)
+
+    def test_runs_are_searchable_from_creation(self):
+        first, second, other = self.run_with(
+            {'patient': {'phone': '555-0100'}, 'mrn': 42},
+            {'patient': {'phone': ' 555-0100 '}},
+            {'patient': {'phone': '555-0199'}, 'mrn': [1]},
+        )
+
+        self.assertEqual({execution.id for execution in search('patient.phone', '555-0100')}, {first.id, second.id})
+        self.assertEqual([execution.id for execution in search('mrn', 42)], [first.id])
+        # Lists aren't indexed
+        self.assertEqual(ExecutionSearchKey.objects.filter(workflow_execution=other).count(), 1)
+
+    def test_undeclared_keys_are_not_searched(self):
+        self.run_with({'patient': {'phone': '555-0100'}, 'mrn': 42, 'name': 'x'})
+        self.declare('patient.phone')
+
+        self.assertEqual(search('name', 'x'), [])
+        self.assertEqual(search('mrn', 42), [])
+        self.assertEqual(len(search('patient.phone', '555-0100')), 1)
+
+    def test_backfill_indexes_new_keys_and_drops_removed_ones(self):
+        execution, = self.run_with({'patient': {'phone': '555-0100'}, 'mrn': 42, 'ward': 'B'})
+        self.declare('ward')
+
+        summary = backfill(self.workflow, batch_size=1)
+
+        self.assertEqual(summary, {'executions': 1, 'keys': 1})
+        self.assertEqual(list(ExecutionSearchKey.objects.values_list('key', 'value')), [('ward', 'B')])
+        self.assertEqual([found.id for found in search('ward', 'B')], [execution.id])
+
+    def test_bad_limits_are_a_400(self):
+        execution, = self.run_with({'mrn': 1})
+        client = APIClient()
+
+        for limit in ('abc', '0', '-5'):
+            with self.subTest(limit):
+                response = client.get('/api/executions/search/', {'key': 'mrn', 'value': '1', 'limit': limit})
+                self.assertEqual(response.status_code, 400)
+                response = client.get(f'/api/executions/{execution.id}/timeline/', {'limit': limit})
+                self.assertEqual(response.status_code, 400)
+
+        response = client.get(f'/api/executions/{execution.id}/timeline/', {'after': '2024-13-45T00:00:00'})
+        self.assertEqual(response.status_code, 400)
+        response = client.get('/api/executions/search/', {'key': 'mrn', 'value': '1', 'limit': '9999'})
+        self.assertEqual(len(response.json()['results']), 1)
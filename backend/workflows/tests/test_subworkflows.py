@@ -0,0 +1,129 @@
+from unittest import mock
+
+from workflows.control import cancel_executions
+from workflows.models import TaskExecution, WorkflowExecution, WorkflowStep
+from workflows.orchestrator import Orchestrator
+from workflows.tasks import task_registry
+
+from .base import EngineTestCase
+
+hooks = {}
+
+
+@task_registry.register('test_child_step')
+def child_step(config):
+    """Echoes its input, or runs hooks[config['hook']] when the input names one"""
+    if config.get('hook'):
+        return hooks[config['hook']]()
+    return dict(config)
+
+
+class SubWorkflowTests(EngineTestCase):
+
+    def setUp(self):
+        super().setUp()
+        hooks.clear()
+        self.child, _ = self.make_workflow(('x', 'test_child_step', {}, []), name='child')
+
+    def make_parent(self, root_type='test_child_step', config=None):
+        """gate -> sub (runs the child workflow) -> after"""
+        workflow, steps = self.make_workflow(
+            ('gate', root_type, {}, []),
+            ('sub', 'sub_workflow', config or {'workflow_id': str(self.child.id), 'input': {'extra': 1}}, ['gate']),
+            ('after', 'test_child_step', {}, ['sub']),
+            name='parent',
+        )
+        WorkflowStep.objects.filter(workflow__in=[workflow, self.child]).update(max_retries=0)
+        return workflow
+
+    def children(self):
+        return WorkflowExecution.objects.filter(parent_task_execution__isnull=False)
+
+    def test_child_runs_only_when_the_step_is_reached(self):
+        hooks['boom'] = lambda: 1 / 0
+        parent = self.make_parent()
+
+        execution = Orchestrator().execute(parent.id, {'hook': 'boom'})
+
+        execution.refresh_from_db()
+        self.assertEqual(execution.status, 'failed')
+        self.assertFalse(self.children().exists())
+        self.assertEqual(execution.task_executions.get(step__name='sub').status, 'pending')
+
+    def test_parent_step_takes_the_child_result(self):
+        parent = self.make_parent()
+
+        execution = Orchestrator().execute(parent.id, {'n': 5})
+
+        execution.refresh_from_db()
+        sub = execution.task_executions.get(step__name='sub')
+        child = self.children().get()
+        self.assertEqual(execution.status, 'completed')
+        self.assertEqual(child.parent_task_execution_id, sub.id)
+        self.assertEqual(child.status, 'completed')
+        self.assertEqual(sub.status, 'completed')
+        self.assertEqual(sub.result, {
+            'sub_workflow_execution_id': str(child.id),
+            'status': 'completed',
+            'results': {'x': {'n': 5, 'extra': 1}},
+        })
+        self.assertEqual(execution.task_executions.get(step__name='after').status, 'completed')
+
+    def test_failed_child_fails_the_parent_step(self):
+        hooks['boom'] = lambda: 1 / 0
+        parent = self.make_parent(config={'workflow_id': str(self.child.id), 'input': {'hook': 'boom'}})
+
+        execution = Orchestrator().execute(parent.id, {})
+
+        execution.refresh_from_db()
+        sub = execution.task_executions.get(step__name='sub')
+        self.assertEqual(self.children().get().status, 'failed')
+        self.assertEqual(sub.status, 'failed')
+        self.assertIn('Sub-workflow execution', sub.error_message)
+        self.assertEqual((execution.status, execution.failed_step_id), ('failed', sub.step_id))
+        self.assertEqual(execution.task_executions.get(step__name='after').status, 'pending')
+
+    def test_workflow_cannot_run_itself(self):
+        parent = self.make_parent()
+        WorkflowStep.objects.filter(workflow=parent, name='sub').update(config={'workflow_id': str(parent.id)})
+
+        execution = Orchestrator().execute(parent.id, {})
+
+        execution.refresh_from_db()
+        self.assertEqual(execution.status, 'failed')
+        self.assertIn('would recurse into itself', execution.task_executions.get(step__name='sub').error_message)
+        self.assertFalse(self.children().exists())
+
+    def test_nesting_depth_is_limited(self):
+        # A chain of runs, each started by a step of the one before
+        workflows = [self.make_workflow(('s', 'test_child_step', {}, []), name=f'w{n}')[0] for n in range(4)]
+        execution = None
+        for workflow in workflows[:3]:
+            parent_task = execution.task_executions.get() if execution else None
+            execution = WorkflowExecution.objects.create(workflow=workflow, parent_task_execution=parent_task)
+            TaskExecution.objects.create(workflow_execution=execution, step=workflow.steps.get())
+
+        with mock.patch('workflows.orchestrator.MAX_SUB_WORKFLOW_DEPTH', 3):
+            Orchestrator()._check_recursion(execution, workflows[3])
+        with mock.patch('workflows.orchestrator.MAX_SUB_WORKFLOW_DEPTH', 2):
+            with self.assertRaisesMessage(ValueError, 'nested deeper than 2'):
+                Orchestrator()._check_recursion(execution, workflows[3])
+        with self.assertRaisesMessage(ValueError, 'would recurse into itself'):
+            Orchestrator()._check_recursion(execution, workflows[0])
+
+    def test_cancelling_the_parent_cancels_the_child(self):
+        def cancel_parent():
+            cancel_executions(list(WorkflowExecution.objects.filter(workflow__name='parent').values_list('id', flat=True)))
+            return {}
+        hooks['cancel'] = cancel_parent
+        parent = self.make_parent(config={'workflow_id': str(self.child.id), 'input': {'hook': 'cancel'}})
+
+        # The waiting parent step has a Celery id; there's no broker to broadcast the revoke to
+        with mock.patch('workflows.control.revoke_celery_tasks') as revoke:
+            execution = Orchestrator().execute(parent.id, {})
+
+        execution.refresh_from_db()
+        self.assertEqual(execution.status, 'cancelled')
+        self.assertEqual(self.children().get().status, 'cancelled')
+        self.assertEqual(execution.task_executions.get(step__name='after').status, 'cancelled')
+        revoke.assert_called()
@@ -0,0 +1,74 @@
+from unittest import mock
+
+from celery.exceptions import SoftTimeLimitExceeded
+from django.test import SimpleTestCase, override_settings
+
+from workflows.models import OutboxMessage, WorkflowStep
+from workflows.orchestrator import Orchestrator
+from workflows.tasks import step_time_limits, task_registry
+
+from .base import EngineTestCase
+
+
+@task_registry.register('test_hangs')
+def hangs(config):
+    """Stands in for a step the worker interrupts at its soft time limit"""
+    if config.get('hang'):
+        raise SoftTimeLimitExceeded()
+    return {'ok': True}
+
+
+@override_settings(STEP_TIMEOUT_GRACE_SECONDS=30)
+class StepTimeLimitsTests(SimpleTestCase):
+
+    def test_default_is_the_model_timeout(self):
+        self.assertEqual(step_time_limits(WorkflowStep()), (300, 330))
+
+    def test_soft_limit_is_at_least_one_second(self):
+        for timeout in (0, -5):
+            with self.subTest(timeout=timeout):
+                self.assertEqual(step_time_limits(WorkflowStep(timeout_seconds=timeout)), (1, 31))
+
+    @override_settings(STEP_TIMEOUT_GRACE_SECONDS=5)
+    def test_hard_limit_is_the_grace_period_later(self):
+        self.assertEqual(step_time_limits(WorkflowStep(timeout_seconds=20)), (20, 25))
+
+
+class StepTimeoutTests(EngineTestCase):
+
+    def make_chain(self):
+        workflow, steps = self.make_workflow(
+            ('a', 'test_hangs', {}, []),
+            ('b', 'test_hangs', {}, ['a']),
+        )
+        WorkflowStep.objects.filter(workflow=workflow).update(timeout_seconds=7)
+        return workflow
+
+    @override_settings(STEP_TIMEOUT_GRACE_SECONDS=3)
+    def test_dispatch_carries_the_step_limits(self):
+        workflow = self.make_chain()
+
+        with mock.patch('workflows.outbox.relay_messages'):
+            Orchestrator().execute_many([(workflow.id, {})])
+
+        options = OutboxMessage.objects.get().options
+        self.assertEqual((options['soft_time_limit'], options['time_limit']), (7, 10))
+
+    def test_soft_limit_times_the_step_out_and_stops_the_run(self):
+        workflow = self.make_chain()
+
+        execution = Orchestrator().execute(workflow.id, {'hang': True})
+
+        execution.refresh_from_db()
+        a = execution.task_executions.get(step__name='a')
+        self.assertEqual(a.status, 'timed_out')
+        self.assertEqual(a.retry_count, 0)
+        self.assertIn('timeout_seconds=7', a.error_message)
+        # Executions have no separate timed-out state: the run fails at the timed-out step
+        self.assertEqual(execution.status, 'failed')
+        self.assertEqual(execution.failed_step.name, 'a')
+        self.assertIn("Task 'a' timed out", execution.error_message)
+        # Nothing downstream was dispatched
+        b = execution.task_executions.get(step__name='b')
+        self.assertEqual((b.status, b.dispatched_at, b.celery_task_id), ('pending', None, ''))
+        self.assertFalse(OutboxMessage.objects.exists())
@@ -0,0 +1,98 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from workflows.admission import SNAPSHOT_KEY
+from workflows.models import TaskExecution, Workflow, WorkflowExecution
+from workflows.webhooks import WebhookSpool, drain_spool, get_webhook_workflow
+
+from .base import EngineTestCase
+
+
+class WebhookTests(EngineTestCase):
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.spool = WebhookSpool(directory=directory, segment_seconds=60)
+        patcher = mock.patch('workflows.webhooks._spool', self.spool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.workflow, _ = self.make_workflow(('a', 'delay', {'seconds': 0}, []), trigger_type='webhook')
+        self.client = APIClient()
+
+    def post(self):
+        return self.client.post(f'/api/hooks/{self.workflow.id}/', {'patient': 1}, format='json')
+
+    def spool_closed_segment(self, *events):
+        """Write events into a segment from an earlier bucket, as the drainer finds them"""
+        path = os.path.join(self.spool.directory, f"{self.spool.current_bucket() - 1}-host-1.jsonl")
+        with open(path, 'w', encoding='utf-8') as segment:
+            for workflow_id, payload in events:
+                segment.write(json.dumps({'id': 'x', 'workflow_id': str(workflow_id), 'payload': payload,
+                                          'received_at': time.time()}) + '\n')
+        old = time.time() - 10
+        os.utime(path, (old, old))
+
+    def test_accepting_an_event_runs_no_queries(self):
+        get_webhook_workflow(self.workflow.id)
+        cache.delete(SNAPSHOT_KEY)
+
+        with self.assertNumQueries(0):
+            response = self.post()
+
+        self.assertEqual(response.status_code, 202)
+
+    @override_settings(ADMISSION_MAX_PENDING=10)
+    def test_full_backlog_in_the_cached_snapshot_rejects(self):
+        cache.set(SNAPSHOT_KEY, {'queued': 0, 'running': 0, 'pending_executions': 10}, 60)
+
+        response = self.post()
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+
+    @override_settings(ADMISSION_SNAPSHOT_SECONDS=60)
+    def test_drain_starts_runs_and_warms_the_snapshot(self):
+        self.spool_closed_segment((self.workflow.id, {'n': 1}), (self.workflow.id, 'raw'))
+        cache.delete(SNAPSHOT_KEY)
+
+        summary = drain_spool(self.spool)
+
+        self.assertEqual((summary['segments'], summary['events'], summary['dropped']), (1, 2, 0))
+        self.assertEqual(
+            sorted(WorkflowExecution.objects.values_list('input_data', flat=True), key=str),
+            [{'n': 1}, {'payload': 'raw'}],
+        )
+        self.assertIsNotNone(cache.get(SNAPSHOT_KEY))
+
+    @override_settings(ADMISSION_MAX_PENDING=1, ADMISSION_MAX_IN_FLIGHT=0)
+    def test_drained_events_are_held_not_dropped_when_the_backlog_is_full(self):
+        self.spool_closed_segment((self.workflow.id, {'n': 1}), (self.workflow.id, {'n': 2}))
+        WorkflowExecution.objects.create(workflow=self.workflow, status='pending')
+
+        summary = drain_spool(self.spool)
+
+        self.assertEqual((summary['events'], summary['dropped']), (2, 0))
+        held = WorkflowExecution.objects.filter(trigger_source='webhook')
+        self.assertEqual(sorted(held.values_list('status', flat=True)), ['pending', 'pending'])
+        self.assertFalse(TaskExecution.objects.filter(workflow_execution__in=held, ready_at__isnull=False).exists())
+
+    def test_drain_drops_events_for_workflows_no_longer_on_webhooks(self):
+        manual, _ = self.make_workflow(('a', 'delay', {'seconds': 0}, []), name='manual')
+        inactive, _ = self.make_workflow(('a', 'delay', {'seconds': 0}, []), name='off', trigger_type='webhook')
+        Workflow.objects.filter(id=inactive.id).update(is_active=False)
+        self.spool_closed_segment((self.workflow.id, {}), (manual.id, {}), (inactive.id, {}))
+
+        summary = drain_spool(self.spool)
+
+        self.assertEqual((summary['events'], summary['dropped']), (1, 2))
+        self.assertEqual(list(WorkflowExecution.objects.values_list('workflow_id', flat=True)), [self.workflow.id])
@@ -1,13 +1,16 @@
 from rest_framework.routers import DefaultRouter
-from .views import WorkflowViewSet
+from .views import WorkflowViewSet, WorkflowExecutionViewSet
 from django.urls import path, include
-from .views import WorkflowAPIView,GetWorkflowSteps
+from .views import WorkflowAPIView,GetWorkflowSteps,WebhookView,CircuitBreakerMetricsView
 
 router = DefaultRouter()
 router.register(r'workflows', WorkflowViewSet, basename='workflow')
+router.register(r'executions', WorkflowExecutionViewSet, basename='execution')
 
 urlpatterns = [
     path('', include(router.urls)), 
     path('view/',WorkflowAPIView.as_view()), 
-    path('steps/',GetWorkflowSteps.as_view())
+    path('steps/',GetWorkflowSteps.as_view()),
+    path('hooks/<uuid:workflow_id>/',WebhookView.as_view()),
+    path('metrics/circuit-breakers/',CircuitBreakerMetricsView.as_view()),
 ]
\ No newline at end of file
@@ -1,13 +1,60 @@
 # workflows/views.py
+import uuid
+
 from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
-from .models import Workflow
-from .serializers import WorkflowSerializer
-from .executor import execute_workflow
+from .models import Workflow, WorkflowExecution, ExecutionSnapshot
+from .serializers import WorkflowSerializer, WorkflowExecutionSerializer
+from .orchestrator import Orchestrator
+from .dag import analyze_workflow, WorkflowValidationError
+from .portable import export_workflows, import_workflows, clone_workflow, WorkflowFormatError
+from .control import cancel_execution, cancel_executions, pause_execution, unpause_execution
+from .exports import export_queryset, stream_export
+from .analytics import workflow_analytics
+from .admission import AdmissionRejected, backlog_full
+from .circuit import collect_metrics
+from .events import timeline
+from .search import search as search_executions
+from django.conf import settings
+from flowpilot.db import run_with_isolation
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.views.generic import TemplateView
+from rest_framework.parsers import JSONParser
 from rest_framework.views import APIView
+from .webhooks import get_spool, get_webhook_workflow, verify_secret
+
+def backlog_full_response(retry_after):
+    response = Response({"message": "Too many executions waiting to start, try again later"}, status=429)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+def query_limit(params, default, maximum):
+    """?limit= capped at maximum, or None if it isn't a positive whole number"""
+    try:
+        limit = int(params.get('limit', default))
+    except (TypeError, ValueError):
+        return None
+    return min(limit, maximum) if limit > 0 else None
+
+def query_datetime(value):
+    """parse_datetime, but None for anything unusable - impossible dates like month 13 included"""
+    try:
+        return parse_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+def query_uuids(values):
+    """A list of UUIDs, or None if it isn't one"""
+    if not isinstance(values, list):
+        return None
+    try:
+        return [uuid.UUID(str(value)) for value in values]
+    except ValueError:
+        return None
 
 class WorkflowViewSet(viewsets.ModelViewSet):
     queryset = Workflow.objects.all()
@@ -17,8 +64,303 @@ class WorkflowViewSet(viewsets.ModelViewSet):
     @action(detail = True,methods=['post'])
     def execute(self,request,id=None):
         wf = self.get_object()
-        execute_workflow(wf.workflow_json)
-        return Response({"status":"executed"})
+        user = request.user if request.user.is_authenticated else None
+        try:
+            workflow_execution = Orchestrator().execute(
+                wf.id,
+                request.data.get('input_data', {}),
+                triggered_by=user,
+                reject_when_full=True,
+            )
+        except AdmissionRejected as exc:
+            return backlog_full_response(exc.retry_after)
+        except WorkflowValidationError as exc:
+            return Response({"valid": False, "errors": exc.errors}, status=400)
+        # 'pending' means admission control is holding it until workers free up
+        return Response({
+            "status": "executed",
+            "execution_id": str(workflow_execution.id),
+            "execution_status": workflow_execution.status,
+        })
+    
+    @action(detail=True, methods=['get'])
+    def analysis(self, request, id=None):
+        """DAG levels, max width and critical path weighted by historical step durations"""
+        try:
+            return Response(analyze_workflow(self.get_object()))
+        except WorkflowValidationError as exc:
+            return Response({"valid": False, "errors": exc.errors}, status=400)
+    
+    @action(detail=True, methods=['get'])
+    def analytics(self, request, id=None):
+        """
+        Per-step counts, failure rates, retries and p50/p95 durations from the hourly rollups
+        
+        Query params: since / until (ISO datetimes, default the last 7 days), series=true for hourly totals
+        """
+        wf = self.get_object()
+        params = request.query_params
+        until = timezone.now()
+        window = {'since': until - timezone.timedelta(days=7), 'until': until}
+        for name in ('since', 'until'):
+            if params.get(name):
+                window[name] = query_datetime(params[name])
+                if window[name] is None:
+                    return Response({"message": f"Invalid '{name}' datetime"}, status=400)
+        return Response(workflow_analytics(wf, series=params.get('series') == 'true', **window))
+    
+    @action(detail=True, methods=['post'])
+    def publish(self, request, id=None):
+        """Validate the step graph and activate the workflow; cycles and dangling edges are rejected"""
+        wf = self.get_object()
+        
+        def validate_and_activate():
+            analysis = analyze_workflow(wf)
+            wf.is_active = True
+            wf.save(update_fields=['is_active', 'updated_at'])
+            return analysis
+        
+        # Serializable, so a concurrent step edit can't slip a cycle in between validating and activating
+        try:
+            analysis = run_with_isolation(validate_and_activate)
+        except WorkflowValidationError as exc:
+            return Response({"valid": False, "errors": exc.errors}, status=400)
+        return Response({"status": "published", **analysis})
+    
+    @action(detail=True, methods=['get'])
+    def export(self, request, id=None):
+        """Compact binary export of the workflow with its steps and edges"""
+        wf = self.get_object()
+        response = HttpResponse(export_workflows([wf]), content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="workflow-{wf.id}.fpwf"'
+        return response
+    
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_workflows(self, request):
+        """Create workflows from an export blob sent as the raw request body"""
+        user = request.user if request.user.is_authenticated else None
+        try:
+            workflows = import_workflows(request.body, created_by=user)
+        except WorkflowFormatError as exc:
+            return Response({"message": str(exc)}, status=400)
+        return Response(WorkflowSerializer(workflows, many=True).data, status=201)
+    
+    @action(detail=True, methods=['post'])
+    def clone(self, request, id=None):
+        user = request.user if request.user.is_authenticated else None
+        wf = clone_workflow(self.get_object(), name=request.data.get('name'), created_by=user)
+        return Response(WorkflowSerializer(wf).data, status=201)
+    
+    @action(detail=True, methods=['get'], url_path='executions/export')
+    def export_executions(self, request, id=None):
+        """
+        Stream executions as NDJSON (default) or CSV
+        
+        Query params: since / until (ISO datetimes on created_at), status,
+        rows=executions|tasks, output=ndjson|csv ('format' is taken by DRF)
+        """
+        wf = self.get_object()
+        params = request.query_params
+        window = {}
+        for name in ('since', 'until'):
+            if params.get(name):
+                window[name] = query_datetime(params[name])
+                if window[name] is None:
+                    return Response({"message": f"Invalid '{name}' datetime"}, status=400)
+        rows = params.get('rows', 'executions')
+        output = params.get('output', 'ndjson')
+        if rows not in ('executions', 'tasks') or output not in ('ndjson', 'csv'):
+            return Response({"message": "rows must be executions|tasks, output must be ndjson|csv"}, status=400)
+        
+        queryset, columns = export_queryset(wf.id, rows=rows, status=params.get('status'), **window)
+        response = StreamingHttpResponse(
+            stream_export(queryset, columns, output),
+            content_type='text/csv' if output == 'csv' else 'application/x-ndjson',
+        )
+        response['Content-Disposition'] = f'attachment; filename="{rows}-{wf.id}.{output}"'
+        return response
+    
+class WorkflowExecutionViewSet(viewsets.ReadOnlyModelViewSet):
+    serializer_class = WorkflowExecutionSerializer
+    lookup_field = 'id'
+    
+    def get_queryset(self):
+        queryset = WorkflowExecution.objects.all()
+        workflow_id = self.request.query_params.get('workflow')
+        status = self.request.query_params.get('status')
+        if workflow_id:
+            queryset = queryset.filter(workflow_id=workflow_id)
+        if status:
+            queryset = queryset.filter(status=status)
+        return queryset
+    
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, id=None):
+        summary = cancel_execution(self.get_object(), request.data.get('reason', 'Cancelled by user'))
+        return Response({"status": "cancelled", **summary})
+    
+    @action(detail=False, methods=['post'], url_path='cancel')
+    def bulk_cancel(self, request):
+        """Cancel many executions at once: {"ids": [...]} or {"workflow": id} for all its active runs"""
+        if request.data.get('ids'):
+            execution_ids = request.data['ids']
+        elif request.data.get('workflow'):
+            execution_ids = WorkflowExecution.objects.filter(
+                workflow_id=request.data['workflow'], status__in=['pending', 'running', 'paused'],
+            ).values_list('id', flat=True)
+        else:
+            return Response({"message": "Pass 'ids' or 'workflow'"}, status=400)
+        summary = cancel_executions(execution_ids, request.data.get('reason', 'Cancelled by user'))
+        return Response({"status": "cancelled", **summary})
+    
+    @action(detail=True, methods=['post'])
+    def resume(self, request, id=None):
+        """Re-run a failed/cancelled execution from the failed step, reusing completed step results"""
+        user = request.user if request.user.is_authenticated else None
+        try:
+            child = Orchestrator().resume(self.get_object(), triggered_by=user, reject_when_full=True)
+        except AdmissionRejected as exc:
+            return backlog_full_response(exc.retry_after)
+        if child is None:
+            return Response({"message": "Only failed or cancelled executions that aren't already being resumed can be resumed"}, status=409)
+        return Response({"status": "resumed", "execution_id": str(child.id), "execution_status": child.status})
+    
+    @action(detail=False, methods=['post'], url_path='resume')
+    def bulk_resume(self, request):
+        """
+        Resume many executions: {"ids": [...]} or {"workflow": id, "since": ..., "until": ...}
+        for the failed runs of an outage window. At most RESUME_BATCH_SIZE per call;
+        'remaining' says whether to call again.
+        """
+        if request.data.get('ids'):
+            execution_ids = query_uuids(request.data['ids'])
+            if execution_ids is None:
+                return Response({"message": "'ids' must be a list of execution ids"}, status=400)
+            queryset = WorkflowExecution.objects.filter(id__in=execution_ids)
+        elif request.data.get('workflow'):
+            workflow_ids = query_uuids([request.data['workflow']])
+            if workflow_ids is None:
+                return Response({"message": "'workflow' must be a workflow id"}, status=400)
+            queryset = WorkflowExecution.objects.filter(workflow_id=workflow_ids[0], status='failed')
+            # A typo must not widen the window to every failed run
+            for name, lookup in (('since', 'completed_at__gte'), ('until', 'completed_at__lt')):
+                if request.data.get(name):
+                    moment = query_datetime(request.data[name])
+                    if moment is None:
+                        return Response({"message": f"Invalid '{name}' datetime"}, status=400)
+                    queryset = queryset.filter(**{lookup: moment})
+            # Failed runs already resumed once are left alone
+            queryset = queryset.filter(retries__isnull=True)
+        else:
+            return Response({"message": "Pass 'ids' or 'workflow'"}, status=400)
+        
+        execution_ids = list(queryset.order_by('completed_at').values_list('id', flat=True)[:settings.RESUME_BATCH_SIZE + 1])
+        remaining = len(execution_ids) > settings.RESUME_BATCH_SIZE
+        user = request.user if request.user.is_authenticated else None
+        try:
+            children = Orchestrator().resume_many(
+                execution_ids[:settings.RESUME_BATCH_SIZE], triggered_by=user, reject_when_full=True,
+            )
+        except AdmissionRejected as exc:
+            return backlog_full_response(exc.retry_after)
+        return Response({
+            "status": "resumed",
+            "resumed": len(children),
+            "held": sum(1 for child in children if child.status == 'pending'),
+            "remaining": remaining,
+        })
+    
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Executions by a declared search key (trigger_config.search_keys), newest first:
+        ?key=patient_phone&value=...&workflow=<id>&limit=50. Only declared keys are searchable.
+        """
+        key = request.query_params.get('key')
+        value = request.query_params.get('value')
+        if not key or value is None:
+            return Response({"message": "Pass 'key' and 'value'"}, status=400)
+        limit = query_limit(request.query_params, 50, 500)
+        if limit is None:
+            return Response({"message": "'limit' must be a positive number"}, status=400)
+        executions = search_executions(key, value, workflow_id=request.query_params.get('workflow'), limit=limit)
+        return Response({
+            "key": key,
+            "value": value,
+            "results": WorkflowExecutionSerializer(executions, many=True).data,
+        })
+    
+    @action(detail=True, methods=['get'])
+    def timeline(self, request, id=None):
+        """
+        Audit trail of a run: its events in order (?after=<iso time> to page or tail),
+        plus the compacted snapshot of its state
+        """
+        execution = self.get_object()
+        after = None
+        if request.query_params.get('after'):
+            try:
+                after = parse_datetime(request.query_params['after'])
+            except ValueError:
+                pass
+            if after is None:
+                return Response({"message": "Invalid 'after' datetime"}, status=400)
+        limit = query_limit(request.query_params, 1000, 5000)
+        if limit is None:
+            return Response({"message": "'limit' must be a positive number"}, status=400)
+        snapshot = ExecutionSnapshot.objects.filter(workflow_execution_id=execution.id).values(
+            'status', 'steps', 'event_count', 'last_event_at',
+        ).first()
+        return Response({
+            "execution_id": str(execution.id),
+            "status": execution.status,
+            "snapshot": snapshot,
+            "events": timeline(execution.id, after=after, limit=limit),
+        })
+    
+    @action(detail=True, methods=['post'])
+    def pause(self, request, id=None):
+        if not pause_execution(self.get_object()):
+            return Response({"message": "Only pending or running executions can be paused"}, status=409)
+        return Response({"status": "paused"})
+    
+    @action(detail=True, methods=['post'])
+    def unpause(self, request, id=None):
+        if not unpause_execution(self.get_object()):
+            return Response({"message": "Execution is not paused"}, status=409)
+        return Response({"status": "running"})
+    
+class WebhookView(APIView):
+    """
+    Webhook trigger: POST /api/hooks/<workflow_id>/
+    
+    Never touches the database on the hot path - the event is spooled
+    locally and turned into an execution by the drainer. The backlog check
+    reads admission control's cached load snapshot (and lets the event in
+    when there is none).
+    """
+    authentication_classes = []
+    permission_classes = []
+    parser_classes = [JSONParser]
+    
+    def post(self, request, workflow_id):
+        if int(request.META.get('CONTENT_LENGTH') or 0) > settings.WEBHOOK_MAX_BODY_BYTES:
+            return Response({"message": "Payload too large"}, status=413)
+        workflow = get_webhook_workflow(workflow_id)
+        if not workflow:
+            return Response({"message": "object not found"}, status=404)
+        if not verify_secret(workflow, request.headers.get('X-FlowPilot-Secret')):
+            return Response({"message": "Invalid webhook secret"}, status=403)
+        if backlog_full(cached_only=True):
+            return backlog_full_response(settings.ADMISSION_RETRY_AFTER)
+        event_id = get_spool().append(workflow_id, request.data)
+        return Response({"status": "accepted", "event_id": event_id}, status=202)
+    
+class CircuitBreakerMetricsView(APIView):
+    """Circuit breaker state per host, across the worker processes that published recently"""
+    
+    def get(self, request):
+        return Response(collect_metrics())
     
 class WorkflowAPIView(APIView):
     
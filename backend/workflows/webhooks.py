@@ -0,0 +1,226 @@
+"""
+FlowPilot Webhook Ingestion
+
+Accept webhook events without touching the database on the request path.
+
+Key Concepts:
+- The endpoint checks the target workflow against a short-lived cache entry,
+  appends the payload to a local spool file and answers 202
+- Each process writes its own segment file per time bucket
+  ({bucket}-{host}-{pid}.jsonl), so writers never contend on a lock
+- A drainer claims closed segments (older buckets) by renaming them, then
+  turns their events into executions with bulk inserts. It re-checks that
+  each workflow is still an active webhook workflow, and refreshes the
+  admission snapshot the endpoint reads from cache
+- Delivery is at-least-once: a drainer that dies mid-segment leaves a
+  .draining file that the next drain picks up again
+
+The spool is local to each web host, so run the drainer there
+(python manage.py drain_webhooks) or point WEBHOOK_SPOOL_DIR at shared storage.
+"""
+
+import glob
+import hmac
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Dict, Any, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .admission import load_snapshot
+from .models import Workflow
+
+logger = logging.getLogger(__name__)
+
+WORKFLOW_CACHE_TTL = 60
+DRAIN_BATCH_SIZE = 500
+
+
+# ===========================
+# REQUEST PATH
+# ===========================
+
+def get_webhook_workflow(workflow_id) -> Optional[Dict[str, Any]]:
+    """
+    Cached lookup of a webhook-triggered workflow
+
+    Returns:
+        dict: {'secret': ...} for an active webhook workflow, None otherwise
+        (misses are cached too, so junk traffic can't hammer the DB)
+    """
+    key = f"webhook-workflow:{workflow_id}"
+    entry = cache.get(key)
+    if entry is None:
+        workflow = (
+            Workflow.objects
+            .filter(id=workflow_id, trigger_type='webhook', is_active=True)
+            .values('trigger_config')
+            .first()
+        )
+        entry = {'found': False} if workflow is None else {
+            'found': True,
+            'secret': workflow['trigger_config'].get('secret'),
+        }
+        cache.set(key, entry, WORKFLOW_CACHE_TTL)
+    return entry if entry['found'] else None
+
+
+def verify_secret(workflow: Dict[str, Any], provided: Optional[str]) -> bool:
+    """Workflows with trigger_config.secret require a matching X-FlowPilot-Secret header"""
+    expected = workflow.get('secret')
+    if not expected:
+        return True
+    return bool(provided) and hmac.compare_digest(str(expected), provided)
+
+
+class WebhookSpool:
+    """
+    Append-only spool of received webhook events
+
+    One instance per process; appends are serialised with a thread lock.
+    """
+
+    def __init__(self, directory: Optional[str] = None, segment_seconds: Optional[int] = None):
+        self.directory = directory or settings.WEBHOOK_SPOOL_DIR
+        self.segment_seconds = segment_seconds or settings.WEBHOOK_SPOOL_SEGMENT_SECONDS
+        self.fsync = settings.WEBHOOK_SPOOL_FSYNC
+        self._lock = threading.Lock()
+        self._file = None
+        self._bucket = None
+        self._pid = None
+        os.makedirs(self.directory, exist_ok=True)
+
+    def current_bucket(self) -> int:
+        return int(time.time() // self.segment_seconds)
+
+    def _segment(self, bucket: int):
+        # Reopen after fork (gunicorn preload) as well as on bucket rollover
+        if self._file is None or self._bucket != bucket or self._pid != os.getpid():
+            if self._file is not None and self._pid == os.getpid():
+                self._file.close()
+            self._pid = os.getpid()
+            name = f"{bucket}-{socket.gethostname()}-{self._pid}.jsonl"
+            self._file = open(os.path.join(self.directory, name), 'a', encoding='utf-8')
+            self._bucket = bucket
+        return self._file
+
+    def append(self, workflow_id, payload: Any) -> str:
+        """Spool one event and return its id"""
+        event_id = str(uuid.uuid4())
+        line = json.dumps(
+            {'id': event_id, 'workflow_id': str(workflow_id), 'payload': payload, 'received_at': time.time()},
+            cls=DjangoJSONEncoder,
+        ) + '\n'
+        with self._lock:
+            segment = self._segment(self.current_bucket())
+            segment.write(line)
+            segment.flush()
+            if self.fsync:
+                os.fsync(segment.fileno())
+        return event_id
+
+
+_spool = None
+_spool_lock = threading.Lock()
+
+
+def get_spool() -> WebhookSpool:
+    global _spool
+    if _spool is None:
+        with _spool_lock:
+            if _spool is None:
+                _spool = WebhookSpool()
+    return _spool
+
+
+# ===========================
+# DRAINER
+# ===========================
+
+def _claim_segments(spool: WebhookSpool, stale_after: int = 300):
+    """Rename closed segments to .draining; a failed rename means another drainer won"""
+    current = spool.current_bucket()
+    claimed = []
+    for path in sorted(glob.glob(os.path.join(spool.directory, '*.jsonl'))):
+        bucket = int(os.path.basename(path).split('-', 1)[0])
+        # Writers may still be finishing a line in the bucket that just closed
+        if bucket >= current or time.time() - os.path.getmtime(path) < 1:
+            continue
+        try:
+            os.rename(path, path + '.draining')
+            claimed.append(path + '.draining')
+        except FileNotFoundError:
+            continue
+    # Leftovers from a drainer that died mid-segment
+    for path in glob.glob(os.path.join(spool.directory, '*.draining')):
+        if path not in claimed and time.time() - os.path.getmtime(path) > stale_after:
+            os.utime(path)  # Bump mtime so other drainers leave it alone
+            claimed.append(path)
+    return claimed
+
+
+def _to_input(payload: Any) -> Dict[str, Any]:
+    return payload if isinstance(payload, dict) else {'payload': payload}
+
+
+def _start_runs(runs, summary: Dict[str, int]):
+    """
+    Start a batch of spooled events
+
+    Workflows deactivated or switched away from webhooks since the event
+    was accepted (the endpoint's check is cached) don't get a run.
+    """
+    from .orchestrator import Orchestrator
+
+    allowed = {
+        str(workflow_id) for workflow_id in Workflow.objects.filter(
+            id__in={workflow_id for workflow_id, _ in runs}, trigger_type='webhook', is_active=True,
+        ).values_list('id', flat=True)
+    }
+    accepted = [run for run in runs if run[0] in allowed]
+    summary['dropped'] += len(runs) - len(accepted)
+    summary['events'] += len(Orchestrator().execute_many(accepted, trigger_source='webhook'))
+
+
+def drain_spool(spool: Optional[WebhookSpool] = None) -> Dict[str, int]:
+    """
+    Turn spooled events into executions in bulk
+
+    Returns:
+        dict: Number of segments and events processed
+    """
+    spool = spool or get_spool()
+    summary = {'segments': 0, 'events': 0, 'skipped': 0, 'dropped': 0}
+
+    for path in _claim_segments(spool):
+        runs = []
+        with open(path, encoding='utf-8') as segment:
+            for line in segment:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn write from a crashed process
+                    summary['skipped'] += 1
+                    continue
+                runs.append((event['workflow_id'], _to_input(event['payload'])))
+                if len(runs) >= DRAIN_BATCH_SIZE:
+                    _start_runs(runs, summary)
+                    runs = []
+        if runs:
+            _start_runs(runs, summary)
+        os.remove(path)
+        summary['segments'] += 1
+
+    # Keeps the snapshot the endpoint's backlog check reads warm
+    if settings.ADMISSION_CONTROL_ENABLED:
+        load_snapshot(fresh=True)
+    if summary['segments']:
+        logger.info(f"Drained webhook spool: {summary}")
+    return summary